@@ -0,0 +1,145 @@
+import os
+import sys
+import time
+import heapq
+import inspect
+import logging
+import functools
+import itertools
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import TimedAck, ack_late, ack_missed, request_name
+
+logger = logging.getLogger(__name__)
+
+# Slack shows the user an error when a request is not acknowledged within 3 seconds
+ACK_DEADLINE_SECONDS = 3.0
+# Requests not acknowledged after this long are logged, with a stack sample when ACK_STACK_SAMPLES is on
+ACK_WARN_SECONDS = float(os.getenv("ACK_WARN_SECONDS", "2.0"))
+ACK_STACK_SAMPLES = os.getenv("ACK_STACK_SAMPLES", "false").lower() in ("1", "true", "yes")
+EARLY_ACK_MAX_WORKERS = int(os.getenv("EARLY_ACK_MAX_WORKERS", "8"))
+
+# Threads whose innermost frame is in one of these files are waiting for work, not running a listener
+IDLE_FILES = ("threading.py", "queue.py", "selectors.py")
+
+
+def stack_sample() -> str:
+    # Stacks of every busy thread except the calling one
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    sections = []
+    for ident, frame in sys._current_frames().items():
+        if ident == threading.get_ident():
+            continue
+        stack = traceback.extract_stack(frame)
+        if stack and os.path.basename(stack[-1].filename) in IDLE_FILES:
+            continue
+        sections.append(f"Thread {names.get(ident, ident)}:\n" + "".join(traceback.format_list(stack)))
+    return "\n".join(sections)
+
+
+class AckWatchdog:
+    """Times every request from receipt to ack() and reports the slow ones.
+
+    One daemon thread wakes up when the oldest unacknowledged request reaches warn_after and again at
+    the deadline. Acknowledged requests are dropped from the queue when their turn comes.
+    """
+
+    def __init__(self, warn_after: float = ACK_WARN_SECONDS, deadline: float = ACK_DEADLINE_SECONDS,
+                 stack_samples: bool = ACK_STACK_SAMPLES):
+        self.warn_after = warn_after
+        self.deadline = deadline
+        self.stack_samples = stack_samples
+        self._queue: list = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    def watch(self, ack: TimedAck):
+        self._schedule(ack.received_at + self.warn_after, ack)
+
+    def _schedule(self, due: float, ack: TimedAck):
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ack-watchdog", daemon=True)
+                self._thread.start()
+            heapq.heappush(self._queue, (due, next(self._sequence), ack))
+            if self._queue[0][2] is ack:
+                self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue or self._queue[0][0] > time.perf_counter():
+                    self._condition.wait(self._queue[0][0] - time.perf_counter() if self._queue else None)
+                _, _, ack = heapq.heappop(self._queue)
+            if ack.response is None:
+                self._check(ack)
+
+    def _check(self, ack: TimedAck):
+        elapsed = time.perf_counter() - ack.received_at
+        if elapsed >= self.deadline:
+            ack_missed.inc(request=ack.name)
+            logger.error(f"{ack.name} was not acknowledged within {self.deadline:g}s")
+            return
+        ack_late.inc(request=ack.name)
+        message = f"{ack.name} not acknowledged after {elapsed:.2f}s, the deadline is {self.deadline:g}s"
+        if self.stack_samples:
+            message += f"\n{stack_sample()}"
+        logger.warning(message)
+        self._schedule(ack.received_at + self.deadline, ack)
+
+
+watchdog = AckWatchdog()
+
+
+def watch_ack(context, body, next):
+    # Global Bolt middleware, registered first: times ack() for the metrics and the watchdog
+    ack = TimedAck(context.ack, request_name(body), time.perf_counter())
+    context["ack"] = ack
+    watchdog.watch(ack)
+    next()
+
+
+async def watch_ack_async(context, body, next):
+    ack = TimedAck(context.ack, request_name(body), time.perf_counter())
+    context["ack"] = ack
+    watchdog.watch(ack)
+    await next()
+
+
+early_ack_executor = ThreadPoolExecutor(max_workers=EARLY_ACK_MAX_WORKERS, thread_name_prefix="early-ack")
+
+
+def acks_early(func=None, *, executor=None):
+    """Acknowledges before the listener runs and runs the listener on a background executor.
+
+    executor is anything with submit(fn, *args), such as a listener_lanes.Lane, early_ack_executor
+    without one.
+
+    Only for listeners whose ack() takes no arguments: an ack() with a response, such as
+    response_action="errors", comes too late and is logged and dropped.
+    """
+    if func is None:
+        return functools.partial(acks_early, executor=executor)
+    if "ack" not in inspect.signature(inspect.unwrap(func)).parameters:
+        raise TypeError(f"{func.__name__} must take ack to be acknowledged early")
+    name = func.__name__
+
+    def late_ack(*args, **kwargs):
+        if args or kwargs:
+            logger.warning(f"{name} acknowledges early, its ack() response was dropped")
+
+    def run(kwargs):
+        try:
+            func(**kwargs)
+        except Exception as e:
+            logger.exception(f"{name} failed after acknowledging early: {e}")
+
+    @functools.wraps(func)
+    def wrapper(**kwargs):
+        kwargs["ack"]()
+        (executor or early_ack_executor).submit(run, {**kwargs, "ack": late_ack})
+
+    return wrapper
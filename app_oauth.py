@@ -1,16 +1,72 @@
-import logging
 import os
+import logging
 from dotenv import load_dotenv
 load_dotenv()
 from slack_bolt import App, BoltResponse
+from slack_bolt.authorization.authorize import InstallationStoreAuthorize
 from slack_bolt.oauth.callback_options import CallbackOptions, SuccessArgs, FailureArgs
 from slack_bolt.oauth.oauth_settings import OAuthSettings
 
-from slack_sdk.oauth.installation_store import FileInstallationStore
-from slack_sdk.oauth.state_store import FileOAuthStateStore
+from ack_watchdog import watch_ack
+from app import outbox_worker, register_listeners, workspaces
+from http_pool import ConnectionPool
+from installations import AuthorizationCache, SQLiteInstallationStore, TeamClientPool, team_key
+from log_pipeline import configure_logging
+from oauth_state import SQLiteOAuthStateStore
+from rate_limiter import RateLimitedWebClient, RateLimiter
+from ssl_context import create_ssl_context
+
+
+configure_logging()
+
+# Custom SSL context built on the certifi CA bundle
+context = create_ssl_context()
+
+# Installations live in the app's SQLite database, indexed by enterprise, team and user
+installation_store = SQLiteInstallationStore()
 
 
-logging.basicConfig(level=logging.DEBUG)
+class CachedAuthorize(InstallationStoreAuthorize):
+    """InstallationStoreAuthorize that skips the store and auth.test for workspaces it has seen."""
+
+    def __init__(self, *, authorizations: AuthorizationCache, **kwargs):
+        super().__init__(**kwargs)
+        self.authorizations = authorizations
+
+    def __call__(self, *, context, enterprise_id, team_id, user_id, **actor_ids):
+        key = (*team_key(enterprise_id, team_id, context.is_enterprise_install), user_id, *sorted(actor_ids.items()))
+        result = self.authorizations.get(key)
+        if result is None:
+            result = super().__call__(context=context, enterprise_id=enterprise_id, team_id=team_id, user_id=user_id, **actor_ids)
+            if result is not None:
+                self.authorizations.put(key, result)
+        return result
+
+
+# Every workspace gets its own client and rate limits, all of them share the keep-alive connections
+connection_pool = ConnectionPool(context)
+team_clients = TeamClientPool(
+    lambda token: RateLimitedWebClient(
+        token=token, base_url=os.getenv("SLACK_API_URL", RateLimitedWebClient.BASE_URL), ssl=context,
+        pool=connection_pool, rate_limiter=RateLimiter.from_env(),
+    )
+)
+installation_store.on_change(team_clients.invalidate)
+
+
+def bot_client(team: tuple) -> RateLimitedWebClient:
+    # Campaigns are resolved and sent by the outbox worker, outside of a request, with the bot of
+    # the workspace's installation
+    enterprise_id, team_id = team
+    bot = installation_store.find_bot(
+        enterprise_id=enterprise_id or None, team_id=team_id or None, is_enterprise_install=not team_id
+    )
+    if bot is None:
+        raise LookupError(f"The app is not installed in {team}")
+    return team_clients.get(team, bot.bot_token)
+
+
+workspaces.client_for = bot_client
 
 
 # Callback to run on successful installation
@@ -26,23 +82,65 @@ def failure(args: FailureArgs) -> BoltResponse:
     # return BoltResponse(status=args.suggested_status_code, body=args.reason)
 
 
+oauth_settings = OAuthSettings(
+    client_id=os.getenv("SLACK_CLIENT_ID"),
+    client_secret=os.getenv("SLACK_CLIENT_SECRET"),
+    # The bot scopes of manifest.json
+    scopes=[
+        "chat:write",
+        "commands",
+        "users:read.email",
+        "users:read",
+        "chat:write.customize",
+        "chat:write.public",
+        "files:read",
+        "im:write",
+    ],
+    #user_scopes=[],
+    #redirect_uri="https://slack.com/oauth/v2/authorize",
+    install_path="/slack/install",
+    redirect_uri_path="/slack/oauth_redirect",
+    # In the app's SQLite database, so any worker process can finish an install another one started
+    state_store=SQLiteOAuthStateStore(expiration_seconds=600),
+    callback_options=CallbackOptions(success=success, failure=failure),
+)
+
 # Initialization
 app = App(
     signing_secret=os.getenv("SLACK_SIGNING_SECRET"),
-    installation_store=FileInstallationStore(),
-    oauth_settings=OAuthSettings(
-        client_id=os.getenv("SLACK_CLIENT_ID"),
-        client_secret=os.getenv("SLACK_CLIENT_SECRET"),
-        scopes=["channels:history", "chat:write", "commands"],
-        #user_scopes=[],
-        #redirect_uri="https://slack.com/oauth/v2/authorize",
-        install_path="/slack/install",
-        redirect_uri_path="/slack/oauth_redirect",
-        state_store=FileOAuthStateStore(expiration_seconds=600),
-        callback_options=CallbackOptions(success=success, failure=failure),
+    installation_store=installation_store,
+    authorize=CachedAuthorize(
+        authorizations=AuthorizationCache(installation_store),
+        installation_store=installation_store,
+        client_id=oauth_settings.client_id,
+        client_secret=oauth_settings.client_secret,
+        logger=logging.getLogger("slack_bolt.App"),
+        user_token_resolution=oauth_settings.user_token_resolution,
     ),
+    oauth_settings=oauth_settings,
 )
 
-# Start Bolt app
+# Uninstalls and revoked tokens delete the installation, which also drops its cached authorization and client
+app.enable_token_revocation_listeners()
+
+# Times ack() for every request, registered first like in app.py
+app.middleware(watch_ack)
+
+
+@app.middleware
+def use_team_client(context, next):
+    # Bolt builds a WebClient per request, swap in the workspace's pooled one
+    if context.token:
+        key = team_key(context.enterprise_id, context.team_id, context.is_enterprise_install)
+        context["client"] = team_clients.get(key, context.token)
+    next()
+
+
+# The same shortcut, modal and button listeners as the Socket Mode app
+register_listeners(app)
+
+# Start Bolt's development server, production runs wsgi.py under gunicorn (see gunicorn.conf.py)
 if __name__ == "__main__":
+    # A single process, so it sends the outbox itself
+    outbox_worker.start()
     app.start(3000)
@@ -0,0 +1,207 @@
+import os
+import re
+import time
+import asyncio
+import logging
+from dotenv import load_dotenv
+load_dotenv()
+
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+
+from ack_watchdog import watch_ack_async
+from blocks import cached_modal_view, is_checked, selected_cta_button_count
+from delivery_report import DeliveryReport, error_code
+from dm_channels import DMChannelCache, is_user_id
+from email_resolver import EmailCache, EmailResolver, download_file_text, find_emails
+from fanout import async_fan_out
+from log_pipeline import configure_logging, log_event
+from metrics import (
+    METRICS_PORT,
+    broadcast_duration,
+    broadcast_messages,
+    broadcast_size,
+    instrumented,
+    start_metrics_server,
+)
+from rate_limiter import AsyncRateLimitedWebClient, RateLimiter, rate_limited_retries
+from socket_connections import DEDUPE_SECONDS, RecentKeys
+from ssl_context import create_ssl_context
+from submission import (
+    build_message_payload,
+    message_from_submission,
+    pasted_emails,
+    selected_conversations,
+    submission_key,
+    uploaded_files,
+    validate_submission,
+)
+from view_updates import ViewUpdateCoalescer
+
+configure_logging()
+
+
+# asyncio build of app.py: the same handlers on AsyncApp, so a single process can run
+# many broadcasts at once without tying up an OS thread per Web API call.
+context = create_ssl_context()
+
+rate_limiter = RateLimiter.from_env()
+
+client = AsyncRateLimitedWebClient(
+    token=os.getenv("SLACK_BOT_TOKEN"),
+    ssl=context,
+    rate_limiter=rate_limiter
+)
+
+# Initialization
+app = AsyncApp(client=client)
+
+dm_channels = DMChannelCache()
+email_resolver = EmailResolver(EmailCache())
+
+# Rapid checkbox and dropdown clicks on one modal share a single in-flight views_update
+modal_updates = ViewUpdateCoalescer(client)
+
+
+app.middleware(watch_ack_async)
+
+
+@app.middleware
+async def use_rate_limited_client(context, next):
+    # Bolt builds a plain AsyncWebClient per request, swap in the shared rate limited one
+    context["client"] = client
+    await next()
+
+
+@app.shortcut("bt_comms_shortcut")
+@instrumented
+async def open_modal(ack, body, client, logger, shortcut):
+    await ack()
+    log_event(logger, "shortcut", body)
+    await client.views_open(
+        trigger_id=shortcut["trigger_id"],
+        view=cached_modal_view(sender_identity_on=False, call_to_action_on=False)
+    )
+
+@app.action("customize_sender_identity-action")
+@instrumented
+async def handle_customize_sender_id_checkbox(ack, body, client, logger):
+    await ack()
+    log_event(logger, "block_actions", body)
+    state_values = body["view"]["state"]["values"]
+    customize_sender_identity_selected = bool(body["actions"][0]["selected_options"])
+    call_to_action_selected = is_checked(state_values, "call_to_action", "call_to_action-action")
+    number_of_cta_buttons = selected_cta_button_count(state_values)
+
+    await modal_updates.update_async(body["view"]["id"], body["view"]["hash"], cached_modal_view(customize_sender_identity_selected, call_to_action_selected, number_of_cta_buttons))
+
+@app.action("call_to_action-action")
+@instrumented
+async def handle_call_to_action_checkbox(ack, body, client, logger):
+    await ack()
+    log_event(logger, "block_actions", body)
+    call_to_action_selected = bool(body["actions"][0]["selected_options"])
+    customize_sender_identity_selected = is_checked(body["view"]["state"]["values"], "customize_sender_identity", "customize_sender_identity-action")
+
+    await modal_updates.update_async(body["view"]["id"], body["view"]["hash"], cached_modal_view(customize_sender_identity_selected, call_to_action_selected))
+
+@app.action("call_to_action_dropdown-action")
+@instrumented
+async def handle_call_to_action_dropdown_action(ack, body, client, logger):
+    await ack()
+    log_event(logger, "block_actions", body)
+    call_to_action_requested_buttons = int(body["actions"][0]["selected_option"]["value"])
+    customize_sender_identity_selected = is_checked(body["view"]["state"]["values"], "customize_sender_identity", "customize_sender_identity-action")
+
+    await modal_updates.update_async(body["view"]["id"], body["view"]["hash"], cached_modal_view(customize_sender_identity_selected, True, call_to_action_requested_buttons))
+
+@app.action("plain_text_input-action")
+@instrumented
+async def handle_some_action(ack, body, logger):
+    await ack()
+    log_event(logger, "block_actions", body)
+
+# Submissions this process broadcast lately. It sends without the outbox of app.py, so a redelivery
+# after a restart is not caught.
+broadcast_submissions = RecentKeys(DEDUPE_SECONDS)
+
+@app.view("initial_view")
+@instrumented
+async def handle_comms_submission_event(ack, body, client, logger, view):
+    log_event(logger, "view_submission", body)
+    # This app sends right away, scheduled delivery needs the outbox of app.py
+    errors = validate_submission(view, scheduling=False)
+    if errors:
+        await ack(response_action="errors", errors=errors)
+        return
+    await ack()
+    if not broadcast_submissions.add(submission_key(view)):
+        logger.warning(f"Dropped redelivered submission of view {view['id']}")
+        return
+
+    message = message_from_submission(view)
+    emails, _ = pasted_emails(view)
+    for file in uploaded_files(view):
+        text = await asyncio.to_thread(download_file_text, file.get("url_private_download") or file["url_private"], client.token, context)
+        emails += find_emails(text)
+    resolved, unresolved = await email_resolver.resolve_async(client, list(dict.fromkeys(emails)))
+    multi_conversations_selected = list(dict.fromkeys([*selected_conversations(view), *resolved.values()]))
+    await dm_channels.prefetch_async(client, multi_conversations_selected)
+    # DM channels returned by chat.postMessage, stored once the broadcast is over
+    learned_dm_channels = {}
+
+    async def send_message_to_conversation(conversation_id: str):
+        message_payload = build_message_payload(dm_channels.resolve(conversation_id), **message)
+        log_event(logger, "message_payload", level=logging.DEBUG, payload=message_payload)
+        response = await client.chat_postMessage(**message_payload)
+        if is_user_id(conversation_id):
+            learned_dm_channels[conversation_id] = response.get("channel")
+        return response
+
+    # One asyncio task per conversation, bounded by FANOUT_MAX_WORKERS
+    started = time.perf_counter()
+    results = await async_fan_out(send_message_to_conversation, multi_conversations_selected)
+    broadcast_duration.observe(time.perf_counter() - started)
+    await asyncio.to_thread(dm_channels.remember_many, learned_dm_channels)
+    report = DeliveryReport.from_rows(view["id"], [
+        {
+            "conversation_id": result.item,
+            "status": "sent" if result.ok else "failed",
+            "error": None if result.ok else error_code(result.error),
+            "ts": result.value.get("ts") if result.ok else None,
+            "latency_ms": result.latency * 1000,
+            "retries": rate_limited_retries(result.value if result.ok else getattr(result.error, "response", None)),
+        }
+        for result in results
+    ] + [
+        {"conversation_id": email, "status": "failed", "error": error, "ts": None, "latency_ms": None, "retries": 0}
+        for email, error in unresolved.items()
+    ])
+    broadcast_size.observe(report.total)
+    broadcast_messages.inc(report.sent, status="sent")
+    broadcast_messages.inc(report.failed, status="failed")
+    logger.info(f"\nSENT TO {report.sent} OF {report.total} CONVERSATIONS, P50 {report.p50_ms} MS, P95 {report.p95_ms} MS\n")
+    await client.chat_postMessage(channel=body["user"]["id"], text=report.text(), blocks=report.blocks())
+
+# CTA buttons in sent messages, button_action_1 up to button_action_{MAX_CTA_BUTTONS}
+@app.action(re.compile(r"^button_action_\d+$"))
+@instrumented
+async def button_was_clicked(ack, body, logger):
+    await ack()
+    log_event(logger, "block_actions", body)
+
+@app.action("multi_conversations_select-action")
+@instrumented
+async def multi_conversations_select_action(ack, body, logger):
+    await ack()
+    log_event(logger, "block_actions", body)
+
+
+async def main():
+    if METRICS_PORT:
+        start_metrics_server()
+    await AsyncSocketModeHandler(app, os.getenv("SLACK_APP_TOKEN")).start_async()
+
+# Start Bolt app
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,161 @@
+"""End-to-end broadcast benchmark against the local fake Slack Web API.
+
+Drives app.handle_comms_submission_event with 10, 100, 1k and 10k conversations and waits until
+the outbox has sent every message and the delivery report. Reports wall time, throughput and peak
+Python memory (tracemalloc, measured in a second run so it does not slow the timed one). The fake
+API runs in this process, so its own CPU use is part of the numbers.
+
+Rate limits are lifted so the numbers show the app's own overhead; pass --real-rate-limits to keep them.
+--faults injects 429s, Slack errors, slow responses and dropped connections (see tests/fake_slack_api.py).
+Results are saved to benchmarks/results/<commit>.json; compare two commits with --compare.
+
+Run from the project root:
+    python benchmarks/bench_broadcast.py --latency 0.02
+    python benchmarks/bench_broadcast.py --compare benchmarks/results/<older commit>.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from slack_bolt import BoltContext
+
+from tests.fake_slack_api import FakeSlackAPI, parse_faults
+
+RESULTS_DIR = os.path.join(PROJECT_ROOT, "benchmarks", "results")
+SIZES = (10, 100, 1000, 10000)
+# A broadcast that has not been reported after this long is reported as a hang instead of waited for
+TIMEOUT_SECONDS = 600
+
+# Campaigns are keyed by view ID and hash, every run submits a new view state so it is not a replay
+_submissions = itertools.count()
+
+
+def commit_id() -> str:
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=PROJECT_ROOT, capture_output=True, text=True).stdout.strip()
+    commit = git("rev-parse", "--short", "HEAD") or "unknown"
+    return commit + ("-dirty" if git("status", "--porcelain", "--untracked-files=no") else "")
+
+
+def submission_body(conversation_ids: list) -> dict:
+    values = {
+        "conversation_select_block": {"conversation_select_action": {"selected_conversations": conversation_ids}},
+        "rich_text_input": {"rich_text_input-action": {"rich_text_value": {
+            "type": "rich_text",
+            "elements": [{"type": "rich_text_section", "elements": [{"type": "text", "text": "Benchmark broadcast"}]}],
+        }}},
+        "customize_sender_identity": {"customize_sender_identity-action": {"selected_options": []}},
+        "call_to_action": {"call_to_action-action": {"selected_options": []}},
+    }
+    view = {"id": "V0BENCH", "hash": f"1700000000.bench{next(_submissions)}", "callback_id": "initial_view", "state": {"values": values}}
+    return {"type": "view_submission", "user": {"id": "U0BENCH"}, "team": {"id": "T0FAKE"}, "view": view}
+
+
+def run_broadcast(comms_app, conversations: int, timeout: float = TIMEOUT_SECONDS) -> float:
+    # Returns the wall time from the submission to the delivery report
+    body = submission_body([f"C{i:08d}" for i in range(conversations)])
+    context = BoltContext({"team_id": body["team"]["id"]})
+    outbox, worker = comms_app.outbox, comms_app.outbox_worker
+    started = time.perf_counter()
+    comms_app.handle_comms_submission_event(
+        ack=lambda **kwargs: None, body=body, context=context, logger=comms_app.logger, view=body["view"]
+    )
+    if not outbox.unfinished_campaigns():
+        raise RuntimeError(f"Campaign {comms_app.submission_key(body['view'])} was not queued")
+    # The worker is driven here, it has the recipients resolved in the submissions lane
+    while outbox.unfinished_campaigns():
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError(f"{conversations} conversations not sent and reported after {timeout:g} s")
+        if not worker.drain_once():
+            time.sleep(0.0005)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end broadcast benchmark")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the fake API adds to every call")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--faults", default="", help='e.g. "chat.postMessage:rate_limited=0.01,retry_after=1,dropped=0.001"')
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=TIMEOUT_SECONDS, help="seconds one broadcast may take")
+    parser.add_argument("--real-rate-limits", action="store_true")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    api = FakeSlackAPI(latency=args.latency, faults=parse_faults(args.faults), seed=args.seed).start()
+    database = tempfile.NamedTemporaryFile(suffix=".sqlite3", delete=False).name
+    os.environ.update({
+        "SLACK_BOT_TOKEN": "xoxb-benchmark",
+        "SLACK_API_URL": api.url,
+        "COMMS_DB_PATH": database,
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+    })
+    if not args.real_rate_limits:
+        os.environ["SLACK_RATE_LIMITS"] = "chat.postMessage=1e9,views.=1e9,conversations.=1e9,users.lookupByEmail=1e9"
+    import app as comms_app
+
+    results = []
+    try:
+        for conversations in args.sizes:
+            api.calls.clear()
+            api.injected.clear()
+            wall = run_broadcast(comms_app, conversations, args.timeout)
+            calls = dict(api.calls)
+            injected = {f"{method}:{fault}": count for (method, fault), count in api.injected.items()}
+            tracemalloc.start()
+            run_broadcast(comms_app, conversations, args.timeout)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results.append({
+                "conversations": conversations,
+                "wall_s": round(wall, 4),
+                "messages_per_s": round(conversations / wall, 1),
+                "peak_mb": round(peak / 2**20, 2),
+                "api_calls": calls,
+                "injected_faults": injected,
+            })
+            print(f"{conversations:>6} conversations  {wall:8.3f} s  {conversations / wall:9.1f} msg/s  "
+                  f"peak {peak / 2**20:7.2f} MB", flush=True)
+    finally:
+        api.stop()
+        os.unlink(database)
+
+    commit = commit_id()
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{commit}.json")
+    with open(path, "w") as f:
+        json.dump({
+            "commit": commit,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "latency_s": args.latency,
+            "faults": args.faults,
+            "real_rate_limits": args.real_rate_limits,
+            "results": results,
+        }, f, indent=2)
+    print(f"Saved {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {row["conversations"]: row for row in json.load(f)["results"]}
+        print(f"\nCompared with {args.compare}:")
+        for row in results:
+            before = baseline.get(row["conversations"])
+            if before:
+                print(f"{row['conversations']:>6} conversations  wall {row['wall_s'] / before['wall_s'] - 1:+7.1%}  "
+                      f"peak {row['peak_mb'] - before['peak_mb']:+7.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
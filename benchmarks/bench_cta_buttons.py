@@ -0,0 +1,47 @@
+"""Microbenchmark: CTA block factory vs the previous deepcopy-based generate_cta_buttons.
+
+Run from the project root:
+    python benchmarks/bench_cta_buttons.py
+"""
+import copy
+import os
+import sys
+import timeit
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from blocks import MAX_CTA_BUTTONS, cta_buttons, generate_cta_buttons
+
+
+def generate_cta_buttons_deepcopy(num_buttons):
+    # The implementation generate_cta_buttons had before the block factory
+    blocks = []
+    for i in range(num_buttons):
+        cta_buttons_with_unique_block_id = copy.deepcopy(cta_buttons)
+        cta_buttons_with_unique_block_id[0]["block_id"] = f"cta_button_header_{i+1}"
+        cta_buttons_with_unique_block_id[0]["text"]["text"] = f"CTA Button {i+1}"
+        cta_buttons_with_unique_block_id[1]["block_id"] = f"cta_button_text_{i+1}"
+        cta_buttons_with_unique_block_id[1]["label"]["text"] = f"Button Text {i+1}"
+        cta_buttons_with_unique_block_id[2]["block_id"] = f"cta_button_link_{i+1}"
+        cta_buttons_with_unique_block_id[2]["label"]["text"] = f"Link {i+1}"
+        blocks += cta_buttons_with_unique_block_id
+    return blocks
+
+
+def bench(func, num_buttons, number=20000):
+    return min(timeit.repeat(lambda: func(num_buttons), number=number, repeat=5)) / number
+
+
+def main():
+    print(f"{'buttons':>8} {'deepcopy (us)':>14} {'factory (us)':>13} {'speedup':>8}")
+    for num_buttons in (1, 3, MAX_CTA_BUTTONS):
+        assert generate_cta_buttons(num_buttons) == generate_cta_buttons_deepcopy(num_buttons)
+        before = bench(generate_cta_buttons_deepcopy, num_buttons)
+        after = bench(generate_cta_buttons, num_buttons)
+        print(f"{num_buttons:>8} {before * 1e6:>14.2f} {after * 1e6:>13.2f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Per-call Web API latency with and without the pooled keep-alive transport.
+
+Serves the fake Slack Web API over TLS with a throwaway self-signed certificate (made with the
+openssl command line tool), and calls chat.postMessage through a PooledWebClient built on the
+app's certifi SSL context, once with pool_size=0 (the SDK's urllib transport, a new TCP and TLS
+connection per call) and once pooled. --threads runs the calls from several threads at once, as a
+broadcast fan-out does.
+
+Run from the project root:
+    python benchmarks/bench_http_pool.py --calls 500 --threads 1 8
+"""
+import os
+import sys
+import ssl
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from http_pool import PooledWebClient
+from ssl_context import create_ssl_context
+from tests.fake_slack_api import FakeSlackAPI
+
+
+def self_signed_certificate(directory: str) -> tuple[str, str]:
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-keyout", key, "-out", cert,
+         "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1"],
+        check=True, capture_output=True,
+    )
+    return cert, key
+
+
+def measure(client: PooledWebClient, calls: int, threads: int) -> list:
+    def call(i: int) -> float:
+        started = time.perf_counter()
+        client.chat_postMessage(channel=f"C{i:08d}", text="Benchmark")
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(call, range(calls)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pooled vs unpooled Web API transport")
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the fake API adds to every call")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = self_signed_certificate(directory)
+        server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        server_context.load_cert_chain(cert, key)
+        # The app's certifi context, additionally trusting the stand-in's certificate
+        client_context = create_ssl_context()
+        client_context.load_verify_locations(cert)
+
+        with FakeSlackAPI(latency=args.latency, ssl_context=server_context) as api:
+            for threads in args.threads:
+                for label, pool_size in (("unpooled", 0), ("pooled", max(threads, 1))):
+                    client = PooledWebClient(token="xoxb-benchmark", base_url=api.url, ssl=client_context, pool_size=pool_size)
+                    # Warm up, so both runs start with the imports and the first handshake behind them
+                    measure(client, threads, threads)
+                    started = time.perf_counter()
+                    latencies = sorted(measure(client, args.calls, threads))
+                    wall = time.perf_counter() - started
+                    print(f"{label:>8}  {threads:>2} threads  mean {statistics.mean(latencies) * 1000:7.2f} ms  "
+                          f"p50 {latencies[len(latencies) // 2] * 1000:7.2f} ms  "
+                          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:7.2f} ms  "
+                          f"{args.calls / wall:8.1f} calls/s", flush=True)
+                    if client.pool:
+                        client.pool.close()
+
+
+if __name__ == "__main__":
+    main()
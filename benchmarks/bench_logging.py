@@ -0,0 +1,72 @@
+"""Microbenchmark: cost on the listener thread of logging one interaction payload.
+
+Compares the previous `logger.info(body)` through a synchronous StreamHandler with log_event()
+through the queue pipeline. Both write to os.devnull.
+
+Run from the project root:
+    python benchmarks/bench_logging.py
+"""
+import os
+import sys
+import queue
+import logging
+import timeit
+from logging.handlers import QueueListener
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from blocks import cached_modal_view
+from log_pipeline import LOG_FORMAT, DeferredQueueHandler, RedactingFormatter, log_event
+
+BODY = {
+    "type": "view_submission",
+    "token": "xoxb-0000-0000",
+    "team": {"id": "T0000", "domain": "example"},
+    "user": {"id": "U0000", "username": "ada", "team_id": "T0000"},
+    "view": {**cached_modal_view(True, True, 10), "id": "V0000", "hash": "1700000000.abcd", "state": {"values": {}}},
+}
+
+
+def sync_logger(stream) -> logging.Logger:
+    logger = logging.getLogger("bench.sync")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    logger.addHandler(handler)
+    return logger
+
+
+def queued_logger(stream) -> tuple[logging.Logger, QueueListener]:
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger("bench.queued")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(RedactingFormatter(LOG_FORMAT))
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    return logger, listener
+
+
+def bench(func, number=20000):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def main():
+    with open(os.devnull, "w") as stream:
+        before_logger = sync_logger(stream)
+        after_logger, listener = queued_logger(stream)
+        before = bench(lambda: before_logger.info(BODY), number=2000)
+        after = bench(lambda: log_event(after_logger, "view_submission", BODY))
+        listener.stop()
+    print(f"payload: {len(str(BODY))} chars")
+    print(f"{'logger.info(body) (us)':>24} {'log_event (us)':>15} {'speedup':>8}")
+    print(f"{before * 1e6:>24.2f} {after * 1e6:>15.2f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
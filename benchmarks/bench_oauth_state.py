@@ -0,0 +1,107 @@
+"""Install flow throughput of the OAuth state stores.
+
+Every flow issues a state, as the install page does, and consumes it, as the OAuth redirect does.
+Flows run in parallel worker processes, like HTTP workers sharing one host, each with a few threads.
+Compares the SDK's FileOAuthStateStore (one file per state) with SQLiteOAuthStateStore (one shared
+database file). A share of the flows is abandoned before the redirect, the states they leave behind
+are counted once they expired.
+
+Run from the project root:
+    python benchmarks/bench_oauth_state.py --flows 5000 --processes 1 4
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from slack_sdk.oauth.state_store import FileOAuthStateStore
+
+from oauth_state import SQLiteOAuthStateStore
+
+
+def file_store(directory: str, expiration_seconds: int):
+    return FileOAuthStateStore(expiration_seconds=expiration_seconds, base_dir=os.path.join(directory, "states"))
+
+
+def sqlite_store(directory: str, expiration_seconds: int):
+    return SQLiteOAuthStateStore(os.path.join(directory, "comms.sqlite3"), expiration_seconds=expiration_seconds,
+                                 sweep_interval=0)
+
+
+STORES = {"file": file_store, "sqlite": sqlite_store}
+
+
+def run_worker(store_name: str, directory: str, flows: int, threads: int, abandon_every: int, start):
+    # One HTTP worker process, its own store instance on the shared directory
+    store = STORES[store_name](directory, 600)
+    start.wait()
+
+    def flow(i):
+        state = store.issue()
+        if abandon_every and i % abandon_every == 0:
+            return True
+        return store.consume(state)
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        if not all(executor.map(flow, range(flows))):
+            raise RuntimeError("A state issued in this run was rejected")
+
+
+def leftover_states(store_name: str, directory: str) -> int:
+    if store_name == "file":
+        return len(os.listdir(os.path.join(directory, "states")))
+    # What the background sweep finds once the abandoned states expired
+    store = sqlite_store(directory, 600)
+    store.sweep(now=time.time() + 601)
+    return len(store)
+
+
+def measure(store_name: str, flows: int, processes: int, threads: int, abandon_every: int) -> tuple:
+    context = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as directory:
+        STORES[store_name](directory, 600)  # creates the directory or schema up front
+        start = context.Event()
+        workers = [
+            context.Process(target=run_worker, args=(store_name, directory, flows // processes, threads, abandon_every, start))
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        time.sleep(0.2)
+        started = time.perf_counter()
+        start.set()
+        for worker in workers:
+            worker.join()
+            if worker.exitcode:
+                raise RuntimeError(f"A {store_name} worker failed")
+        elapsed = time.perf_counter() - started
+        return flows / elapsed, leftover_states(store_name, directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OAuth install flows per second, file vs SQLite state store")
+    parser.add_argument("--flows", type=int, default=5000)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--threads", type=int, default=4, help="Threads per worker process")
+    parser.add_argument("--abandon-every", type=int, default=10, help="Every Nth flow never reaches the redirect, 0 for none")
+    args = parser.parse_args()
+
+    print(f"{args.flows} install flows, {args.threads} threads per process")
+    for processes in args.processes:
+        baseline = None
+        for store_name in STORES:
+            rate, leftover = measure(store_name, args.flows, processes, args.threads, args.abandon_every)
+            baseline = baseline or rate
+            print(f"{processes:>2} processes  {store_name:>6}  {rate:8.0f} flows/s  {rate / baseline:5.2f}x  "
+                  f"{leftover:5d} expired states left behind")
+
+
+if __name__ == "__main__":
+    main()
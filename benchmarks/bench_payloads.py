@@ -0,0 +1,114 @@
+"""CPU time per recipient spent building and serializing the chat.postMessage body.
+
+Compares the per-send path (build_message_payload + chat_postMessage, which json.dumps the whole
+body for every conversation) with a PreparedMessage built once per campaign, using the json module
+and, when it is installed, orjson. The client's transport answers from memory, so only the client
+side work is measured: building the payload, the SDK's request handling, encoding and parsing a
+short response.
+
+Run from the project root:
+    python benchmarks/bench_payloads.py --recipients 10000 --cta-buttons 5
+"""
+import os
+import sys
+import time
+import argparse
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import message_encoding
+from http_pool import PooledWebClient
+from message_encoding import PreparedMessage
+from submission import build_message_payload
+
+RESPONSE = '{"ok":true,"channel":"C00000000","ts":"1700000000.000100"}'
+
+
+class InMemoryWebClient(PooledWebClient):
+    """Answers every call with RESPONSE without touching the network, counting the bytes sent."""
+
+    sent_bytes = 0
+
+    def _perform_urllib_http_request_internal(self, url, req):
+        body = getattr(self._encoded, "body", None)
+        self.sent_bytes += len(body if body is not None and req.data is None else req.data)
+        return {"status": 200, "headers": {"Content-Type": "application/json"}, "body": RESPONSE}
+
+
+def campaign_message(paragraphs: int, cta_buttons: int) -> dict:
+    sections = [
+        {"type": "rich_text_section", "elements": [
+            {"type": "text", "text": f"Paragraph {i}: the quarterly all-hands moves to Thursday, details below. ", "style": {"bold": i == 0}},
+            {"type": "link", "url": f"https://example.com/announcements/{i}", "text": "Read more"},
+            {"type": "emoji", "name": "tada"},
+        ]}
+        for i in range(paragraphs)
+    ]
+    buttons = [
+        {"type": "actions", "block_id": f"button_id_{i}", "elements": [{
+            "type": "button", "action_id": f"button_action_{i}", "url": f"https://example.com/cta/{i}",
+            "text": {"type": "plain_text", "text": f"Call to action {i}", "emoji": True},
+        }]}
+        for i in range(1, cta_buttons + 1)
+    ]
+    return {
+        "blocks": [{"type": "rich_text", "elements": sections}],
+        "sender_name": "Company Comms",
+        "icon_url": "https://example.com/icon.png",
+        "cta_elements": buttons or None,
+    }
+
+
+def cpu_per_recipient(send, recipients: int) -> float:
+    # Microseconds of process CPU time per recipient
+    started = time.process_time()
+    for i in range(recipients):
+        send(f"C{i:08d}")
+    return (time.process_time() - started) / recipients * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-recipient message building and serialization cost")
+    parser.add_argument("--recipients", type=int, default=10000)
+    parser.add_argument("--paragraphs", type=int, default=10)
+    parser.add_argument("--cta-buttons", type=int, default=5)
+    args = parser.parse_args()
+
+    message = campaign_message(args.paragraphs, args.cta_buttons)
+    client = InMemoryWebClient(token="xoxb-benchmark", pool_size=0)
+    installed_orjson = message_encoding.orjson
+    encoders = [("json", None)] + ([("orjson", installed_orjson)] if installed_orjson else [])
+
+    def per_send(channel):
+        client.chat_postMessage(**build_message_payload(channel, **message))
+
+    runs = [("per send, json", None, per_send)]
+    for name, encoder in encoders:
+        message_encoding.orjson = encoder
+        # Built once per campaign, part of the measured time
+        prepared = {}
+
+        def prepared_send(channel, prepared=prepared):
+            if "message" not in prepared:
+                prepared["message"] = PreparedMessage(message)
+            client.api_call("chat.postMessage", json=prepared["message"].for_channel(channel))
+
+        runs.append((f"prepared, {name}", encoder, prepared_send))
+
+    print(f"{args.recipients} recipients, {len(PreparedMessage(message).for_channel('C00000000').body)} byte body")
+    baseline = None
+    for label, encoder, send in runs:
+        message_encoding.orjson = encoder
+        send("C00000000")  # warm up
+        client.sent_bytes = 0
+        micros = cpu_per_recipient(send, args.recipients)
+        baseline = baseline or micros
+        print(f"{label:>18}  {micros:8.1f} µs CPU per recipient  {baseline / micros:5.2f}x  "
+              f"{client.sent_bytes / args.recipients:7.0f} bytes per request")
+    message_encoding.orjson = installed_orjson
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,460 @@
+import functools
+
+# Largest number of CTA buttons offered in the dropdown. A message allows 50 blocks and a
+# modal 100, each button takes three modal blocks and one message block.
+MAX_CTA_BUTTONS = 10
+
+# Choices of the "Spread delivery over" dropdown, (label, seconds)
+STAGGER_WINDOWS = (("15 minutes", 15 * 60), ("1 hour", 3600), ("4 hours", 4 * 3600), ("8 hours", 8 * 3600), ("24 hours", 24 * 3600))
+
+initial_view_blocks = [
+    {
+        "type": "input",
+        "element": {
+            "type": "rich_text_input",
+            "action_id": "rich_text_input-action"
+        },
+        "block_id": "rich_text_input",
+        "label": {
+            "type": "plain_text",
+            "text": "Message",
+            "emoji": True
+        }
+    },
+    # Gemini provided the conversations select block below. This was not avalilable in Block Kit Builder.
+    {
+        "type": "input",
+        "block_id": "conversation_select_block",
+        "optional": True,
+        "label": {
+            "type": "plain_text",
+            "text": "Choose a conversation:"
+        },
+        "element": {
+            "type": "multi_conversations_select",
+            "placeholder": {
+                "type": "plain_text",
+                "text": "Select a conversation"
+            },
+            "action_id": "conversation_select_action"
+        }
+    },
+    {
+        "type": "input",
+        "block_id": "recipient_emails",
+        "optional": True,
+        "element": {
+            "type": "plain_text_input",
+            "action_id": "recipient_emails-action",
+            "multiline": True,
+            "placeholder": {
+                "type": "plain_text",
+                "text": "One email address per line, or separated by commas"
+            }
+        },
+        "label": {
+            "type": "plain_text",
+            "text": "Or paste email addresses",
+            "emoji": True
+        }
+    },
+    {
+        "type": "input",
+        "block_id": "recipient_file",
+        "optional": True,
+        "element": {
+            "type": "file_input",
+            "action_id": "recipient_file-action",
+            "filetypes": ["csv", "txt"],
+            "max_files": 1
+        },
+        "label": {
+            "type": "plain_text",
+            "text": "Or upload a list of email addresses",
+            "emoji": True
+        },
+        "hint": {
+            "type": "plain_text",
+            "text": "A .csv or .txt file. Every email address found in the file receives the message as a DM."
+        }
+    },
+    {
+        "type": "input",
+        "block_id": "send_at",
+        "optional": True,
+        "element": {
+            "type": "datetimepicker",
+            "action_id": "send_at-action"
+        },
+        "label": {
+            "type": "plain_text",
+            "text": "Send at",
+            "emoji": True
+        },
+        "hint": {
+            "type": "plain_text",
+            "text": "Leave empty to send right away."
+        }
+    },
+    {
+        "type": "input",
+        "block_id": "stagger_window",
+        "optional": True,
+        "element": {
+            "type": "static_select",
+            "action_id": "stagger_window-action",
+            "placeholder": {
+                "type": "plain_text",
+                "text": "All at once",
+                "emoji": True
+            },
+            "options": [
+                {
+                    "text": {
+                        "type": "plain_text",
+                        "text": text,
+                        "emoji": True
+                    },
+                    "value": str(seconds)
+                }
+                for text, seconds in STAGGER_WINDOWS
+            ]
+        },
+        "label": {
+            "type": "plain_text",
+            "text": "Spread delivery over",
+            "emoji": True
+        },
+        "hint": {
+            "type": "plain_text",
+            "text": "Conversations receive the message at even intervals across this window, starting at the send time."
+        }
+    },
+    {
+        "type": "input",
+        "block_id": "local_time",
+        "optional": True,
+        "element": {
+            "type": "checkboxes",
+            "action_id": "local_time-action",
+            "options": [
+                {
+                    "text": {
+                        "type": "plain_text",
+                        "text": "Deliver at this time in each recipient's time zone",
+                        "emoji": True
+                    },
+                    "description": {
+                        "type": "plain_text",
+                        "text": "Direct messages arrive at the chosen time of day where each person is. Channels receive it at the chosen time.",
+                        "emoji": True
+                    },
+                    "value": "local_time"
+                }
+            ]
+        },
+        "label": {
+            "type": "plain_text",
+            "text": "Time zone",
+            "emoji": True
+        }
+    },
+    {
+        "type": "divider",
+        "block_id": "divider_1"
+    }
+]
+
+advanced_options_blocks = [
+    {
+        "type": "actions",
+        "block_id": "customize_sender_identity",
+        "elements": [
+            {
+                "type": "checkboxes",
+                "options": [
+                    {
+                        "text": {
+                            "type": "mrkdwn",
+                            "text": "*Do you need to customize the sender identity?*"
+                        },
+                        "description": {
+                            "type": "plain_text",
+                            "text": "I want to specify a custom sender name and a custom icon for my message, so that I can align the message's persona with its content.",
+                            "emoji": True
+                        },
+                        "value": "value-0"
+                    }
+                ],
+                "action_id": "customize_sender_identity-action"
+            }
+        ]
+    },
+    {
+        "type": "actions",
+        "block_id": "call_to_action",
+        "elements": [
+            {
+                "type": "checkboxes",
+                "options": [
+                    {
+                        "text": {
+                            "type": "mrkdwn",
+                            "text": "*Do you need add in-context call to action?*"
+                        },
+                        "description": {
+                            "type": "plain_text",
+                            "text": "I want to add one or more clickable buttons with external links to my message, so that I can guide users to take a specific, immediate action.",
+                            "emoji": True
+                        },
+                        "value": "value-1"
+                    }
+                ],
+                "action_id": "call_to_action-action"
+            }
+        ]
+    }
+]
+
+sender_identity_fields = [
+    {
+        "type": "divider",
+        "block_id": "start_sender_identity_fields"
+    },
+    {
+        "type": "input",
+        "block_id": "sender_name",
+        "element": {
+            "type": "plain_text_input",
+            "action_id": "plain_text_input-action",
+            "placeholder": {
+                "type": "plain_text",
+                "text": "If left blank, the default name is used."
+            }
+        },
+        "hint": {
+            "type": "plain_text",
+            "text": "A Slack bot's display name is limited to a maximum of 21 characters."
+        },
+        "optional": True,
+        "label": {
+            "type": "plain_text",
+            "text": "Sender Name",
+            "emoji": True
+        }
+    },
+    {
+        "type": "input",
+        "block_id": "icon_url",
+        "element": {
+            "type": "plain_text_input",
+            "action_id": "icon_url-action",
+            "placeholder": {
+                "type": "plain_text",
+                "text": "If left blank, the default icon is used."
+            }
+        },
+        "optional": True,
+        "label": {
+            "type": "plain_text",
+            "text": "Icon URL",
+            "emoji": True
+        }
+    },
+    {
+        "type": "divider",
+        "block_id": "end_sender_identity_fields"
+    }
+]
+
+call_to_action_dropdown = [
+    {
+        "type": "divider",
+        "block_id": "start_call_to_action_dropdown"
+    },
+    {
+        "type": "section",
+        "text": {
+            "type": "mrkdwn",
+            "text": "How many in-context call action will you need?"
+        },
+        "block_id": "call_to_action_dropdown",
+        "accessory": {
+            "type": "static_select",
+            "placeholder": {
+                "type": "plain_text",
+                "text": "Select an item",
+                "emoji": True
+            },
+            "options": [
+                {
+                    "text": {
+                        "type": "plain_text",
+                        "text": str(number),
+                        "emoji": True
+                    },
+                    "value": str(number)
+                }
+                for number in range(1, MAX_CTA_BUTTONS + 1)
+            ],
+            "action_id": "call_to_action_dropdown-action"
+        }
+    },
+    {
+        "type": "context",
+        "block_id": "cta_buttons_hint",
+        "elements": [
+            {
+                "type": "plain_text",
+                "text": f"You can add up to {MAX_CTA_BUTTONS} actions.",
+                "emoji": True
+            }
+        ]
+    }
+]
+
+cta_buttons = [
+    {
+        "type": "header",
+        "text": {
+            "type": "plain_text",
+            "text": "CTA Button",
+            "emoji": True
+        },
+        "block_id": "cta_button_header"
+    },
+    {
+        "type": "input",
+        "element": {
+            "type": "plain_text_input",
+            "action_id": "plain_text_input-action"
+        },
+        "block_id": "cta_button_text",
+        "label": {
+            "type": "plain_text",
+            "text": "Button Text",
+            "emoji": True
+        },
+        "hint": {
+            "type": "plain_text",
+            "text": "The character limit for button text in a Slack Block Kit button element is 75 characters. The text may appear truncated around 30 characters depending on the display device."
+        }
+    },
+    {
+        "type": "input",
+        "element": {
+            "type": "plain_text_input",
+            "action_id": "plain_text_input-action",
+            "placeholder": {
+                "type": "plain_text",
+                "text": "Enter a URL"
+            }
+        },
+        "block_id": "cta_button_link",
+        "label": {
+            "type": "plain_text",
+            "text": "Link",
+            "emoji": True
+        },
+        "hint": {
+            "type": "plain_text",
+            "text": "Please provide a valid URL (including http:// or https://)."
+        }
+    }
+]
+
+@functools.lru_cache(maxsize=MAX_CTA_BUTTONS)
+def cta_button_blocks(number: int) -> tuple:
+    # Header, button text input and link input for CTA button `number`, built straight from the
+    # cta_buttons template without copying it. The blocks are cached, callers must not mutate them.
+    header, text_input, link_input = cta_buttons
+    return (
+        {
+            "type": header["type"],
+            "text": {**header["text"], "text": f"CTA Button {number}"},
+            "block_id": f"cta_button_header_{number}",
+        },
+        {
+            "type": text_input["type"],
+            "element": text_input["element"],
+            "block_id": f"cta_button_text_{number}",
+            "label": {**text_input["label"], "text": f"Button Text {number}"},
+            "hint": text_input["hint"],
+        },
+        {
+            "type": link_input["type"],
+            "element": link_input["element"],
+            "block_id": f"cta_button_link_{number}",
+            "label": {**link_input["label"], "text": f"Link {number}"},
+            "hint": link_input["hint"],
+        },
+    )
+
+
+def generate_cta_buttons(num_buttons):
+    blocks = []
+    for number in range(1, num_buttons + 1):
+        blocks += cta_button_blocks(number)
+    return blocks
+
+def is_checked(state_values: dict, block_id: str, action_id: str) -> bool:
+    return bool((state_values.get(block_id) or {}).get(action_id, {}).get("selected_options"))
+
+
+def selected_cta_button_count(state_values: dict) -> int:
+    try:
+        return int(state_values["call_to_action_dropdown"]["call_to_action_dropdown-action"]["selected_option"]["value"])
+    except (KeyError, TypeError, ValueError):
+        return 0
+
+
+def modal_blocks(sender_identity_on: bool, call_to_action_on: bool, number_of_cta_buttons: int = 0) -> list:
+    # Block kit combinations for the comms modal, in display order
+    blocks = [*initial_view_blocks, advanced_options_blocks[0]]
+    if sender_identity_on:
+        blocks += sender_identity_fields
+    blocks.append(advanced_options_blocks[1])
+    if call_to_action_on:
+        blocks += call_to_action_dropdown
+        blocks += generate_cta_buttons(number_of_cta_buttons)
+    return blocks
+
+
+def modal_view(blocks: list) -> dict:
+    return {
+        "private_metadata": "",
+        "title": {
+            "type": "plain_text",
+            "text": "BT Comms App",
+            "emoji": True
+        },
+        "submit": {
+            "type": "plain_text",
+            "text": "Submit",
+            "emoji": True
+        },
+        "type": "modal",
+        "close": {
+            "type": "plain_text",
+            "text": "Cancel",
+            "emoji": True
+        },
+        "callback_id": "initial_view",
+        "blocks": blocks
+    }
+
+
+# 2 x 2 x (MAX_CTA_BUTTONS + 1) variants at most, see cached_modal_view
+@functools.lru_cache(maxsize=4 * (MAX_CTA_BUTTONS + 1))
+def _modal_view_variant(sender_identity_on: bool, call_to_action_on: bool, number_of_cta_buttons: int) -> dict:
+    return modal_view(modal_blocks(sender_identity_on, call_to_action_on, number_of_cta_buttons))
+
+
+def cached_modal_view(sender_identity_on: bool, call_to_action_on: bool, number_of_cta_buttons: int = 0) -> dict:
+    # The modal only has a handful of variants, each full view payload is built once and shared.
+    # Callers must treat the returned dict as read-only.
+    if not call_to_action_on:
+        number_of_cta_buttons = 0
+    # The count comes from the request payload, out of range values would each add a cache entry
+    number_of_cta_buttons = min(max(int(number_of_cta_buttons), 0), MAX_CTA_BUTTONS)
+    return _modal_view_variant(bool(sender_identity_on), bool(call_to_action_on), number_of_cta_buttons)
@@ -0,0 +1,115 @@
+import math
+from collections import Counter
+from dataclasses import dataclass, field
+
+from slack_sdk.errors import SlackApiError
+
+# Longest lists of failed and slow conversations included in the report message
+MAX_LISTED_CONVERSATIONS = 20
+SLOWEST_LISTED_CONVERSATIONS = 5
+
+
+def error_code(error: Exception) -> str:
+    # Slack error code such as channel_not_found, or the exception type for transport errors
+    if isinstance(error, SlackApiError):
+        return error.response.get("error") or f"http_{error.response.status_code}"
+    return type(error).__name__
+
+
+def mention(conversation_id: str) -> str:
+    # Users and channels are linked with different mrkdwn syntax, unresolved emails are shown as is
+    if "@" in conversation_id:
+        return conversation_id
+    if conversation_id[:1] in ("U", "W"):
+        return f"<@{conversation_id}>"
+    return f"<#{conversation_id}>"
+
+
+def percentile(values: list, pct: float) -> float | None:
+    # Nearest-rank percentile, None for an empty list
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+@dataclass
+class DeliveryReport:
+    """Outcome of one broadcast.
+
+    rows holds one dict per conversation with conversation_id, status ("sent" or "failed"), error,
+    ts, latency_ms, retries and optionally attempts, as stored in the outbox.
+    """
+
+    campaign_id: str
+    rows: list
+    sent: int = 0
+    failed: int = 0
+    p50_ms: float | None = None
+    p95_ms: float | None = None
+    errors: Counter = field(default_factory=Counter)
+
+    @classmethod
+    def from_rows(cls, campaign_id: str, rows: list) -> "DeliveryReport":
+        latencies = [row["latency_ms"] for row in rows if row.get("latency_ms") is not None]
+        errors = Counter(row["error"] for row in rows if row["status"] != "sent")
+        return cls(
+            campaign_id=campaign_id,
+            rows=rows,
+            sent=sum(1 for row in rows if row["status"] == "sent"),
+            failed=sum(errors.values()),
+            p50_ms=percentile(latencies, 50),
+            p95_ms=percentile(latencies, 95),
+            errors=errors,
+        )
+
+    @property
+    def total(self) -> int:
+        return len(self.rows)
+
+    @property
+    def retries(self) -> int:
+        # Rate limit retries plus re-sends of rows that were in flight during a restart
+        return sum((row.get("retries") or 0) + max(0, (row.get("attempts") or 1) - 1) for row in self.rows)
+
+    def text(self) -> str:
+        return f"Your message was delivered to {self.sent} of {self.total} conversations."
+
+    def blocks(self) -> list:
+        def ms(value):
+            return "n/a" if value is None else f"{value:.0f} ms"
+
+        summary = (
+            f"*Delivery report*\n{self.text()}\n"
+            f"Failed: {self.failed}  •  Retries: {self.retries}  •  "
+            f"Latency p50: {ms(self.p50_ms)}  •  p95: {ms(self.p95_ms)}"
+        )
+        blocks = [{"type": "section", "block_id": "delivery_summary", "text": {"type": "mrkdwn", "text": summary}}]
+
+        if self.failed:
+            by_error = ", ".join(f"`{code}` × {count}" for code, count in self.errors.most_common())
+            failed_rows = [row for row in self.rows if row["status"] != "sent"][:MAX_LISTED_CONVERSATIONS]
+            failed_list = "\n".join(f"• {mention(row['conversation_id'])} `{row['error']}`" for row in failed_rows)
+            more = self.failed - len(failed_rows)
+            if more > 0:
+                failed_list += f"\n…and {more} more"
+            blocks.append({
+                "type": "section",
+                "block_id": "delivery_failures",
+                "text": {"type": "mrkdwn", "text": f"*Failures:* {by_error}\n{failed_list}"}
+            })
+
+        slowest = sorted(
+            (row for row in self.rows if row["status"] == "sent" and row.get("latency_ms") is not None),
+            key=lambda row: row["latency_ms"],
+            reverse=True,
+        )[:SLOWEST_LISTED_CONVERSATIONS]
+        if slowest:
+            slow_list = "  •  ".join(f"{mention(row['conversation_id'])} {ms(row['latency_ms'])}" for row in slowest)
+            blocks.append({
+                "type": "context",
+                "block_id": "delivery_slowest",
+                "elements": [{"type": "mrkdwn", "text": f"Slowest: {slow_list}"}]
+            })
+        return blocks
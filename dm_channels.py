@@ -0,0 +1,103 @@
+import os
+import asyncio
+import logging
+import threading
+
+from fanout import async_fan_out, fan_out
+from storage import connect
+
+logger = logging.getLogger(__name__)
+
+# conversations.open is Tier 3 (50 per minute), so a first broadcast to many new users would wait
+# minutes for its prefetch. Above this many uncached users the prefetch is skipped and the DM
+# channels are learned from the chat.postMessage responses instead.
+DM_PREFETCH_MAX_USERS = int(os.getenv("DM_PREFETCH_MAX_USERS", "100"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workspace_dm_channels (
+    workspace TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    PRIMARY KEY (workspace, user_id)
+) WITHOUT ROWID;
+"""
+
+
+def is_user_id(conversation_id: str) -> bool:
+    return conversation_id[:1] in ("U", "W")
+
+
+class DMChannelCache:
+    """Persistent user ID -> DM channel ID cache.
+
+    It is filled in bulk through conversations.open before a broadcast, and from the channel
+    returned by chat.postMessage when a message went to a user ID. A DM channel never changes
+    for a given bot and user, so entries do not expire. Every workspace has its own bot, so its own
+    channels, keyed by the workspace name.
+    """
+
+    def __init__(self, path: str | None = None, workspace: str = ""):
+        self.workspace = workspace
+        self._connection = connect(path)
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._channels: dict[str, str] = {
+            row["user_id"]: row["channel_id"] for row in self._connection.execute(
+                "SELECT user_id, channel_id FROM workspace_dm_channels WHERE workspace = ?", (workspace,)
+            )
+        }
+
+    def get(self, user_id: str) -> str | None:
+        return self._channels.get(user_id)
+
+    def _put_many(self, channels: dict):
+        if not channels:
+            return
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO workspace_dm_channels (workspace, user_id, channel_id) VALUES (?, ?, ?)",
+                [(self.workspace, user_id, channel_id) for user_id, channel_id in channels.items()],
+            )
+        self._channels.update(channels)
+
+    def remember(self, user_id: str, channel_id: str | None):
+        self.remember_many({user_id: channel_id})
+
+    def remember_many(self, channels: dict):
+        # Stores the user ID -> DM channel pairs that are new, in a single write
+        self._put_many({
+            user_id: channel_id for user_id, channel_id in channels.items()
+            if channel_id and self._channels.get(user_id) != channel_id
+        })
+
+    def _missing(self, conversation_ids: list) -> list:
+        missing = [
+            conversation_id for conversation_id in dict.fromkeys(conversation_ids)
+            if is_user_id(conversation_id) and conversation_id not in self._channels
+        ]
+        if len(missing) > DM_PREFETCH_MAX_USERS:
+            logger.info(f"Skipping DM prefetch for {len(missing)} users, channels are learned while sending")
+            return []
+        return missing
+
+    def _store(self, results) -> int:
+        opened = {result.item: result.value["channel"]["id"] for result in results if result.ok}
+        self._put_many(opened)
+        if results:
+            logger.info(f"Opened {len(opened)} of {len(results)} DM channels")
+        return len(opened)
+
+    def prefetch(self, client, conversation_ids: list) -> int:
+        # Opens the DM of every user in conversation_ids that is not cached yet, returns how many were opened.
+        # Users whose DM cannot be opened are left to chat.postMessage, which reports the error per send.
+        missing = self._missing(conversation_ids)
+        return self._store(fan_out(lambda user_id: client.conversations_open(users=user_id), missing))
+
+    async def prefetch_async(self, client, conversation_ids: list) -> int:
+        missing = self._missing(conversation_ids)
+        results = await async_fan_out(lambda user_id: client.conversations_open(users=user_id), missing)
+        return await asyncio.to_thread(self._store, results)
+
+    def resolve(self, conversation_id: str) -> str:
+        # The channel to post to: the cached DM for a user, the conversation itself otherwise
+        return self._channels.get(conversation_id, conversation_id)
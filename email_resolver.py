@@ -0,0 +1,147 @@
+import os
+import re
+import ssl
+import time
+import asyncio
+import logging
+import threading
+import urllib.request
+
+from slack_sdk.errors import SlackApiError
+
+from delivery_report import error_code
+from fanout import async_fan_out, fan_out
+from storage import connect
+
+logger = logging.getLogger(__name__)
+
+# How long a resolved email -> user ID mapping is trusted. Override with EMAIL_CACHE_TTL_SECONDS.
+EMAIL_CACHE_TTL_SECONDS = int(os.getenv("EMAIL_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+# Addresses without a Slack user are remembered for less time, people get invited every day
+NOT_FOUND_TTL_SECONDS = 24 * 3600
+
+EMAIL_PATTERN = re.compile(r"[A-Za-z0-9._%+'-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+SEPARATOR_PATTERN = re.compile(r"[\s,;]+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workspace_email_user_ids (
+    workspace TEXT NOT NULL,
+    email TEXT NOT NULL,
+    user_id TEXT,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (workspace, email)
+) WITHOUT ROWID;
+"""
+
+
+def parse_emails(text: str | None) -> tuple[list, list]:
+    # Splits pasted text into (valid emails, invalid entries), both deduplicated in input order
+    valid, invalid = {}, {}
+    for entry in SEPARATOR_PATTERN.split(text or ""):
+        entry = entry.strip().strip("<>\"'")
+        if not entry:
+            continue
+        if EMAIL_PATTERN.fullmatch(entry):
+            valid.setdefault(entry.lower(), None)
+        else:
+            invalid.setdefault(entry, None)
+    return list(valid), list(invalid)
+
+
+def find_emails(text: str) -> list:
+    # Every email address in an uploaded file, whatever its column layout
+    return list(dict.fromkeys(email.lower() for email in EMAIL_PATTERN.findall(text)))
+
+
+def download_file_text(url: str, token: str, context: ssl.SSLContext | None = None) -> str:
+    # Files uploaded through a file_input block are private, the bot token is needed to read them
+    request = urllib.request.Request(url, headers={"Authorization": f"Bearer {token}"})
+    with urllib.request.urlopen(request, context=context, timeout=30) as response:
+        return response.read().decode("utf-8", errors="replace")
+
+
+class EmailCache:
+    """Persistent email -> Slack user ID cache with a TTL. A cached None means no such user.
+
+    One address is a different user, or none, in every workspace, entries are kept per workspace name.
+    """
+
+    def __init__(self, path: str | None = None, ttl: int = EMAIL_CACHE_TTL_SECONDS, workspace: str = ""):
+        self.ttl = ttl
+        self.workspace = workspace
+        self._connection = connect(path)
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def get_many(self, emails: list) -> dict:
+        # Returns the unexpired entries among emails
+        found = {}
+        now = time.time()
+        with self._lock:
+            # Stay below SQLite's limit on bound parameters
+            for start in range(0, len(emails), 500):
+                chunk = emails[start:start + 500]
+                rows = self._connection.execute(
+                    f"SELECT email, user_id FROM workspace_email_user_ids WHERE workspace = ? AND expires_at > ?"
+                    f" AND email IN ({','.join('?' * len(chunk))})",
+                    (self.workspace, now, *chunk),
+                ).fetchall()
+                found.update((row["email"], row["user_id"]) for row in rows)
+        return found
+
+    def put_many(self, user_ids: dict):
+        now = time.time()
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO workspace_email_user_ids (workspace, email, user_id, expires_at) VALUES (?, ?, ?, ?)",
+                [
+                    (self.workspace, email, user_id, now + (self.ttl if user_id else NOT_FOUND_TTL_SECONDS))
+                    for email, user_id in user_ids.items()
+                ],
+            )
+
+
+class EmailResolver:
+    """Resolves email addresses to user IDs with users.lookupByEmail, backed by an EmailCache.
+
+    Lookups for cache misses run concurrently through the fan-out; pass a rate limited client so
+    they stay within the method's tier.
+    """
+
+    def __init__(self, cache: EmailCache):
+        self.cache = cache
+
+    def _split(self, emails: list) -> tuple[dict, list]:
+        cached = self.cache.get_many(emails)
+        return cached, [email for email in emails if email not in cached]
+
+    def _store(self, cached: dict, results) -> tuple[dict, dict]:
+        looked_up, unresolved = {}, {}
+        for result in results:
+            if result.ok:
+                looked_up[result.item] = result.value["user"]["id"]
+            elif isinstance(result.error, SlackApiError) and result.error.response.get("error") == "users_not_found":
+                looked_up[result.item] = None
+            else:
+                # Transient failures are reported but not cached
+                unresolved[result.item] = error_code(result.error)
+        self.cache.put_many(looked_up)
+        resolved = {}
+        for email, user_id in {**cached, **looked_up}.items():
+            if user_id:
+                resolved[email] = user_id
+            else:
+                unresolved[email] = "users_not_found"
+        logger.info(f"Resolved {len(resolved)} emails, {len(cached)} from cache, {len(unresolved)} unresolved")
+        return resolved, unresolved
+
+    def resolve(self, client, emails: list) -> tuple[dict, dict]:
+        # Returns ({email: user_id}, {email: error code})
+        cached, misses = self._split(emails)
+        results = fan_out(lambda email: client.users_lookupByEmail(email=email), misses)
+        return self._store(cached, results)
+
+    async def resolve_async(self, client, emails: list) -> tuple[dict, dict]:
+        cached, misses = await asyncio.to_thread(self._split, emails)
+        results = await async_fan_out(lambda email: client.users_lookupByEmail(email=email), misses)
+        return await asyncio.to_thread(self._store, cached, results)
@@ -0,0 +1,67 @@
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on concurrent Web API calls made by a single broadcast.
+# Override with the FANOUT_MAX_WORKERS environment variable.
+DEFAULT_MAX_WORKERS = int(os.getenv("FANOUT_MAX_WORKERS", "16"))
+
+
+@dataclass
+class FanOutResult:
+    item: Any
+    ok: bool
+    value: Any = None
+    error: Exception | None = None
+    # Seconds func took for this item
+    latency: float = 0.0
+
+
+def _run_one(func: Callable[[Any], Any], item: Any) -> FanOutResult:
+    started = time.perf_counter()
+    try:
+        return FanOutResult(item=item, ok=True, value=func(item), latency=time.perf_counter() - started)
+    except Exception as e:
+        logger.warning(f"Fan-out call failed for {item}: {e}")
+        return FanOutResult(item=item, ok=False, error=e, latency=time.perf_counter() - started)
+
+
+def fan_out(func: Callable[[Any], Any], items: Iterable[Any], max_workers: int | None = None) -> list[FanOutResult]:
+    """Call func(item) for every item on a bounded thread pool.
+
+    One failing item never stops the others. The returned results are in the same order as items.
+    """
+    items = list(items)
+    if not items:
+        return []
+    max_workers = max_workers or DEFAULT_MAX_WORKERS
+    workers = max(1, min(max_workers, len(items)))
+    if workers == 1:
+        return [_run_one(func, item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fanout") as executor:
+        return list(executor.map(lambda item: _run_one(func, item), items))
+
+
+async def async_fan_out(func: Callable[[Any], Awaitable[Any]], items: Iterable[Any], max_concurrency: int | None = None) -> list[FanOutResult]:
+    """Await func(item) for every item as asyncio tasks, at most max_concurrency at a time.
+
+    Same contract as fan_out: failures are recorded per item and results keep the order of items.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency or DEFAULT_MAX_WORKERS)
+
+    async def run_one(item):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                return FanOutResult(item=item, ok=True, value=await func(item), latency=time.perf_counter() - started)
+            except Exception as e:
+                logger.warning(f"Fan-out call failed for {item}: {e}")
+                return FanOutResult(item=item, ok=False, error=e, latency=time.perf_counter() - started)
+
+    return list(await asyncio.gather(*(run_one(item) for item in items)))
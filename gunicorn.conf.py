@@ -0,0 +1,41 @@
+import os
+import multiprocessing
+
+# Production HTTP server for the OAuth app and the comms listeners:
+#   gunicorn wsgi:application
+# gunicorn reads this file from the working directory.
+
+bind = f"{os.getenv('WEB_ADDR', '0.0.0.0')}:{os.getenv('PORT', '3000')}"
+
+# Worker processes, each running WEB_THREADS requests at a time. Listeners mostly wait on the Web API,
+# so threads are cheaper than more processes.
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count() * 2 + 1)))
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "8"))
+
+# The app is imported once in the master and the workers are forked from it, so starting or
+# recycling a worker skips the imports and store setup. The stores reopen their SQLite connections
+# and the HTTP pools drop their sockets in each worker (see storage.py and http_pool.py).
+preload_app = True
+
+# Workers are replaced after about WEB_MAX_REQUESTS requests to bound slow leaks, the jitter keeps
+# them from restarting at the same time. 0 turns recycling off.
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.getenv("WEB_MAX_REQUESTS_JITTER", "100"))
+
+# A recycled or stopped worker finishes its requests, and its outbox batch, within graceful_timeout
+timeout = 30
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+
+def post_worker_init(worker):
+    from wsgi import outbox_leader
+
+    outbox_leader.start()
+
+
+def worker_exit(server, worker):
+    from wsgi import outbox_leader
+
+    outbox_leader.stop(timeout=graceful_timeout)
@@ -0,0 +1,180 @@
+import os
+import ssl
+import time
+import select
+import threading
+import weakref
+from collections import deque
+from http.client import HTTPConnection, HTTPSConnection, HTTPMessage, responses
+from io import BytesIO
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit
+from urllib.request import Request
+
+from slack_sdk.errors import SlackRequestError
+from slack_sdk.web import WebClient
+
+from message_encoding import EncodedJSON
+from metrics import http_connections
+
+# Idle keep-alive connections kept per host, 0 turns pooling off. Matches the default FANOUT_MAX_WORKERS
+# so every fan-out thread finds a warm connection.
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+# Idle connections older than this are closed instead of reused, before the server drops them on its side
+HTTP_POOL_IDLE_TIMEOUT = float(os.getenv("HTTP_POOL_IDLE_TIMEOUT", "30"))
+
+
+def _is_dropped(connection: HTTPConnection) -> bool:
+    # An idle connection has nothing to read. If its socket is readable, the server closed it
+    # (or sent something unexpected), either way it cannot carry another request.
+    if connection.sock is None:
+        return True
+    try:
+        return bool(select.select([connection.sock], [], [], 0)[0])
+    except (OSError, ValueError):
+        return True
+
+
+# Every pool, so a forked child can drop the connections it inherited
+_pools = weakref.WeakSet()
+
+
+def _after_fork():
+    # The parent keeps using its sockets, a child sharing them would interleave requests on one TLS stream
+    for pool in list(_pools):
+        pool._lock = threading.Lock()
+        pool._idle = {}
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+class ConnectionPool:
+    """Thread safe pool of keep-alive HTTP(S) connections, keyed by scheme, host and port.
+
+    A connection is used by one request at a time. When every pooled connection is busy a new one
+    is opened, and only up to maxsize idle connections per host are kept afterwards.
+    """
+
+    def __init__(
+        self,
+        ssl_context: ssl.SSLContext | None = None,
+        maxsize: int = HTTP_POOL_SIZE,
+        idle_timeout: float = HTTP_POOL_IDLE_TIMEOUT,
+    ):
+        self.ssl_context = ssl_context or ssl.create_default_context()
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        # (scheme, host, port) -> idle (connection, returned at)
+        self._idle: dict[tuple, deque] = {}
+        self._lock = threading.Lock()
+        _pools.add(self)
+
+    def _connect(self, key: tuple, timeout: float) -> HTTPConnection:
+        scheme, host, port = key
+        http_connections.inc(host=host, state="new")
+        if scheme == "https":
+            return HTTPSConnection(host, port, timeout=timeout, context=self.ssl_context)
+        return HTTPConnection(host, port, timeout=timeout)
+
+    def _checkout(self, key: tuple, timeout: float) -> HTTPConnection:
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    break
+                # Most recently used first, it is the least likely to have been closed by the server
+                connection, returned_at = idle.pop()
+            if now - returned_at <= self.idle_timeout and not _is_dropped(connection):
+                connection.timeout = timeout
+                connection.sock.settimeout(timeout)
+                http_connections.inc(host=key[1], state="reused")
+                return connection
+            connection.close()
+        return self._connect(key, timeout)
+
+    def _checkin(self, key: tuple, connection: HTTPConnection):
+        with self._lock:
+            idle = self._idle.setdefault(key, deque())
+            if len(idle) < self.maxsize:
+                idle.append((connection, time.monotonic()))
+                return
+        connection.close()
+
+    def request(self, url: str, body: bytes | None, headers: dict, timeout: float) -> tuple[int, HTTPMessage, bytes]:
+        # POSTs body to url, returns (status, headers, body) with the body fully read
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        connection = self._checkout(key, timeout)
+        try:
+            try:
+                connection.request("POST", path, body=body, headers=headers)
+            except OSError as e:
+                # The stock urllib transport reports failures to send as URLError, the retry handlers expect that
+                raise URLError(e)
+            response = connection.getresponse()
+            payload = response.read()
+        except BaseException:
+            connection.close()
+            raise
+        if response.will_close:
+            connection.close()
+        else:
+            self._checkin(key, connection)
+        return response.status, response.msg, payload
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection, _ in connections:
+                connection.close()
+
+
+class PooledWebClient(WebClient):
+    """WebClient sending its requests over a shared ConnectionPool instead of a new connection per call.
+
+    The pool reuses the client's ssl context. With a proxy, or pool_size=0, the stock transport is used.
+    api_call(json=EncodedJSON(...)) sends a body serialized ahead of time, with either transport.
+    """
+
+    def __init__(self, *args, pool_size: int = HTTP_POOL_SIZE, pool_idle_timeout: float = HTTP_POOL_IDLE_TIMEOUT,
+                 pool: ConnectionPool | None = None, **kwargs):
+        # Clients for different tokens can share one pool by passing it in
+        super().__init__(*args, **kwargs)
+        if pool is None and pool_size > 0:
+            pool = ConnectionPool(self.ssl, pool_size, pool_idle_timeout)
+        self.pool = pool
+        # Body of the EncodedJSON call in progress on this thread
+        self._encoded = threading.local()
+
+    def _perform_urllib_http_request(self, *, url: str, args: dict) -> dict:
+        encoded = args["json"]
+        if not isinstance(encoded, EncodedJSON):
+            return super()._perform_urllib_http_request(url=url, args=args)
+        # The SDK would json.dumps the body, hand it none and fill in the bytes once the request is built.
+        # Retries of the call reuse the same request object, so they send the same bytes.
+        args["headers"]["Content-Type"] = "application/json;charset=utf-8"
+        self._encoded.body = encoded.body
+        try:
+            return super()._perform_urllib_http_request(url=url, args={**args, "json": None, "data": None, "params": None})
+        finally:
+            self._encoded.body = None
+
+    def _perform_urllib_http_request_internal(self, url: str, req: Request) -> dict:
+        body = getattr(self._encoded, "body", None)
+        if body is not None and req.data is None:
+            req.data = body
+        if self.pool is None or self.proxy is not None:
+            return super()._perform_urllib_http_request_internal(url, req)
+        if not url.lower().startswith("http"):
+            raise SlackRequestError(f"Invalid URL detected: {url}")
+        status, headers, body = self.pool.request(url, req.data, dict(req.header_items()), self.timeout)
+        if not 200 <= status < 300:
+            # Same as urlopen, so the SDK's 429 and retry handling sees what it is used to
+            raise HTTPError(url, status, responses.get(status, ""), headers, BytesIO(body))
+        if headers.get_content_type() == "application/gzip":
+            return {"status": status, "headers": headers, "body": body}
+        return {"status": status, "headers": headers, "body": body.decode(headers.get_content_charset() or "utf-8")}
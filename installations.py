@@ -0,0 +1,255 @@
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+from slack_sdk.oauth.installation_store import Bot, Installation, InstallationStore
+from slack_sdk.web import WebClient
+
+from storage import connect
+
+logger = logging.getLogger(__name__)
+
+# Workspaces whose authorization and Web API client are kept in memory
+AUTHORIZE_CACHE_SIZE = int(os.getenv("AUTHORIZE_CACHE_SIZE", "1000"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS slack_installations (
+    enterprise_id TEXT NOT NULL,
+    team_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    installed_at REAL NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (enterprise_id, team_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS slack_installations_latest ON slack_installations (enterprise_id, team_id, installed_at);
+CREATE TABLE IF NOT EXISTS slack_bots (
+    enterprise_id TEXT NOT NULL,
+    team_id TEXT NOT NULL,
+    installed_at REAL NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (enterprise_id, team_id)
+);
+CREATE TABLE IF NOT EXISTS slack_installation_version (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO slack_installation_version (id, version) VALUES (0, 0);
+"""
+
+
+def team_key(enterprise_id: str | None, team_id: str | None, is_enterprise_install: bool | None = False) -> tuple:
+    # Org wide installs are stored once for the whole enterprise, without a team
+    return enterprise_id or "", "" if is_enterprise_install else team_id or ""
+
+
+class LRUCache:
+    """Thread safe dict that keeps the maxsize most recently used entries."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, predicate: Callable[[object], bool]):
+        # Drops every entry whose key matches
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteInstallationStore(InstallationStore):
+    """Installation store in the app's SQLite database, one row per workspace user and per bot.
+
+    Listeners added with on_change() are called with the team_key() of every saved or deleted
+    installation, or with None when another process changed the store (see poll_changes()).
+    """
+
+    def __init__(self, path: str | None = None):
+        self._connection = connect(path)
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._listeners: list[Callable[[tuple | None], None]] = []
+        self._data_version = self._connection.execute("PRAGMA data_version").fetchone()[0]
+        self._version = self._read_version()
+
+    @property
+    def logger(self) -> logging.Logger:
+        return logger
+
+    def _read_version(self) -> int:
+        return self._connection.execute("SELECT version FROM slack_installation_version").fetchone()[0]
+
+    def on_change(self, listener: Callable[[tuple | None], None]):
+        self._listeners.append(listener)
+
+    def _changed(self, key: tuple | None):
+        for listener in self._listeners:
+            listener(key)
+
+    def _write(self, key: tuple, statements: list):
+        # Runs the statements and bumps the version other processes watch, in one transaction
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, parameters in statements:
+                    self._connection.execute(sql, parameters)
+                self._connection.execute("UPDATE slack_installation_version SET version = version + 1")
+                self._version = self._read_version()
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+        self._changed(key)
+
+    def poll_changes(self) -> bool:
+        # Other processes sharing the database file may have installed or uninstalled a workspace.
+        # PRAGMA data_version only changes when another connection committed, so this is cheap.
+        with self._lock:
+            data_version = self._connection.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return False
+            self._data_version = data_version
+            version = self._read_version()
+            if version == self._version:
+                return False
+            self._version = version
+        self._changed(None)
+        return True
+
+    def save(self, installation: Installation):
+        key = team_key(installation.enterprise_id, installation.team_id, installation.is_enterprise_install)
+        self.save_bot(installation.to_bot())
+        self._write(key, [(
+            "INSERT OR REPLACE INTO slack_installations (enterprise_id, team_id, user_id, installed_at, data) VALUES (?, ?, ?, ?, ?)",
+            (*key, installation.user_id or "", installation.installed_at, json.dumps(installation.__dict__)),
+        )])
+
+    def save_bot(self, bot: Bot):
+        if bot.bot_token is None:
+            return
+        key = team_key(bot.enterprise_id, bot.team_id, bot.is_enterprise_install)
+        self._write(key, [(
+            "INSERT OR REPLACE INTO slack_bots (enterprise_id, team_id, installed_at, data) VALUES (?, ?, ?, ?)",
+            (*key, bot.installed_at, json.dumps(bot.__dict__)),
+        )])
+
+    def find_bot(self, *, enterprise_id: str | None, team_id: str | None,
+                 is_enterprise_install: bool | None = False) -> Bot | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT data FROM slack_bots WHERE enterprise_id = ? AND team_id = ?",
+                team_key(enterprise_id, team_id, is_enterprise_install),
+            ).fetchone()
+        return Bot(**json.loads(row["data"])) if row else None
+
+    def find_installation(self, *, enterprise_id: str | None, team_id: str | None, user_id: str | None = None,
+                          is_enterprise_install: bool | None = False) -> Installation | None:
+        # Without user_id, the latest installation of the workspace
+        key = team_key(enterprise_id, team_id, is_enterprise_install)
+        with self._lock:
+            if user_id is None:
+                row = self._connection.execute(
+                    "SELECT data FROM slack_installations WHERE enterprise_id = ? AND team_id = ?"
+                    " ORDER BY installed_at DESC LIMIT 1",
+                    key,
+                ).fetchone()
+            else:
+                row = self._connection.execute(
+                    "SELECT data FROM slack_installations WHERE enterprise_id = ? AND team_id = ? AND user_id = ?",
+                    (*key, user_id),
+                ).fetchone()
+        if row is None:
+            return None
+        installation = Installation(**json.loads(row["data"]))
+        if user_id is not None or installation.bot_token is None:
+            # A user's installation may predate the workspace's latest bot token
+            bot = self.find_bot(enterprise_id=enterprise_id, team_id=team_id, is_enterprise_install=is_enterprise_install)
+            if bot is not None and bot.bot_token != installation.bot_token:
+                installation.bot_id = bot.bot_id
+                installation.bot_user_id = bot.bot_user_id
+                installation.bot_token = bot.bot_token
+                installation.bot_scopes = bot.bot_scopes
+                installation.bot_refresh_token = bot.bot_refresh_token
+                installation.bot_token_expires_at = bot.bot_token_expires_at
+        return installation
+
+    def delete_bot(self, *, enterprise_id: str | None, team_id: str | None) -> None:
+        key = team_key(enterprise_id, team_id)
+        self._write(key, [("DELETE FROM slack_bots WHERE enterprise_id = ? AND team_id = ?", key)])
+
+    def delete_installation(self, *, enterprise_id: str | None, team_id: str | None, user_id: str | None = None) -> None:
+        key = team_key(enterprise_id, team_id)
+        if user_id is None:
+            self._write(key, [("DELETE FROM slack_installations WHERE enterprise_id = ? AND team_id = ?", key)])
+        else:
+            self._write(key, [(
+                "DELETE FROM slack_installations WHERE enterprise_id = ? AND team_id = ? AND user_id = ?", (*key, user_id)
+            )])
+
+
+class AuthorizationCache:
+    """LRU cache of authorize results, dropped for a workspace when the store says it changed.
+
+    Keys start with the team_key() of the request. Rotating tokens (xoxe.) expire and are never
+    cached, so their rotation still happens on every request.
+    """
+
+    def __init__(self, installation_store: SQLiteInstallationStore, maxsize: int = AUTHORIZE_CACHE_SIZE):
+        self.installation_store = installation_store
+        self._results = LRUCache(maxsize)
+        installation_store.on_change(self.invalidate)
+
+    def get(self, key: tuple):
+        self.installation_store.poll_changes()
+        return self._results.get(key)
+
+    def put(self, key: tuple, result):
+        token = result.get("bot_token") or result.get("user_token") or ""
+        if not token.startswith("xoxe."):
+            self._results.put(key, result)
+
+    def invalidate(self, key: tuple | None):
+        # A reinstall can change scopes and tokens, an uninstall revokes them
+        self._results.discard(lambda cached: key is None or cached[:2] == key)
+
+
+class TeamClientPool:
+    """One WebClient per workspace, reused across requests instead of built for each one.
+
+    factory(token) builds the client, e.g. a RateLimitedWebClient so every workspace gets its own
+    rate limits while all of them share one connection pool.
+    """
+
+    def __init__(self, factory: Callable[[str], WebClient], maxsize: int = AUTHORIZE_CACHE_SIZE):
+        self.factory = factory
+        self._clients = LRUCache(maxsize)
+
+    def get(self, key: tuple, token: str) -> WebClient:
+        client = self._clients.get(key)
+        if client is None or client.token != token:
+            client = self.factory(token)
+            self._clients.put(key, client)
+        return client
+
+    def invalidate(self, key: tuple | None):
+        self._clients.discard(lambda cached: key is None or cached == key)
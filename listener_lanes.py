@@ -0,0 +1,136 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Callable
+
+from metrics import lane_overflow, lane_queue_depth, lane_wait, request_name
+
+logger = logging.getLogger(__name__)
+
+# Modal clicks, shortcuts and buttons: quick listeners that must never wait behind a broadcast
+INTERACTIVE_LANE_WORKERS = int(os.getenv("INTERACTIVE_LANE_WORKERS", "8"))
+INTERACTIVE_LANE_QUEUE = int(os.getenv("INTERACTIVE_LANE_QUEUE", "32"))
+# Submitted broadcasts while their recipients are resolved, see OutboxWorker's resolve
+SUBMISSION_LANE_WORKERS = int(os.getenv("SUBMISSION_LANE_WORKERS", "4"))
+SUBMISSION_LANE_QUEUE = int(os.getenv("SUBMISSION_LANE_QUEUE", "8"))
+
+# What a request finding its lane full gets
+DEFER = "defer"  # runs on the thread that dispatched it, which slows down taking new requests
+SHED = "shed"  # acknowledged right away without running the listener, see ListenerLanes.on_shed
+
+
+class Lane:
+    """Thread pool for one kind of work, full once max_queue tasks wait for a thread.
+
+    With runs_listeners=False the lane runs work the listeners hand it, such as resolving a
+    submitted broadcast, and its listeners run in the first lane of ListenerLanes. They are still
+    turned away or deferred while this lane is full.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, overflow: str = DEFER,
+                 runs_listeners: bool = True):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.runs_listeners = runs_listeners
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"lane-{name}")
+        self._pending = 0
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+    @property
+    def full(self) -> bool:
+        return self._pending >= self.max_workers + self.max_queue
+
+    @property
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    def _started(self, submitted: float):
+        with self._lock:
+            self._waiting -= 1
+            lane_queue_depth.set(self._waiting, lane=self.name)
+        lane_wait.observe(time.perf_counter() - submitted, lane=self.name)
+
+    def _finished(self, future: Future):
+        with self._lock:
+            self._pending -= 1
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        submitted = time.perf_counter()
+
+        def run():
+            self._started(submitted)
+            return fn(*args, **kwargs)
+
+        with self._lock:
+            self._pending += 1
+            self._waiting += 1
+            lane_queue_depth.set(self._waiting, lane=self.name)
+        future = self._executor.submit(run)
+        future.add_done_callback(self._finished)
+        return future
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait)
+
+
+class ListenerLanes(Executor):
+    """Bolt listener_executor that runs every listener in the lane of its request.
+
+    Bolt submits the listener from the thread that dispatches the request, after the global
+    middleware, so route() (registered as global middleware) picks the lane and leaves it in a thread
+    local for submit(). routes maps request_name() prefixes, such as "view_submission", to lane
+    names, the first lane takes the rest. A full DEFER lane runs the listener on the dispatching
+    thread, a full SHED lane has on_shed(ack, body) acknowledge the request instead.
+    """
+
+    def __init__(self, lanes: list[Lane], routes: dict[str, str],
+                 on_shed: Callable[[Callable, dict], None] | None = None):
+        self.lanes = {lane.name: lane for lane in lanes}
+        self.default = lanes[0]
+        self.routes = routes
+        self.on_shed = on_shed
+        self._local = threading.local()
+
+    def lane_for(self, body: dict) -> Lane:
+        name = request_name(body)
+        for prefix, lane in self.routes.items():
+            if name.startswith(prefix):
+                return self.lanes[lane]
+        return self.default
+
+    def route(self, context, body, next):
+        # Global Bolt middleware, registered after watch_ack so shed requests are timed too.
+        # Bolt runs the listeners once the whole middleware chain returned, the lane stays set until then.
+        lane = self.lane_for(body)
+        inline = lane.full
+        if inline:
+            lane_overflow.inc(lane=lane.name, action=lane.overflow)
+            logger.warning(f"{lane.name} lane is full, {lane.overflow} {request_name(body)}")
+            if lane.overflow == SHED:
+                if self.on_shed is not None:
+                    self.on_shed(context.ack, body)
+                else:
+                    context.ack()
+                # The acknowledgement is the response, no listener runs
+                return context.ack.response
+        self._local.lane, self._local.inline = lane if lane.runs_listeners else self.default, inline
+        next()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        if getattr(self._local, "inline", False):
+            future = Future()
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+        return (getattr(self._local, "lane", None) or self.default).submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        for lane in self.lanes.values():
+            lane.shutdown(wait)
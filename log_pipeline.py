@@ -0,0 +1,150 @@
+import os
+import re
+import json
+import queue
+import atexit
+import random
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+# Root log level, e.g. DEBUG to include the (truncated) interaction payloads
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Longest logged field value and log line, longer ones are cut with an ellipsis
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "500"))
+LOG_MAX_LINE_CHARS = int(os.getenv("LOG_MAX_LINE_CHARS", "4000"))
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
+
+TOKEN_PATTERN = re.compile(r"\b(xox[a-z]|xapp)-[A-Za-z0-9-]+")
+# Keeps scheme and host, drops the path and query where private file links and signed parameters live
+URL_PATTERN = re.compile(r"\b(https?://[^/\s\"'<>|]+)[^\s\"'<>|]*")
+
+
+def sample_rates_from_env() -> dict:
+    # LOG_SAMPLE_RATES="block_actions=0.1,view_submission=1" keeps 10% of block_actions events
+    rates = {}
+    for entry in os.getenv("LOG_SAMPLE_RATES", "").split(","):
+        if "=" in entry:
+            event, rate = entry.split("=", 1)
+            rates[event.strip()] = float(rate)
+    return rates
+
+
+def redact(text: str) -> str:
+    text = TOKEN_PATTERN.sub(r"\1-***", text)
+    return URL_PATTERN.sub(r"\1/…", text)
+
+
+def truncate(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+def body_summary(body: dict) -> dict:
+    # The few fields of an interaction payload worth logging on every request
+    view = body.get("view") or {}
+    summary = {
+        "type": body.get("type"),
+        "user": (body.get("user") or {}).get("id"),
+        "team": (body.get("team") or {}).get("id"),
+        "callback_id": body.get("callback_id") or view.get("callback_id"),
+        "view_id": view.get("id"),
+        "actions": ",".join(action.get("action_id", "") for action in body.get("actions") or []),
+    }
+    return {key: value for key, value in summary.items() if value}
+
+
+class LogEvent:
+    """Log message rendered as `event key=value ...` only when a handler emits it."""
+
+    __slots__ = ("event", "body", "fields")
+
+    def __init__(self, event: str, body: dict | None, fields: dict):
+        self.event = event
+        self.body = body
+        self.fields = fields
+
+    def __str__(self) -> str:
+        fields = {**body_summary(self.body), **self.fields} if self.body else self.fields
+        parts = [self.event]
+        for key, value in fields.items():
+            if not isinstance(value, str):
+                value = json.dumps(value, default=str, separators=(",", ":"))
+            parts.append(f"{key}={truncate(value, LOG_MAX_FIELD_CHARS)}")
+        return " ".join(parts)
+
+
+class EventSampler:
+    """Keeps each event with its configured probability, 1.0 for events without a rate."""
+
+    def __init__(self, rates: dict | None = None, rng=random.random):
+        self.rates = rates or {}
+        self._rng = rng
+
+    def sampled(self, event: str) -> bool:
+        rate = self.rates.get(event, 1.0)
+        return rate >= 1.0 or (rate > 0 and self._rng() < rate)
+
+
+sampler = EventSampler(sample_rates_from_env())
+
+
+def log_event(logger: logging.Logger, event: str, body: dict | None = None, level: int = logging.INFO, **fields):
+    # Warnings and errors are never sampled. The full body is only attached at DEBUG level.
+    if not logger.isEnabledFor(level) or (level < logging.WARNING and not sampler.sampled(event)):
+        return
+    if body is not None and logger.isEnabledFor(logging.DEBUG):
+        fields["body"] = body
+    logger.log(level, LogEvent(event, body, fields))
+
+
+class RedactingFormatter(logging.Formatter):
+    """Formatter that strips tokens and URL paths and caps the line length."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return truncate(redact(super().format(record)), LOG_MAX_LINE_CHARS)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stock prepare() formats the record on the calling thread, which is exactly the cost that
+    should stay off the Bolt listener threads. Records never leave the process, so they are queued as is.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+_listener: QueueListener | None = None
+
+
+def configure_logging(level: str | int | None = None, *handlers: logging.Handler) -> QueueListener:
+    # Replaces logging.basicConfig: the root logger only enqueues records, one thread formats and writes them
+    global _listener
+    if _listener is not None:
+        return _listener
+    if not handlers:
+        handlers = (logging.StreamHandler(),)
+    for handler in handlers:
+        handler.setFormatter(RedactingFormatter(LOG_FORMAT))
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(level or LOG_LEVEL)
+    root.addHandler(DeferredQueueHandler(log_queue))
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    # Flush what is still queued on shutdown
+    atexit.register(_listener.stop)
+    return _listener
+
+
+def _after_fork():
+    # A forked child, e.g. a web server worker, has no listener thread, records would pile up in the queue.
+    # Records queued before the fork are the parent's to write.
+    if _listener is not None:
+        while not _listener.queue.empty():
+            _listener.queue.get_nowait()
+        _listener.start()
+
+
+os.register_at_fork(after_in_child=_after_fork)
@@ -0,0 +1,60 @@
+import json
+import logging
+
+from log_pipeline import log_event
+from submission import build_message_payload
+
+try:
+    # Optional, several times faster than the json module on Block Kit payloads
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def dumps(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class EncodedJSON:
+    """A JSON request body serialized ahead of time, passed as api_call(json=...).
+
+    PooledWebClient sends the bytes as they are instead of running json.dumps on every call.
+    """
+
+    __slots__ = ("body",)
+
+    def __init__(self, body: bytes):
+        self.body = body
+
+    def __contains__(self, key) -> bool:
+        # The SDK looks for a "token" key in json bodies, these never carry one
+        return False
+
+    def __repr__(self) -> str:
+        return f"EncodedJSON({len(self.body)} bytes)"
+
+
+class PreparedMessage:
+    """chat.postMessage body of a campaign, built and serialized once.
+
+    Everything but the channel is the same for every recipient, so for_channel() only encodes the
+    channel ID and joins it to the shared bytes.
+    """
+
+    __slots__ = ("payload", "_rest")
+
+    def __init__(self, message: dict):
+        # message is the dict stored in the outbox, see submission.message_from_submission
+        payload = build_message_payload(None, **message)
+        del payload["channel"]
+        self.payload = payload
+        # '{"text":...}' without its opening brace, channel goes in front
+        self._rest = dumps(payload)[1:]
+        log_event(logger, "message_payload", level=logging.DEBUG, payload=payload, size=len(self._rest) + 1)
+
+    def for_channel(self, channel: str) -> EncodedJSON:
+        return EncodedJSON(b'{"channel":' + dumps(channel) + b"," + self._rest)
@@ -0,0 +1,281 @@
+import os
+import time
+import bisect
+import inspect
+import logging
+import functools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Address of the Prometheus scrape endpoint, the apps skip it when METRICS_PORT=0
+METRICS_ADDR = os.getenv("METRICS_ADDR", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 3.0, 5.0, 10.0, 30.0)
+BROADCAST_SIZE_BUCKETS = (1, 10, 100, 1000, 10000, 100000)
+BROADCAST_DURATION_BUCKETS = (1, 5, 15, 60, 300, 900, 3600, 4 * 3600)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def render(self) -> list:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{self.name}{_labels(self.labelnames, key)} {value}" for key, value in values]
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket (the last one is +Inf), sum]
+        self._values: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts_and_sum = self._values.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+            counts_and_sum[0][index] += 1
+            counts_and_sum[1] += value
+
+    def count(self, **labels) -> int:
+        counts, _ = self._values.get(tuple(str(labels[name]) for name in self.labelnames), ([0], 0.0))
+        return sum(counts)
+
+    def render(self) -> list:
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """The metrics of this process, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, *args, **kwargs) -> Counter:
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        metric = Gauge(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+registry = Registry()
+
+handler_duration = registry.histogram(
+    "slack_handler_duration_seconds", "Time spent in a Bolt listener function.", ("handler",)
+)
+handler_errors = registry.counter("slack_handler_errors_total", "Listener functions that raised.", ("handler",))
+ack_duration = registry.histogram(
+    "slack_ack_seconds", "Time from the request entering Bolt middleware to ack().", ("request",)
+)
+ack_late = registry.counter(
+    "slack_ack_late_total", "Requests still not acknowledged when the ack watchdog warned.", ("request",)
+)
+ack_missed = registry.counter(
+    "slack_ack_missed_total", "Requests not acknowledged within Slack's 3 second deadline.", ("request",)
+)
+api_calls = registry.counter("slack_api_calls_total", "Web API calls, retries included.", ("method", "status"))
+api_call_duration = registry.histogram(
+    "slack_api_call_duration_seconds", "Duration of one Web API call attempt.", ("method",)
+)
+api_rate_limited = registry.counter("slack_api_rate_limited_total", "Web API calls answered with a rate limit.", ("method",))
+http_connections = registry.counter(
+    "slack_http_connections_total", "Web API connections by whether they were newly opened or reused.", ("host", "state")
+)
+api_errors = registry.counter("slack_api_errors_total", "Web API calls that failed, by error code.", ("method", "error"))
+broadcast_size = registry.histogram(
+    "broadcast_recipients", "Conversations per broadcast.", buckets=BROADCAST_SIZE_BUCKETS
+)
+broadcast_duration = registry.histogram(
+    "broadcast_duration_seconds", "Time from queuing a broadcast to its last send.", buckets=BROADCAST_DURATION_BUCKETS
+)
+broadcast_messages = registry.counter("broadcast_messages_total", "Broadcast messages by outcome.", ("status",))
+lane_queue_depth = registry.gauge(
+    "slack_listener_lane_queue_depth", "Listeners waiting for a thread, per executor lane.", ("lane",)
+)
+lane_wait = registry.histogram(
+    "slack_listener_lane_wait_seconds", "Time a listener waited for a thread of its executor lane.", ("lane",)
+)
+lane_overflow = registry.counter(
+    "slack_listener_lane_overflow_total", "Requests that found their executor lane full, by what was done with them.",
+    ("lane", "action"),
+)
+socket_mode_envelopes = registry.counter(
+    "slack_socket_mode_envelopes_total", "Socket Mode envelopes per connection, handled or dropped as redelivered.",
+    ("connection", "outcome"),
+)
+socket_mode_busy = registry.counter(
+    "slack_socket_mode_busy_seconds_total", "Time spent handling envelopes, per Socket Mode connection.", ("connection",)
+)
+socket_mode_in_flight = registry.gauge(
+    "slack_socket_mode_in_flight", "Envelopes being handled, per Socket Mode connection.", ("connection",)
+)
+
+
+def record_api_call(method: str, started: float, error: str | None = None, rate_limited: bool = False):
+    # started is the time.perf_counter() value from before the call
+    api_call_duration.observe(time.perf_counter() - started, method=method)
+    api_calls.inc(method=method, status="error" if error else "ok")
+    if rate_limited:
+        api_rate_limited.inc(method=method)
+    if error:
+        api_errors.inc(method=method, error=error)
+
+
+def request_name(body: dict) -> str:
+    # block_actions:call_to_action-action, view_submission:initial_view, shortcut:bt_comms_shortcut
+    kind = body.get("type") or "unknown"
+    if body.get("actions"):
+        return f"{kind}:{body['actions'][0].get('action_id')}"
+    return f"{kind}:{body.get('callback_id') or (body.get('view') or {}).get('callback_id')}"
+
+
+class TimedAck:
+    """Wraps a request's ack and records how long after the request arrived it was called.
+
+    Bolt's listener runner reads and sets ack.response, so it is passed through. Works for Ack
+    and AsyncAck alike.
+    """
+
+    def __init__(self, ack, name: str, received_at: float):
+        self._ack = ack
+        self.name = name
+        self.received_at = received_at
+
+    @property
+    def response(self):
+        return self._ack.response
+
+    @response.setter
+    def response(self, value):
+        self._ack.response = value
+
+    def __call__(self, *args, **kwargs):
+        if self._ack.response is None:
+            ack_duration.observe(time.perf_counter() - self.received_at, request=self.name)
+        return self._ack(*args, **kwargs)
+
+
+def instrumented(func):
+    # Records duration and errors of a Bolt listener. functools.wraps keeps Bolt's argument injection working.
+    name = func.__name__
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                handler_errors.inc(handler=name)
+                raise
+            finally:
+                handler_duration.observe(time.perf_counter() - started, handler=name)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            handler_errors.inc(handler=name)
+            raise
+        finally:
+            handler_duration.observe(time.perf_counter() - started, handler=name)
+    return wrapper
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        payload = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int = METRICS_PORT, addr: str = METRICS_ADDR) -> ThreadingHTTPServer:
+    # Serves GET /metrics from a daemon thread next to the Socket Mode connection, port 0 picks a free port
+    server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"Serving metrics on http://{addr}:{server.server_port}/metrics")
+    return server
@@ -0,0 +1,98 @@
+import os
+import time
+import logging
+import threading
+from uuid import uuid4
+
+from slack_sdk.oauth.state_store import OAuthStateStore
+
+from storage import connect
+
+logger = logging.getLogger(__name__)
+
+# How often expired, never consumed states are deleted
+OAUTH_STATE_SWEEP_SECONDS = float(os.getenv("OAUTH_STATE_SWEEP_SECONDS", "60"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS oauth_states (
+    state TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS oauth_states_expiry ON oauth_states (expires_at);
+"""
+
+
+class SQLiteOAuthStateStore(OAuthStateStore):
+    """OAuth state store in the app's SQLite database, one row per install flow in progress.
+
+    issue() and consume() are a single statement on the primary key each, and every HTTP worker
+    process opening the same file sees the states the others issued. A state is consumed at most once,
+    however many processes race for it. Abandoned flows are deleted by a background sweep every
+    sweep_interval seconds. Pass ":memory:" as path for a single process store.
+    """
+
+    def __init__(self, path: str | None = None, *, expiration_seconds: int = 600,
+                 sweep_interval: float = OAUTH_STATE_SWEEP_SECONDS):
+        self.expiration_seconds = expiration_seconds
+        self.sweep_interval = sweep_interval
+        self._connection = connect(path)
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._sweeper: threading.Thread | None = None
+        self._sweeper_pid: int | None = None
+        self._stopped = threading.Event()
+
+    @property
+    def logger(self) -> logging.Logger:
+        return logger
+
+    def issue(self, *args, **kwargs) -> str:
+        state = str(uuid4())
+        with self._lock:
+            self._start_sweeper()
+            self._connection.execute(
+                "INSERT INTO oauth_states (state, expires_at) VALUES (?, ?)", (state, time.time() + self.expiration_seconds)
+            )
+        return state
+
+    def consume(self, state: str) -> bool:
+        # The delete is the check: only the one caller that removed a live row gets True
+        with self._lock:
+            deleted = self._connection.execute(
+                "DELETE FROM oauth_states WHERE state = ? AND expires_at > ?", (state, time.time())
+            ).rowcount
+        if not deleted:
+            logger.warning(f"OAuth state {state} is unknown, expired or already used")
+        return deleted == 1
+
+    def sweep(self, now: float | None = None) -> int:
+        # Deletes the expired states, returns how many
+        with self._lock:
+            return self._connection.execute(
+                "DELETE FROM oauth_states WHERE expires_at <= ?", (time.time() if now is None else now,)
+            ).rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM oauth_states").fetchone()[0]
+
+    def _start_sweeper(self):
+        # Started on first use, and again in a process forked after that, which has no threads of its own
+        if self.sweep_interval <= 0 or self._sweeper_pid == os.getpid():
+            return
+        self._sweeper_pid = os.getpid()
+        self._sweeper = threading.Thread(target=self._run_sweeper, name="oauth-state-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def _run_sweeper(self):
+        while not self._stopped.wait(self.sweep_interval):
+            try:
+                swept = self.sweep()
+            except Exception:
+                logger.exception("Failed to delete expired OAuth states")
+                continue
+            if swept:
+                logger.debug(f"Deleted {swept} expired OAuth states")
+
+    def close(self):
+        self._stopped.set()
@@ -0,0 +1,504 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from delivery_report import error_code
+from fanout import DEFAULT_MAX_WORKERS, fan_out
+from rate_limiter import RateLimiter, rate_limited_retries
+from scheduling import ReleaseClock
+from storage import connect
+
+logger = logging.getLogger(__name__)
+
+# Campaigns whose queued conversations enqueue() keeps in memory, the others are read back from SQLite
+OUTBOX_INDEX_CAMPAIGNS = int(os.getenv("OUTBOX_INDEX_CAMPAIGNS", "32"))
+
+# Seconds before the recipients of a submitted campaign are resolved again after a failure
+OUTBOX_RESOLVE_RETRY_SECONDS = float(os.getenv("OUTBOX_RESOLVE_RETRY_SECONDS", "30"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaigns (
+    campaign_id TEXT PRIMARY KEY,
+    user_id TEXT,
+    message TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    completed_at REAL,
+    recipients TEXT,
+    enterprise_id TEXT,
+    team_id TEXT
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    campaign_id TEXT NOT NULL REFERENCES campaigns (campaign_id),
+    conversation_id TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    ts TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    retries INTEGER NOT NULL DEFAULT 0,
+    latency_ms REAL,
+    not_before REAL NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    UNIQUE (campaign_id, conversation_id)
+);
+CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, id);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, not_before);
+"""
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+
+@dataclass
+class OutboxRow:
+    id: int
+    campaign_id: str
+    conversation_id: str
+
+
+class Outbox:
+    """SQLite-backed queue of (campaign, conversation) sends.
+
+    Rows move from pending to sending when a worker claims them and end as sent (with the message ts)
+    or failed (with the Slack error code). Rows left in sending by a crash go back to pending on
+    recover(), so delivery is at-least-once. A row is not claimed before its not_before time.
+    A campaign gets at most one row per conversation, enqueueing it again only adds the new ones.
+
+    A submitted campaign keeps its recipients as chosen in the modal until enqueue() replaces them
+    with its rows, so a restart in between does not lose it (see OutboxWorker's resolve).
+    """
+
+    def __init__(self, path: str | None = None, index_campaigns: int = OUTBOX_INDEX_CAMPAIGNS):
+        self._connection = connect(path)
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._messages: dict[str, dict] = {}
+        # campaign_id -> set of its conversations with a row, the most recently enqueued campaigns last
+        self._queued: OrderedDict = OrderedDict()
+        self._index_campaigns = index_campaigns
+
+    def _queued_conversations(self, campaign_id: str) -> set:
+        # Called in the enqueue transaction. Rows are never deleted, so an indexed campaign can only
+        # miss rows another process added, and INSERT OR IGNORE still skips those.
+        queued = self._queued.get(campaign_id)
+        if queued is None:
+            rows = self._connection.execute("SELECT conversation_id FROM outbox WHERE campaign_id = ?", (campaign_id,))
+            queued = {row["conversation_id"] for row in rows}
+        return queued
+
+    def _index(self, campaign_id: str, queued: set):
+        self._queued[campaign_id] = queued
+        self._queued.move_to_end(campaign_id)
+        while len(self._queued) > self._index_campaigns:
+            self._queued.popitem(last=False)
+
+    def submit(self, campaign_id: str, message: dict, user_id: str | None, recipients: dict,
+               team: tuple | None = None) -> bool:
+        # Stores a campaign whose recipients still need resolving. team is the team_key() of the
+        # workspace it was submitted in. False when the campaign was submitted before, it is not stored again.
+        enterprise_id, team_id = team or (None, None)
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT OR IGNORE INTO campaigns (campaign_id, user_id, message, created_at, recipients, enterprise_id, team_id)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (campaign_id, user_id, json.dumps(message), time.time(), json.dumps(recipients), enterprise_id, team_id),
+            )
+        return cursor.rowcount == 1
+
+    def submitted_recipients(self, campaign_id: str) -> dict | None:
+        # The recipients given to submit(), None once the campaign has been enqueued
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT recipients FROM campaigns WHERE campaign_id = ?", (campaign_id,)
+            ).fetchone()
+        return json.loads(row["recipients"]) if row and row["recipients"] is not None else None
+
+    def unresolved_campaigns(self) -> list:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT campaign_id FROM campaigns WHERE recipients IS NOT NULL ORDER BY created_at"
+            ).fetchall()
+        return [row["campaign_id"] for row in rows]
+
+    def abandon(self, campaign_id: str):
+        # A submitted campaign that cannot be enqueued, it is neither resolved again nor reported
+        with self._lock:
+            now = time.time()
+            self._connection.execute(
+                "UPDATE campaigns SET recipients = NULL, completed_at = ? WHERE campaign_id = ? AND completed_at IS NULL",
+                (now, campaign_id),
+            )
+        self._messages.pop(campaign_id, None)
+
+    def enqueue(self, campaign_id: str, conversation_ids: list, message: dict, user_id: str | None = None,
+                failed: dict | None = None, not_before: dict | None = None) -> int:
+        # failed maps recipients that could not be turned into a conversation to their error code,
+        # they are recorded so the delivery report lists them.
+        # not_before maps conversations to the Unix time they may be sent at, the others are sent right away.
+        # Conversations the campaign already has a row for are skipped, whatever its status, so a
+        # replayed submission does not message them twice. Returns the number of rows to send added.
+        # A submitted campaign no longer needs resolving once this commits.
+        not_before = not_before or {}
+        now = time.time()
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                queued = self._queued_conversations(campaign_id)
+                conversation_ids = [conversation_id for conversation_id in dict.fromkeys(conversation_ids) if conversation_id not in queued]
+                failed = {recipient: error for recipient, error in (failed or {}).items() if recipient not in queued}
+                self._connection.execute(
+                    "INSERT OR IGNORE INTO campaigns (campaign_id, user_id, message, created_at) VALUES (?, ?, ?, ?)",
+                    (campaign_id, user_id, json.dumps(message), now),
+                )
+                cursor = self._connection.executemany(
+                    "INSERT OR IGNORE INTO outbox (campaign_id, conversation_id, not_before, updated_at) VALUES (?, ?, ?, ?)",
+                    [(campaign_id, conversation_id, not_before.get(conversation_id, 0), now) for conversation_id in conversation_ids],
+                )
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO outbox (campaign_id, conversation_id, status, error, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    [(campaign_id, recipient, FAILED, error, now) for recipient, error in failed.items()],
+                )
+                self._connection.execute(
+                    "UPDATE campaigns SET recipients = NULL WHERE campaign_id = ? AND recipients IS NOT NULL", (campaign_id,)
+                )
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+            queued.update(conversation_ids)
+            queued.update(failed)
+            self._index(campaign_id, queued)
+        self._messages.setdefault(campaign_id, message)
+        return max(cursor.rowcount, 0)
+
+    def recover(self) -> int:
+        # Sends that were in flight when the process died are retried
+        with self._lock:
+            cursor = self._connection.execute(
+                "UPDATE outbox SET status = ?, updated_at = ? WHERE status = ?", (PENDING, time.time(), SENDING)
+            )
+        if cursor.rowcount:
+            logger.warning(f"Recovered {cursor.rowcount} unfinished outbox rows")
+        return cursor.rowcount
+
+    def claim(self, limit: int) -> list[OutboxRow]:
+        # Claims up to limit pending rows that are due, the earliest first
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._connection.execute(
+                    "SELECT id, campaign_id, conversation_id FROM outbox WHERE status = ? AND not_before <= ?"
+                    " ORDER BY not_before, id LIMIT ?",
+                    (PENDING, time.time(), limit),
+                ).fetchall()
+                self._connection.executemany(
+                    "UPDATE outbox SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    [(SENDING, time.time(), row["id"]) for row in rows],
+                )
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+        return [OutboxRow(row["id"], row["campaign_id"], row["conversation_id"]) for row in rows]
+
+    def release_times(self, after: float) -> list:
+        # The distinct not_before times of pending rows later than after
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT DISTINCT not_before FROM outbox WHERE status = ? AND not_before > ?", (PENDING, after)
+            ).fetchall()
+        return [row["not_before"] for row in rows]
+
+    def mark_sent(self, row_id: int, ts: str | None, latency_ms: float | None = None, retries: int = 0):
+        with self._lock:
+            self._connection.execute(
+                "UPDATE outbox SET status = ?, ts = ?, error = NULL, latency_ms = ?, retries = retries + ?, updated_at = ?"
+                " WHERE id = ?",
+                (SENT, ts, latency_ms, retries, time.time(), row_id),
+            )
+
+    def mark_failed(self, row_id: int, error: str, latency_ms: float | None = None, retries: int = 0):
+        with self._lock:
+            self._connection.execute(
+                "UPDATE outbox SET status = ?, error = ?, latency_ms = ?, retries = retries + ?, updated_at = ? WHERE id = ?",
+                (FAILED, error, latency_ms, retries, time.time(), row_id),
+            )
+
+    def finish_campaign(self, campaign_id: str) -> bool:
+        # Marks the campaign complete once it was enqueued and no row is left to send.
+        # Returns True only for the call that completed it, so it is reported once.
+        with self._lock:
+            cursor = self._connection.execute(
+                "UPDATE campaigns SET completed_at = ? WHERE campaign_id = ? AND completed_at IS NULL AND recipients IS NULL"
+                " AND NOT EXISTS (SELECT 1 FROM outbox WHERE campaign_id = ? AND status IN (?, ?))",
+                (time.time(), campaign_id, campaign_id, PENDING, SENDING),
+            )
+        if cursor.rowcount != 1:
+            return False
+        # Nothing is sent for it anymore, its message is only kept until then
+        self._messages.pop(campaign_id, None)
+        return True
+
+    def unfinished_campaigns(self) -> list:
+        with self._lock:
+            rows = self._connection.execute("SELECT campaign_id FROM campaigns WHERE completed_at IS NULL").fetchall()
+        return [row["campaign_id"] for row in rows]
+
+    def campaign_user(self, campaign_id: str) -> str | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT user_id FROM campaigns WHERE campaign_id = ?", (campaign_id,)
+            ).fetchone()
+        return row["user_id"] if row else None
+
+    def campaign_team(self, campaign_id: str) -> tuple | None:
+        # The team given to submit(), None when there was none
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT enterprise_id, team_id FROM campaigns WHERE campaign_id = ?", (campaign_id,)
+            ).fetchone()
+        if row is None or (row["enterprise_id"] is None and row["team_id"] is None):
+            return None
+        return row["enterprise_id"] or "", row["team_id"] or ""
+
+    def campaign_created_at(self, campaign_id: str) -> float | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT created_at FROM campaigns WHERE campaign_id = ?", (campaign_id,)
+            ).fetchone()
+        return row["created_at"] if row else None
+
+    def message(self, campaign_id: str) -> dict:
+        if campaign_id not in self._messages:
+            with self._lock:
+                row = self._connection.execute(
+                    "SELECT message FROM campaigns WHERE campaign_id = ?", (campaign_id,)
+                ).fetchone()
+            self._messages[campaign_id] = json.loads(row["message"])
+        return self._messages[campaign_id]
+
+    def rows(self, campaign_id: str) -> list[dict]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT * FROM outbox WHERE campaign_id = ? ORDER BY id", (campaign_id,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM outbox WHERE status IN (?, ?)", (PENDING, SENDING)
+            ).fetchone()[0]
+
+
+class OutboxWorker:
+    """Background thread that drains the outbox.
+
+    send(conversation_id, message) must post the message and return the chat.postMessage response.
+    With prepare, message is prepare(campaign_id, outbox message), computed once per campaign instead of per send.
+    on_campaign_done(campaign_id, user_id, rows) is called once when the last row of a campaign is done.
+    resolve(campaign_id) turns the recipients of a submitted campaign into rows with Outbox.enqueue().
+    It runs on resolve_executor (anything with submit(fn, *args), such as a listener lane), or on the
+    worker thread without one, for every campaign that is submitted but not enqueued, including the
+    ones a restart interrupted. When it raises, the campaign stays submitted and is resolved again
+    resolve_retry_seconds later, a campaign that can never be resolved must be abandoned by resolve.
+    Between batches it sleeps until the next scheduled row is due, or until notify().
+    """
+
+    def __init__(self, outbox: Outbox, send: Callable[[str, dict], dict], max_workers: int | None = None,
+                 rate_limiter: RateLimiter | None = None,
+                 on_campaign_done: Callable[[str, str | None, list], None] | None = None,
+                 prepare: Callable[[str, dict], Any] | None = None,
+                 resolve: Callable[[str], None] | None = None, resolve_executor=None,
+                 resolve_retry_seconds: float = OUTBOX_RESOLVE_RETRY_SECONDS):
+        self.outbox = outbox
+        self.send = send
+        self.prepare = prepare
+        self._prepared: dict[str, Any] = {}
+        self.rate_limiter = rate_limiter
+        self.on_campaign_done = on_campaign_done
+        self.resolve = resolve
+        self.resolve_executor = resolve_executor
+        self.resolve_retry_seconds = resolve_retry_seconds
+        self._resolving: set[str] = set()
+        # campaign_id -> when its failed resolution may be tried again
+        self._resolve_after: dict[str, float] = {}
+        self.max_workers = max_workers or DEFAULT_MAX_WORKERS
+        self.releases = ReleaseClock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _message(self, campaign_id: str):
+        if self.prepare is None:
+            return self.outbox.message(campaign_id)
+        if campaign_id not in self._prepared:
+            # Racing threads may both prepare it, either result is the same
+            self._prepared[campaign_id] = self.prepare(campaign_id, self.outbox.message(campaign_id))
+        return self._prepared[campaign_id]
+
+    def _send_row(self, row: OutboxRow):
+        started = time.perf_counter()
+        try:
+            response = self.send(row.conversation_id, self._message(row.campaign_id))
+        except Exception as e:
+            retries = rate_limited_retries(getattr(e, "response", None))
+            self.outbox.mark_failed(row.id, error_code(e), (time.perf_counter() - started) * 1000, retries)
+            raise
+        self.outbox.mark_sent(row.id, response.get("ts"), (time.perf_counter() - started) * 1000, rate_limited_retries(response))
+        return response
+
+    def _finish_campaigns(self, campaign_ids: set):
+        for campaign_id in campaign_ids:
+            if not self.outbox.finish_campaign(campaign_id):
+                continue
+            self._prepared.pop(campaign_id, None)
+            logger.info(f"Campaign {campaign_id} finished")
+            if self.on_campaign_done is not None:
+                try:
+                    self.on_campaign_done(campaign_id, self.outbox.campaign_user(campaign_id), self.outbox.rows(campaign_id))
+                except Exception as e:
+                    logger.exception(f"Failed to report campaign {campaign_id}: {e}")
+
+    def _resolve(self, campaign_id: str):
+        try:
+            self.resolve(campaign_id)
+            self._resolve_after.pop(campaign_id, None)
+        except Exception as e:
+            retry_at = time.time() + self.resolve_retry_seconds
+            self._resolve_after[campaign_id] = retry_at
+            self.releases.add([retry_at])
+            logger.exception(f"Failed to resolve campaign {campaign_id}, retrying in {self.resolve_retry_seconds}s: {e}")
+        finally:
+            self._resolving.discard(campaign_id)
+            self.notify()
+
+    def resolve_campaigns(self):
+        # Starts resolving the submitted campaigns that are not being resolved already
+        if self.resolve is None:
+            return
+        now = time.time()
+        for campaign_id in self.outbox.unresolved_campaigns():
+            if campaign_id in self._resolving or self._resolve_after.get(campaign_id, 0) > now:
+                continue
+            self._resolving.add(campaign_id)
+            if self.resolve_executor is None:
+                self._resolve(campaign_id)
+            else:
+                self.resolve_executor.submit(self._resolve, campaign_id)
+
+    def drain_once(self) -> int:
+        # Claims and sends one batch, returns how many rows were processed
+        self.resolve_campaigns()
+        rows = self.outbox.claim(self.max_workers * 4)
+        if rows:
+            results = fan_out(self._send_row, rows, max_workers=self.max_workers)
+            failed = [result.item.conversation_id for result in results if not result.ok]
+            logger.info(f"Outbox sent {len(rows) - len(failed)} of {len(rows)} messages")
+            if failed:
+                logger.warning(f"Outbox failed to send to: {failed}")
+            if self.rate_limiter is not None:
+                logger.info(f"Rate limiter stats: {self.rate_limiter.stats()}")
+            self._finish_campaigns({row.campaign_id for row in rows})
+        else:
+            # Campaigns with nothing to send, or finished right before a restart
+            self._finish_campaigns(set(self.outbox.unfinished_campaigns()))
+        return len(rows)
+
+    def notify(self):
+        self._wakeup.set()
+
+    def schedule(self, times):
+        # Tells the worker when newly queued rows become due
+        now = time.time()
+        self.releases.add(at for at in times if at > now)
+        self.notify()
+
+    def _idle_timeout(self) -> float:
+        now = time.time()
+        due = self.releases.next_due(now)
+        return 5.0 if due is None else min(5.0, due - now)
+
+    def run(self):
+        self.outbox.recover()
+        self.releases.add(self.outbox.release_times(time.time()))
+        while not self._stopped.is_set():
+            try:
+                if self.drain_once():
+                    continue
+            except Exception as e:
+                logger.exception(f"Outbox worker error: {e}")
+            self._wakeup.wait(timeout=self._idle_timeout())
+            self._wakeup.clear()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="outbox-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+class OutboxLeader:
+    """Runs the outbox worker in one process of a multi-process web server.
+
+    Every worker process calls start(), the one holding an exclusive lock on lock_path runs the
+    outbox worker. The others try again every retry_interval seconds and take over when the holder
+    exits, e.g. when the server recycles it. One sender keeps the rate limits and recover() right.
+    """
+
+    def __init__(self, worker: OutboxWorker, lock_path: str, retry_interval: float = 5.0):
+        self.worker = worker
+        self.lock_path = lock_path
+        self.retry_interval = retry_interval
+        self._lock_file = None
+        self._stopped = threading.Event()
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock_file is not None
+
+    def _try_lock(self):
+        # The locked file, None while another process holds the lock.
+        # POSIX only, like the servers that fork the worker processes.
+        import fcntl
+
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def _run(self):
+        while not self._stopped.is_set():
+            lock_file = self._try_lock()
+            if lock_file is not None:
+                logger.info(f"Process {os.getpid()} runs the outbox worker")
+                self.worker.start()
+                # is_leader once the worker runs
+                self._lock_file = lock_file
+                return
+            self._stopped.wait(self.retry_interval)
+
+    def start(self):
+        threading.Thread(target=self._run, name="outbox-leader", daemon=True).start()
+
+    def stop(self, timeout: float | None = None):
+        # Lets the batch in flight finish before the lock passes to another process
+        self._stopped.set()
+        if self._lock_file is not None:
+            self.worker.stop(timeout)
+            self._lock_file.close()
+            self._lock_file = None
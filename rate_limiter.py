@@ -0,0 +1,257 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import urllib.error
+from dataclasses import dataclass
+
+from slack_sdk.errors import SlackApiError
+
+try:
+    # The async client needs aiohttp, which only async_app.py uses
+    from slack_sdk.web.async_client import AsyncWebClient
+except ImportError:
+    AsyncWebClient = None
+
+from delivery_report import error_code
+from http_pool import PooledWebClient
+from metrics import record_api_call
+
+logger = logging.getLogger(__name__)
+
+# Requests per minute allowed for each Web API method. A key ending in "." applies to every
+# method with that prefix. See https://api.slack.com/apis/rate-limits for the tiers.
+# Override with SLACK_RATE_LIMITS, e.g. SLACK_RATE_LIMITS="chat.postMessage=300,views.update=50"
+DEFAULT_RATE_LIMITS = {
+    # chat.postMessage has its own tier: about 1 message per second per channel,
+    # with a workspace-wide ceiling of several hundred messages per minute.
+    "chat.postMessage": 600,
+    "views.open": 100,  # Tier 4
+    "views.push": 100,  # Tier 4
+    "views.update": 100,  # Tier 4
+    "conversations.": 50,  # Tier 3
+    "users.lookupByEmail": 50,  # Tier 3
+    "users.info": 100,  # Tier 4
+    "users.list": 20,  # Tier 2
+}
+
+# Retry-After used when Slack throttles us without sending the header
+DEFAULT_RETRY_AFTER_SECONDS = 1.0
+
+
+def rate_limits_from_env() -> dict:
+    limits = {}
+    for item in os.getenv("SLACK_RATE_LIMITS", "").split(","):
+        if "=" in item:
+            method, per_minute = item.split("=", 1)
+            limits[method.strip()] = float(per_minute)
+    return limits
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        # Allow a burst of up to one second worth of calls
+        self.capacity = max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        # Take one token and return how many seconds the caller has to wait before using it.
+        # Tokens can go negative, so concurrent callers queue up behind each other in order.
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+@dataclass
+class MethodStats:
+    calls: int = 0
+    waited_calls: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    throttled: int = 0
+
+
+class RateLimiter:
+    """Paces Web API calls with one token bucket per method.
+
+    When Slack answers with HTTP 429, throttled() pauses every caller until Retry-After has passed.
+    """
+
+    def __init__(self, limits: dict | None = None):
+        self.limits = {**DEFAULT_RATE_LIMITS, **(limits or {})}
+        self._buckets: dict[str, TokenBucket | None] = {}
+        self._paused_until = 0.0
+        self._stats: dict[str, MethodStats] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        return cls(rate_limits_from_env())
+
+    def _bucket(self, method: str) -> TokenBucket | None:
+        if method not in self._buckets:
+            with self._lock:
+                if method not in self._buckets:
+                    key = method if method in self.limits else next(
+                        (prefix for prefix in self.limits if prefix.endswith(".") and method.startswith(prefix)), None
+                    )
+                    # Methods sharing a prefix share its bucket
+                    if key is None:
+                        bucket = None
+                    elif key != method and key in self._buckets:
+                        bucket = self._buckets[key]
+                    else:
+                        bucket = TokenBucket(self.limits[key])
+                        self._buckets[key] = bucket
+                    self._buckets[method] = bucket
+        return self._buckets[method]
+
+    def _next_delay(self, method: str) -> float:
+        bucket = self._bucket(method)
+        bucket_wait = bucket.reserve() if bucket is not None else 0.0
+        return max(bucket_wait, self._paused_until - time.monotonic())
+
+    def _record(self, method: str, waited: float):
+        with self._lock:
+            stats = self._stats.setdefault(method, MethodStats())
+            stats.calls += 1
+            if waited > 0:
+                stats.waited_calls += 1
+                stats.total_wait += waited
+                stats.max_wait = max(stats.max_wait, waited)
+        if waited > 0:
+            logger.debug(f"{method} waited {waited:.3f}s for its rate limit slot")
+
+    def acquire(self, method: str) -> float:
+        # Blocks until method may be called, returns the seconds spent waiting
+        started = time.monotonic()
+        delay = self._next_delay(method)
+        while delay > 0:
+            time.sleep(delay)
+            # Slack may have throttled us again while we were sleeping
+            delay = self._paused_until - time.monotonic()
+        waited = time.monotonic() - started
+        self._record(method, waited)
+        return waited
+
+    async def acquire_async(self, method: str) -> float:
+        started = time.monotonic()
+        delay = self._next_delay(method)
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self._paused_until - time.monotonic()
+        waited = time.monotonic() - started
+        self._record(method, waited)
+        return waited
+
+    def throttled(self, method: str, retry_after: float):
+        # Pause every caller, not only the one that got the 429
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            self._stats.setdefault(method, MethodStats()).throttled += 1
+        logger.warning(f"{method} was rate limited, pausing all Web API calls for {retry_after}s")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {method: vars(stats).copy() for method, stats in self._stats.items()}
+
+
+def rate_limited_retries(response) -> int:
+    # How often a call made through a rate limited client was retried after a 429
+    return getattr(response, "rate_limited_retries", 0)
+
+
+def is_rate_limited(error: SlackApiError) -> bool:
+    return error.response.status_code == 429 or error.response.get("error") == "ratelimited"
+
+
+def retry_after_seconds(error: SlackApiError) -> float:
+    try:
+        return float(error.response.headers.get("Retry-After", DEFAULT_RETRY_AFTER_SECONDS))
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER_SECONDS
+
+
+def is_permanent_error(error: Exception) -> bool:
+    # Errors that trying again would hit again: a client error from Slack or a file download, such as
+    # a revoked token, a missing installation (LookupError) or malformed data. Rate limits, server,
+    # network and database errors may pass.
+    if isinstance(error, SlackApiError):
+        return error.response.status_code < 500 and not is_rate_limited(error)
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code < 500 and error.code != 429
+    return isinstance(error, (LookupError, TypeError, ValueError))
+
+
+class RateLimitedWebClient(PooledWebClient):
+    """WebClient whose every API call goes through a shared RateLimiter and is retried after a 429.
+
+    The returned response, or the response of the raised SlackApiError, carries the number of
+    retries in its rate_limited_retries attribute.
+    """
+
+    def __init__(self, *args, rate_limiter: RateLimiter | None = None, max_rate_limited_retries: int = 5, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter or RateLimiter.from_env()
+        self.max_rate_limited_retries = max_rate_limited_retries
+
+    def api_call(self, api_method: str, **kwargs):
+        retries = 0
+        while True:
+            self.rate_limiter.acquire(api_method)
+            started = time.perf_counter()
+            try:
+                response = super().api_call(api_method, **kwargs)
+                record_api_call(api_method, started)
+                response.rate_limited_retries = retries
+                return response
+            except SlackApiError as e:
+                record_api_call(api_method, started, error_code(e), is_rate_limited(e))
+                if not is_rate_limited(e) or retries >= self.max_rate_limited_retries:
+                    e.response.rate_limited_retries = retries
+                    raise
+                retries += 1
+                self.rate_limiter.throttled(api_method, retry_after_seconds(e))
+            except Exception as e:
+                record_api_call(api_method, started, error_code(e))
+                raise
+
+
+if AsyncWebClient is not None:
+    class AsyncRateLimitedWebClient(AsyncWebClient):
+        """AsyncWebClient counterpart of RateLimitedWebClient."""
+
+        def __init__(self, *args, rate_limiter: RateLimiter | None = None, max_rate_limited_retries: int = 5, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.rate_limiter = rate_limiter or RateLimiter.from_env()
+            self.max_rate_limited_retries = max_rate_limited_retries
+
+        async def api_call(self, api_method: str, **kwargs):
+            retries = 0
+            while True:
+                await self.rate_limiter.acquire_async(api_method)
+                started = time.perf_counter()
+                try:
+                    response = await super().api_call(api_method, **kwargs)
+                    record_api_call(api_method, started)
+                    response.rate_limited_retries = retries
+                    return response
+                except SlackApiError as e:
+                    record_api_call(api_method, started, error_code(e), is_rate_limited(e))
+                    if not is_rate_limited(e) or retries >= self.max_rate_limited_retries:
+                        e.response.rate_limited_retries = retries
+                        raise
+                    retries += 1
+                    self.rate_limiter.throttled(api_method, retry_after_seconds(e))
+                except Exception as e:
+                    record_api_call(api_method, started, error_code(e))
+                    raise
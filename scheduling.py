@@ -0,0 +1,120 @@
+import time
+import heapq
+import logging
+import threading
+from dataclasses import dataclass
+
+from dm_channels import is_user_id
+from fanout import fan_out
+
+logger = logging.getLogger(__name__)
+
+# Above this many users the time zones come from paging through users.list (Tier 2, up to 1000
+# users a page) instead of one users.info call per user (Tier 4)
+TZ_LOOKUP_MAX_USERS = 200
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+@dataclass
+class DeliverySchedule:
+    """When a broadcast goes out, as chosen in the modal.
+
+    send_at is a Unix timestamp, None for right away. stagger_seconds spreads the conversations
+    evenly over a window starting at the send time. With local_time, send_at is read as a time of
+    day in the sender's time zone and each user receives the message at that time in theirs, the
+    next day where it has already passed.
+    """
+
+    send_at: float | None = None
+    stagger_seconds: int = 0
+    local_time: bool = False
+
+    @property
+    def immediate(self) -> bool:
+        return self.send_at is None and not self.stagger_seconds
+
+    def release_times(self, conversation_ids: list, now: float, tz_offsets: dict | None = None,
+                      sender_tz_offset: int = 0) -> dict:
+        # conversation ID -> not_before. tz_offsets maps user IDs to their UTC offset in seconds,
+        # conversations without one (channels) keep the sender's send time.
+        start = max(self.send_at or now, now)
+        times = {}
+        step = self.stagger_seconds / len(conversation_ids) if conversation_ids else 0
+        for i, conversation_id in enumerate(conversation_ids):
+            at = start + i * step
+            if self.local_time and tz_offsets and conversation_id in tz_offsets:
+                # The same wall clock time, shifted from the sender's time zone to the recipient's
+                at += sender_tz_offset - tz_offsets[conversation_id]
+                # A time zone ahead of the sender's may already be past the chosen time,
+                # those get it at that time the next day rather than now, maybe in their night
+                while at < now:
+                    at += SECONDS_PER_DAY
+            times[conversation_id] = max(at, now)
+        return times
+
+
+def tz_offsets(client, user_ids: list) -> dict:
+    # user ID -> tz_offset in seconds for the users among user_ids, users that cannot be looked up are left out
+    user_ids = [user_id for user_id in dict.fromkeys(user_ids) if is_user_id(user_id)]
+    if not user_ids:
+        return {}
+    if len(user_ids) <= TZ_LOOKUP_MAX_USERS:
+        results = fan_out(lambda user_id: client.users_info(user=user_id), user_ids)
+        return {result.item: result.value["user"].get("tz_offset", 0) for result in results if result.ok}
+    wanted, offsets = set(user_ids), {}
+    cursor = None
+    while True:
+        response = client.users_list(limit=1000, cursor=cursor)
+        for member in response["members"]:
+            if member["id"] in wanted:
+                offsets[member["id"]] = member.get("tz_offset", 0)
+        cursor = (response.get("response_metadata") or {}).get("next_cursor")
+        if not cursor:
+            break
+    logger.info(f"Found the time zones of {len(offsets)} of {len(user_ids)} users in users.list")
+    return offsets
+
+
+def slack_date(at: float) -> str:
+    # Shown in the reader's own time zone by Slack
+    fallback = time.strftime("%Y-%m-%d %H:%M UTC", time.gmtime(at))
+    return f"<!date^{int(at)}^{{date_short_pretty}} at {{time}}|{fallback}>"
+
+
+def schedule_confirmation(release_times: dict) -> str:
+    first, last = min(release_times.values()), max(release_times.values())
+    if last - first < 60:
+        return f"Your message to {len(release_times)} conversations is scheduled for {slack_date(first)}."
+    return (f"Your message to {len(release_times)} conversations is scheduled between "
+            f"{slack_date(first)} and {slack_date(last)}.")
+
+
+class ReleaseClock:
+    """Min-heap of the times scheduled outbox rows become due.
+
+    The rows and their not_before live in the outbox, this only tells the worker how long it may
+    sleep. Times that have passed are dropped as next_due() walks past them.
+    """
+
+    def __init__(self):
+        self._heap: list[float] = []
+        self._times: set[float] = set()
+        self._lock = threading.Lock()
+
+    def add(self, times):
+        with self._lock:
+            for at in times:
+                if at not in self._times:
+                    self._times.add(at)
+                    heapq.heappush(self._heap, at)
+
+    def next_due(self, now: float) -> float | None:
+        # The earliest time after now, None when nothing is scheduled
+        with self._lock:
+            while self._heap and self._heap[0] <= now:
+                self._times.discard(heapq.heappop(self._heap))
+            return self._heap[0] if self._heap else None
+
+    def __len__(self) -> int:
+        return len(self._heap)
@@ -0,0 +1,139 @@
+import os
+import time
+import logging
+import functools
+import threading
+from collections import OrderedDict
+
+from slack_sdk.socket_mode.request import SocketModeRequest
+from slack_sdk.socket_mode.response import SocketModeResponse
+
+from metrics import socket_mode_busy, socket_mode_envelopes, socket_mode_in_flight
+
+logger = logging.getLogger(__name__)
+
+# Socket Mode connections opened with the app token. Slack spreads envelopes across them and keeps
+# delivering on the others while one reconnects. It allows up to 10 per app.
+SOCKET_MODE_CONNECTIONS = int(os.getenv("SOCKET_MODE_CONNECTIONS", "2"))
+# How often the load of every connection is logged, 0 turns it off
+SOCKET_MODE_REPORT_SECONDS = float(os.getenv("SOCKET_MODE_REPORT_SECONDS", "60"))
+# Slack retries an unacknowledged event for a few minutes, deliveries are remembered for longer than that
+DEDUPE_SECONDS = 600
+
+
+def delivery_key(request: SocketModeRequest) -> str:
+    # A retried event may come in a new envelope, on another connection, but keeps its event_id
+    if request.type == "events_api" and (request.payload or {}).get("event_id"):
+        return f"event:{request.payload['event_id']}"
+    return f"envelope:{request.envelope_id}"
+
+
+class RecentKeys:
+    """Thread safe set of the keys added in the last ttl seconds, at most maxsize of them."""
+
+    def __init__(self, ttl: float, maxsize: int = 100_000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._added: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, key) -> bool:
+        # True when key is new, False when it was added within ttl
+        now = time.monotonic()
+        with self._lock:
+            while self._added and next(iter(self._added.values())) <= now - self.ttl:
+                self._added.popitem(last=False)
+            if key in self._added:
+                return False
+            if len(self._added) >= self.maxsize:
+                self._added.popitem(last=False)
+            self._added[key] = now
+            return True
+
+    def __len__(self) -> int:
+        return len(self._added)
+
+
+class SocketModeConnections:
+    """Several Socket Mode connections of one app, handled as one.
+
+    handlers are Bolt SocketModeHandlers, one per connection, or anything else with a client and a
+    handle(client, request). Envelopes redelivered after a reconnect, on any of the connections, are
+    acknowledged again and dropped instead of running the listeners twice. How busy each connection
+    is goes to the slack_socket_mode_* metrics and to the log every report_interval seconds.
+    """
+
+    def __init__(self, handlers: list, dedupe_seconds: float = DEDUPE_SECONDS,
+                 report_interval: float = SOCKET_MODE_REPORT_SECONDS):
+        self.handlers = handlers
+        self.report_interval = report_interval
+        self.delivered = RecentKeys(dedupe_seconds)
+        self._busy_reported = [0.0] * len(handlers)
+        for index, handler in enumerate(handlers):
+            # Takes the place of the handler's own listener, which would run the app for every envelope
+            handler.client.socket_mode_request_listeners[:] = [functools.partial(self._handle, handler, str(index))]
+
+    def _handle(self, handler, connection: str, client, request: SocketModeRequest):
+        if not self.delivered.add(delivery_key(request)):
+            socket_mode_envelopes.inc(connection=connection, outcome="duplicate")
+            logger.info(f"Dropped redelivered envelope {request.envelope_id} on Socket Mode connection {connection}")
+            client.send_socket_mode_response(SocketModeResponse(envelope_id=request.envelope_id))
+            return
+        socket_mode_in_flight.inc(connection=connection)
+        started = time.perf_counter()
+        try:
+            handler.handle(client, request)
+        finally:
+            socket_mode_in_flight.dec(connection=connection)
+            socket_mode_busy.inc(time.perf_counter() - started, connection=connection)
+            socket_mode_envelopes.inc(connection=connection, outcome="handled")
+
+    def load(self) -> list[dict]:
+        # One entry per connection, busy_seconds adds up the time spent in the listeners
+        return [
+            {
+                "connection": str(index),
+                "connected": handler.client.is_connected(),
+                "in_flight": socket_mode_in_flight.value(connection=index),
+                "queued": handler.client.message_queue.qsize(),
+                "handled": socket_mode_envelopes.value(connection=index, outcome="handled"),
+                "duplicates": socket_mode_envelopes.value(connection=index, outcome="duplicate"),
+                "busy_seconds": socket_mode_busy.value(connection=index),
+            }
+            for index, handler in enumerate(self.handlers)
+        ]
+
+    def report(self, interval: float):
+        for index, load in enumerate(self.load()):
+            # Average number of envelopes in the listeners over the interval
+            busy = (load["busy_seconds"] - self._busy_reported[index]) / interval
+            self._busy_reported[index] = load["busy_seconds"]
+            logger.info(
+                f"Socket Mode connection {load['connection']}: {'connected' if load['connected'] else 'reconnecting'},"
+                f" {busy:.2f} envelopes in the listeners on average, {load['in_flight']:g} in flight, {load['queued']} queued,"
+                f" {load['handled']:g} handled, {load['duplicates']:g} redeliveries dropped"
+            )
+
+    def _run_reports(self):
+        while True:
+            time.sleep(self.report_interval)
+            try:
+                self.report(self.report_interval)
+            except Exception:
+                logger.exception("Failed to report the Socket Mode connections")
+
+    def connect(self):
+        for handler in self.handlers:
+            handler.connect()
+        logger.info(f"Opened {len(self.handlers)} Socket Mode connections")
+        if self.report_interval > 0:
+            threading.Thread(target=self._run_reports, name="socket-mode-report", daemon=True).start()
+
+    def start(self):
+        # Like SocketModeHandler.start(): connects, then blocks the calling thread
+        self.connect()
+        threading.Event().wait()
+
+    def close(self):
+        for handler in self.handlers:
+            handler.close()
@@ -0,0 +1,14 @@
+import ssl
+import certifi
+
+
+def create_ssl_context() -> ssl.SSLContext:
+    # Get the path to the certifi CA bundle
+    ca_file_path = certifi.where()
+
+    # Create a custom SSL context
+    context = ssl.create_default_context(cafile=ca_file_path)
+
+    # Disable the strict verification flag
+    context.verify_flags &= ~ssl.VERIFY_X509_STRICT
+    return context
@@ -0,0 +1,72 @@
+import os
+import sqlite3
+
+# Local SQLite database shared by the outbox and the other on-disk caches.
+# Override with the COMMS_DB_PATH environment variable.
+DEFAULT_DB_PATH = os.getenv("COMMS_DB_PATH", "comms_app.sqlite3")
+
+# Bumped in every forked child, connections opened before the fork belong to the parent
+_forks = 0
+# Connections inherited from the parent are never closed, closing one could checkpoint the parent's WAL
+_inherited: list[sqlite3.Connection] = []
+
+
+def _after_fork():
+    global _forks
+    _forks += 1
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def _open(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+    connection.row_factory = sqlite3.Row
+    # WAL lets readers in other threads and processes run while a worker is writing
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+class SharedConnection:
+    """SQLite connection shared between the threads of one process, reopened in forked children.
+
+    A multi-process server that preloads the app forks its workers after the stores opened their
+    database, and SQLite connections must not be used across fork(). Scripts run with executescript(),
+    the schemas, are run again on the new connection so ":memory:" databases keep their tables.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._scripts: list[str] = []
+        self._connection = _open(path)
+        self._forks = _forks
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._forks != _forks:
+            _inherited.append(self._connection)
+            self._connection = _open(self.path)
+            self._forks = _forks
+            for script in self._scripts:
+                self._connection.executescript(script)
+        return self._connection
+
+    def execute(self, sql: str, parameters=()) -> sqlite3.Cursor:
+        return self.connection.execute(sql, parameters)
+
+    def executemany(self, sql: str, parameters) -> sqlite3.Cursor:
+        return self.connection.executemany(sql, parameters)
+
+    def executescript(self, script: str) -> sqlite3.Cursor:
+        cursor = self.connection.executescript(script)
+        self._scripts.append(script)
+        return cursor
+
+    def close(self):
+        self._connection.close()
+
+
+def connect(path: str | None = None) -> SharedConnection:
+    # One connection is shared between threads, callers serialize access with their own lock
+    return SharedConnection(path or DEFAULT_DB_PATH)
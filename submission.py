@@ -0,0 +1,181 @@
+import re
+import time
+import logging
+
+import validators
+
+from blocks import is_checked, selected_cta_button_count
+from email_resolver import parse_emails
+from scheduling import DeliverySchedule
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_TEXT = "Message from Slack Communications App"
+
+# Block Kit limit for the text of a button element
+MAX_BUTTON_TEXT_CHARS = 75
+
+# Fast path for ordinary links: http(s), a dotted hostname with a letter TLD and RFC 3986 characters
+# after it. Everything else that starts with a scheme goes to validators.url, which also knows about
+# ports, user info, IP addresses and internationalized names.
+SIMPLE_URL_PATTERN = re.compile(
+    r"https?://(?:[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z]{2,63}"
+    r"(?:[/?#][A-Za-z0-9\-._~%!$&'()*+,;=:@/?#]*)?"
+)
+INVALID_URL_MESSAGE = "Please enter a valid URL that starts with http:// or https://"
+
+# Send times this far in the past are still accepted as "now", the modal may have been open a while
+SEND_AT_GRACE_SECONDS = 60
+
+
+def submission_key(view) -> str:
+    # The same for every delivery of one submission: the hash changes whenever the view is updated,
+    # and a submitted modal closes, so it is not submitted again with the same one.
+    return f"{view['id']}:{view['hash']}"
+
+
+def selected_conversations(view) -> list:
+    return view["state"]["values"]["conversation_select_block"]["conversation_select_action"].get("selected_conversations") or []
+
+
+def pasted_emails(view) -> tuple[list, list]:
+    # (valid, invalid) entries of the email addresses text box
+    action = view["state"]["values"].get("recipient_emails", {}).get("recipient_emails-action", {})
+    return parse_emails(action.get("value"))
+
+
+def uploaded_files(view) -> list:
+    action = view["state"]["values"].get("recipient_file", {}).get("recipient_file-action", {})
+    return action.get("files") or []
+
+
+def delivery_schedule(view) -> DeliverySchedule:
+    values = view["state"]["values"]
+    send_at = (values.get("send_at") or {}).get("send_at-action", {}).get("selected_date_time")
+    stagger = ((values.get("stagger_window") or {}).get("stagger_window-action", {}).get("selected_option") or {}).get("value")
+    return DeliverySchedule(
+        send_at=float(send_at) if send_at else None,
+        stagger_seconds=int(stagger or 0),
+        local_time=is_checked(values, "local_time", "local_time-action"),
+    )
+
+
+def is_valid_url(value: str) -> bool:
+    if SIMPLE_URL_PATTERN.fullmatch(value):
+        return True
+    if not value.startswith(("http://", "https://")):
+        return False
+    return bool(validators.url(value))
+
+
+def validate_submission(view, scheduling: bool = True) -> dict | None:
+    # Returns the errors payload for ack(response_action="errors"), or None when the submission is valid.
+    # Every field is checked so the user sees all problems at once. Without scheduling, the app can
+    # only send right away and the delivery fields must be left empty.
+    values = view["state"]["values"]
+    errors = {}
+    emails, invalid_emails = pasted_emails(view)
+    if invalid_emails:
+        listed = ", ".join(invalid_emails[:5]) + (" …" if len(invalid_emails) > 5 else "")
+        errors["recipient_emails"] = f"These are not valid email addresses: {listed}"
+    elif not selected_conversations(view) and not emails and not uploaded_files(view):
+        errors["conversation_select_block"] = "Please select at least one conversation or add email addresses to send the message to."
+
+    schedule = delivery_schedule(view)
+    if not scheduling and (schedule.send_at or schedule.stagger_seconds or schedule.local_time):
+        errors["send_at"] = "Scheduled and staggered delivery is not available here, please leave the delivery fields empty."
+    elif schedule.send_at is not None and schedule.send_at < time.time() - SEND_AT_GRACE_SECONDS:
+        errors["send_at"] = "Please pick a time in the future."
+    elif schedule.local_time and schedule.send_at is None:
+        errors["local_time"] = "Please pick a send time to deliver in each recipient's time zone."
+
+    icon_url = ((values.get("icon_url") or {}).get("icon_url-action") or {}).get("value")
+    if icon_url and not is_valid_url(icon_url.strip()):
+        errors["icon_url"] = INVALID_URL_MESSAGE
+
+    for i in range(1, selected_cta_button_count(values) + 1):
+        button_text = values[f"cta_button_text_{i}"]["plain_text_input-action"].get("value") or ""
+        if len(button_text) > MAX_BUTTON_TEXT_CHARS:
+            errors[f"cta_button_text_{i}"] = f"Button text is limited to {MAX_BUTTON_TEXT_CHARS} characters, this one has {len(button_text)}."
+        button_link = (values[f"cta_button_link_{i}"]["plain_text_input-action"].get("value") or "").strip()
+        if not is_valid_url(button_link):
+            errors[f"cta_button_link_{i}"] = INVALID_URL_MESSAGE
+
+    if errors:
+        logger.info(f"\nSUBMISSION REJECTED: {', '.join(errors)}\n")
+        return errors
+    return None
+
+
+def generate_cta_button_elements(view, number_of_buttons) -> list | None:
+    try:
+        elements = []
+        for i in range(number_of_buttons):
+            button_text = view["state"]["values"][f"cta_button_text_{i+1}"]["plain_text_input-action"]["value"]
+            button_link = view["state"]["values"][f"cta_button_link_{i+1}"]["plain_text_input-action"]["value"].strip()
+            button = {
+                "type": "actions",
+                "block_id": f"button_id_{i+1}",
+                "elements": [
+                    {
+                        "type": "button",
+                        "action_id": f"button_action_{i+1}",
+                        "text": {
+                            "type": "plain_text",
+                            "text": button_text,
+                            "emoji": True
+                        },
+                        "url": button_link
+                    }
+                ]
+            }
+            elements.append(button)
+        logger.info(f"\nHere are the generated CTA elements: {elements}\n")
+        return elements
+    except Exception as e:
+        logger.error(f"Error generating CTA button elements: {e}")
+        return None
+
+
+def customize_sender_identity_state(view) -> dict | None:
+    customize_sender_identity_selected: list = view["state"]["values"]["customize_sender_identity"]["customize_sender_identity-action"].get("selected_options")
+    if customize_sender_identity_selected:
+        try:
+            sender_name_value: str | None = view["state"]["values"].get("sender_name").get("plain_text_input-action").get("value")
+        except Exception:
+            sender_name_value = None
+        try:
+            icon_url_value: str | None = (view["state"]["values"].get("icon_url").get("icon_url-action").get("value") or "").strip() or None
+        except Exception:
+            icon_url_value = None
+        return {"sender_name": sender_name_value, "icon_url": icon_url_value}
+    return None
+
+
+def message_from_submission(view) -> dict:
+    # Everything needed to send the submitted message, except the conversation
+    values = view["state"]["values"]
+    sender_identity = customize_sender_identity_state(view) or {}
+    return {
+        "blocks": [values["rich_text_input"]["rich_text_input-action"]["rich_text_value"]],
+        "sender_name": sender_identity.get("sender_name"),
+        "icon_url": sender_identity.get("icon_url"),
+        "cta_elements": generate_cta_button_elements(view, selected_cta_button_count(values)),
+    }
+
+
+def build_message_payload(conversation_id: str, blocks: list, sender_name: str | None = None, icon_url: str | None = None, cta_elements: list | None = None) -> dict:
+    message_payload = {
+        "channel": conversation_id,
+        "text": NOTIFICATION_TEXT,
+        "blocks": blocks
+    }
+    if sender_name:
+        # Set your bot's user name.
+        message_payload["username"] = sender_name
+    if icon_url:
+        # URL to an image to use as the icon for this message.
+        message_payload["icon_url"] = icon_url
+    if cta_elements:
+        message_payload["blocks"] = [*blocks, *cta_elements]
+    return message_payload
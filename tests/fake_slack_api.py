@@ -0,0 +1,263 @@
+"""Local stand-in for the Slack Web API, for tests and benchmarks.
+
+Point a WebClient at it with base_url=api.url. Every method answers ok=true after the configured
+latency. Methods the app relies on return the fields it reads; the rest return {"ok": true}.
+Faults (429s, Slack errors, slow responses and dropped connections) are injected at per-method rates.
+
+Run it on its own with:
+    python tests/fake_slack_api.py --port 8765 --latency 0.05 --faults "chat.postMessage:rate_limited=0.05"
+"""
+import ssl
+import json
+import time
+import random
+import socket
+import struct
+import argparse
+import itertools
+import threading
+from collections import Counter
+from dataclasses import dataclass, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+
+def _auth_test(args):
+    return {"ok": True, "url": "https://example.slack.com/", "team": "Example", "team_id": "T0FAKE",
+            "user": "comms", "user_id": "U0BOT", "bot_id": "B0BOT"}
+
+
+def _chat_post_message(args, ts=itertools.count(1)):
+    channel = args.get("channel", "")
+    if channel[:1] in ("U", "W"):
+        channel = "D" + channel[1:]
+    return {"ok": True, "channel": channel, "ts": f"1700000000.{next(ts):06d}", "message": {"text": args.get("text")}}
+
+
+def _view(args):
+    view = args.get("view")
+    view = json.loads(view) if isinstance(view, str) else dict(view or {})
+    return {"ok": True, "view": {**view, "id": args.get("view_id") or "V0FAKE", "hash": f"{time.time():.6f}"}}
+
+
+def _conversations_open(args):
+    return {"ok": True, "channel": {"id": "D" + args.get("users", "")[1:]}}
+
+
+def _users_lookup_by_email(args):
+    return {"ok": True, "user": {"id": "U" + args.get("email", "").split("@")[0].upper()}}
+
+
+def _users_info(args):
+    # Users whose ID ends in a digit d are d hours ahead of UTC
+    user_id = args.get("user", "")
+    hours = int(user_id[-1]) if user_id[-1:].isdigit() else 0
+    return {"ok": True, "user": {"id": user_id, "tz": "Etc/GMT", "tz_offset": hours * 3600}}
+
+
+# Slack errors returned with HTTP 200 and ok=false
+ERROR_FAULTS = ("ratelimited", "channel_not_found", "not_in_channel", "hash_conflict")
+
+
+@dataclass
+class FaultRates:
+    """Probability of each fault for one method. At most one of the failures is injected per call,
+    a slow response can come on top of any of them."""
+
+    rate_limited: float = 0.0
+    ratelimited: float = 0.0
+    channel_not_found: float = 0.0
+    not_in_channel: float = 0.0
+    hash_conflict: float = 0.0
+    dropped: float = 0.0
+    slow: float = 0.0
+    # Retry-After header of the 429s, and the extra delay of slow responses
+    retry_after: int = 1
+    slow_seconds: float = 1.0
+
+
+def parse_faults(spec: str) -> dict:
+    # "chat.postMessage:rate_limited=0.05,retry_after=0;*:dropped=0.01" -> {method: FaultRates}, "*" is every method
+    types = {field.name: field.type for field in fields(FaultRates)}
+    faults = {}
+    for part in filter(None, (part.strip() for part in spec.split(";"))):
+        method, settings = part.split(":", 1)
+        rates = {}
+        for setting in filter(None, settings.split(",")):
+            name, value = setting.split("=", 1)
+            rates[name.strip()] = (int if types[name.strip()] is int else float)(value)
+        faults[method.strip()] = FaultRates(**rates)
+    return faults
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 resets connections when a broadcast opens many at once
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # Dropped connections are intentional, do not print their tracebacks
+        pass
+
+
+RESPONSES = {
+    "auth.test": _auth_test,
+    "chat.postMessage": _chat_post_message,
+    "views.open": _view,
+    "views.update": _view,
+    "views.push": _view,
+    "conversations.open": _conversations_open,
+    "users.lookupByEmail": _users_lookup_by_email,
+    "users.info": _users_info,
+    "users.list": lambda args: {"ok": True, "members": [], "response_metadata": {"next_cursor": ""}},
+}
+
+
+class FakeSlackAPI:
+    """Threaded HTTP server answering Web API calls on 127.0.0.1.
+
+    latency is the delay in seconds added to every call, or a dict of per-method delays.
+    faults maps a method, or "*" for every other method, to its FaultRates. seed makes the
+    injected faults reproducible.
+    calls counts the requests received per method, injected the faults per (method, fault).
+    With ssl_context (a server side context holding a certificate) it serves HTTPS, as slack.com does.
+    Connections are kept alive between requests.
+    """
+
+    def __init__(
+        self,
+        latency: float | dict = 0.0,
+        port: int = 0,
+        faults: dict | None = None,
+        seed: int | None = None,
+        ssl_context: ssl.SSLContext | None = None,
+    ):
+        self.latency = latency
+        self.faults = faults or {}
+        self.calls = Counter()
+        self.injected = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", port), self._handler_class())
+        self.scheme = "https" if ssl_context else "http"
+        if ssl_context:
+            # The handshake runs on the first read in the request thread, not in the accept loop
+            self._server.socket = ssl_context.wrap_socket(
+                self._server.socket, server_side=True, do_handshake_on_connect=False
+            )
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        return f"{self.scheme}://127.0.0.1:{self._server.server_port}/api/"
+
+    def delay(self, method: str) -> float:
+        if isinstance(self.latency, dict):
+            return self.latency.get(method, 0.0)
+        return self.latency
+
+    def fault_rates(self, method: str) -> FaultRates | None:
+        return self.faults.get(method) or self.faults.get("*")
+
+    def _roll(self, method: str, rates: FaultRates | None) -> tuple[str | None, bool]:
+        # Picks (failure or None, slow) for one call
+        if rates is None:
+            return None, False
+        with self._lock:
+            roll, slow_roll = self._random.random(), self._random.random()
+        failure = None
+        for name in ("dropped", "rate_limited", *ERROR_FAULTS):
+            roll -= getattr(rates, name)
+            if roll < 0:
+                failure = name
+                break
+        slow = slow_roll < rates.slow
+        with self._lock:
+            self.injected.update((method, name) for name in (failure, "slow" if slow else None) if name)
+        return failure, slow
+
+    def respond(self, method: str, args: dict) -> tuple[int, dict, dict] | None:
+        # Returns (HTTP status, headers, JSON body) for one call, None to drop the connection
+        with self._lock:
+            self.calls[method] += 1
+        rates = self.fault_rates(method)
+        failure, slow = self._roll(method, rates)
+        delay = self.delay(method) + (rates.slow_seconds if slow else 0.0)
+        if delay:
+            time.sleep(delay)
+        if failure == "dropped":
+            return None
+        if failure == "rate_limited":
+            return 429, {"Retry-After": str(rates.retry_after)}, {"ok": False, "error": "ratelimited"}
+        if failure is not None:
+            return 200, {}, {"ok": False, "error": failure}
+        return 200, {}, RESPONSES.get(method, lambda args: {"ok": True})(args)
+
+    def _handler_class(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, without this kept-alive connections wait on delayed ACKs
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                method = self.path.rsplit("/", 1)[-1].split("?", 1)[0]
+                raw = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8")
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    args = json.loads(raw or "{}")
+                else:
+                    args = dict(parse_qsl(raw))
+                response = api.respond(method, args)
+                if response is None:
+                    # Reset the connection without answering, as a dropped or timed out request would
+                    self.close_connection = True
+                    self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+                    return
+                status, headers, body = response
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeSlackAPI":
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), name="fake-slack-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeSlackAPI":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every call")
+    parser.add_argument("--faults", default="", help='e.g. "chat.postMessage:rate_limited=0.05,dropped=0.01"')
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    api = FakeSlackAPI(latency=args.latency, port=args.port, faults=parse_faults(args.faults), seed=args.seed)
+    print(f"Fake Slack Web API listening on {api.url}")
+    api._server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
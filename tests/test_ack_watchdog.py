@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import metrics
+from ack_watchdog import AckWatchdog, acks_early, stack_sample
+from metrics import TimedAck
+
+
+class _Ack:
+    response = None
+
+    def __call__(self, **kwargs):
+        self.response = kwargs
+
+
+def test_watchdog_reports_late_and_missed_acks_only():
+    watchdog = AckWatchdog(warn_after=0.02, deadline=0.05)
+    slow = TimedAck(_Ack(), "view_submission:test_watchdog_slow", time.perf_counter())
+    fast = TimedAck(_Ack(), "view_submission:test_watchdog_fast", time.perf_counter())
+    watchdog.watch(slow)
+    watchdog.watch(fast)
+    fast()
+
+    time.sleep(0.15)
+
+    assert metrics.ack_late.value(request="view_submission:test_watchdog_slow") == 1
+    assert metrics.ack_missed.value(request="view_submission:test_watchdog_slow") == 1
+    assert metrics.ack_late.value(request="view_submission:test_watchdog_fast") == 0
+
+
+def test_stack_sample_shows_busy_threads():
+    stop = threading.Event()
+
+    def busy_listener():
+        while not stop.is_set():
+            sum(range(1000))
+
+    thread = threading.Thread(target=busy_listener)
+    thread.start()
+    try:
+        sample = stack_sample()
+    finally:
+        stop.set()
+        thread.join()
+
+    assert "busy_listener" in sample
+
+
+def test_acks_early_acknowledges_before_running_the_listener():
+    executor = ThreadPoolExecutor(max_workers=1)
+    ran = threading.Event()
+    ack = _Ack()
+
+    @acks_early(executor=executor)
+    def handler(ack, body):
+        assert ack.__name__ == "late_ack"
+        ack(response_action="errors", errors={})
+        ran.set()
+
+    handler(ack=ack, body={})
+
+    assert ack.response == {}
+    assert ran.wait(1)
+    executor.shutdown()
+
+
+def test_acks_early_needs_an_ack_argument():
+    with pytest.raises(TypeError):
+        acks_early(lambda body: None)
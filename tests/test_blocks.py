@@ -0,0 +1,66 @@
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import blocks
+
+
+def test_cached_modal_view_matches_freshly_built_view():
+    for sender_identity_on in (False, True):
+        for call_to_action_on in (False, True):
+            for number_of_cta_buttons in (0, 1, 3):
+                expected = blocks.modal_view(
+                    blocks.modal_blocks(sender_identity_on, call_to_action_on, number_of_cta_buttons if call_to_action_on else 0)
+                )
+                assert blocks.cached_modal_view(sender_identity_on, call_to_action_on, number_of_cta_buttons) == expected
+
+
+def test_cached_modal_view_is_built_once_per_variant():
+    first = blocks.cached_modal_view(True, True, 2)
+
+    assert blocks.cached_modal_view(True, True, 2) is first
+    # CTA buttons are only shown while the CTA checkbox is on
+    assert blocks.cached_modal_view(True, False, 2) is blocks.cached_modal_view(True, False, 0)
+
+
+def test_crafted_cta_button_counts_share_the_clamped_variants():
+    assert blocks.cached_modal_view(False, True, 10_000) is blocks.cached_modal_view(False, True, blocks.MAX_CTA_BUTTONS)
+    assert blocks.cached_modal_view(False, True, -5) is blocks.cached_modal_view(False, True, 0)
+    assert blocks._modal_view_variant.cache_info().currsize <= 4 * (blocks.MAX_CTA_BUTTONS + 1)
+
+
+def test_sender_and_cta_variant_block_order():
+    view_blocks = blocks.cached_modal_view(True, True, 1)["blocks"]
+
+    assert view_blocks == [
+        *blocks.initial_view_blocks,
+        blocks.advanced_options_blocks[0],
+        *blocks.sender_identity_fields,
+        blocks.advanced_options_blocks[1],
+        *blocks.call_to_action_dropdown,
+        *blocks.generate_cta_buttons(1),
+    ]
+
+
+def test_generate_cta_buttons_numbers_every_block():
+    cta_blocks = blocks.generate_cta_buttons(blocks.MAX_CTA_BUTTONS)
+
+    assert len(cta_blocks) == 3 * blocks.MAX_CTA_BUTTONS
+    assert [block["block_id"] for block in cta_blocks[-3:]] == [
+        f"cta_button_header_{blocks.MAX_CTA_BUTTONS}",
+        f"cta_button_text_{blocks.MAX_CTA_BUTTONS}",
+        f"cta_button_link_{blocks.MAX_CTA_BUTTONS}",
+    ]
+    assert cta_blocks[1]["label"]["text"] == "Button Text 1"
+    assert cta_blocks[2]["hint"] == blocks.cta_buttons[2]["hint"]
+    # the template itself is left untouched
+    assert blocks.cta_buttons[0]["text"]["text"] == "CTA Button"
+
+
+def test_dropdown_offers_every_supported_button_count():
+    options = blocks.call_to_action_dropdown[1]["accessory"]["options"]
+
+    assert [option["value"] for option in options] == [str(number) for number in range(1, blocks.MAX_CTA_BUTTONS + 1)]
@@ -0,0 +1,56 @@
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from delivery_report import DeliveryReport, percentile
+
+
+def _row(conversation_id, status="sent", error=None, latency_ms=100.0, retries=0, attempts=1):
+    return {
+        "conversation_id": conversation_id,
+        "status": status,
+        "error": error,
+        "ts": "1.0" if status == "sent" else None,
+        "latency_ms": latency_ms,
+        "retries": retries,
+        "attempts": attempts,
+    }
+
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 101))
+
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile([7], 95) == 7
+    assert percentile([], 50) is None
+
+
+def test_report_totals_errors_and_latency():
+    rows = [
+        _row("C1", latency_ms=100),
+        _row("C2", latency_ms=300, retries=2),
+        _row("C3", status="failed", error="channel_not_found", latency_ms=50),
+        _row("U4", status="failed", error="channel_not_found", latency_ms=60, attempts=2),
+    ]
+
+    report = DeliveryReport.from_rows("campaign-1", rows)
+
+    assert (report.total, report.sent, report.failed) == (4, 2, 2)
+    assert report.errors == {"channel_not_found": 2}
+    assert report.retries == 3
+    assert report.p50_ms == 60
+    assert report.p95_ms == 300
+
+
+def test_report_blocks_list_failures_and_slowest_conversations():
+    rows = [_row("C1", latency_ms=900), _row("U2", status="failed", error="not_in_channel")]
+
+    blocks = DeliveryReport.from_rows("campaign-1", rows).blocks()
+
+    assert [block["block_id"] for block in blocks] == ["delivery_summary", "delivery_failures", "delivery_slowest"]
+    assert "<@U2> `not_in_channel`" in blocks[1]["text"]["text"]
+    assert "<#C1> 900 ms" in blocks[2]["elements"][0]["text"]
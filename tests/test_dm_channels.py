@@ -0,0 +1,64 @@
+import os
+import sys
+from unittest.mock import MagicMock
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import dm_channels
+from dm_channels import DMChannelCache
+
+
+def _client():
+    client = MagicMock()
+    client.conversations_open.side_effect = lambda users: {"ok": True, "channel": {"id": "D" + users[1:]}}
+    return client
+
+
+def test_prefetch_opens_only_uncached_users_and_persists(tmp_path):
+    path = str(tmp_path / "dm.sqlite3")
+    client = _client()
+    cache = DMChannelCache(path)
+
+    assert cache.prefetch(client, ["UADA", "C123", "UBOB", "UADA"]) == 2
+    assert cache.prefetch(client, ["UADA", "UBOB"]) == 0
+    assert client.conversations_open.call_count == 2
+
+    reopened = DMChannelCache(path)
+    assert reopened.resolve("UADA") == "DADA"
+    assert reopened.resolve("C123") == "C123"
+    assert reopened.prefetch(client, ["UBOB"]) == 0
+    assert client.conversations_open.call_count == 2
+
+
+def test_large_prefetch_is_skipped_and_channels_are_learned_from_sends(tmp_path, monkeypatch):
+    monkeypatch.setattr(dm_channels, "DM_PREFETCH_MAX_USERS", 1)
+    client = _client()
+    cache = DMChannelCache(str(tmp_path / "dm.sqlite3"))
+
+    assert cache.prefetch(client, ["UADA", "UBOB"]) == 0
+    client.conversations_open.assert_not_called()
+
+    cache.remember("UADA", "DADA")
+    assert cache.resolve("UADA") == "DADA"
+
+
+def test_channels_are_kept_per_workspace(tmp_path):
+    path = str(tmp_path / "dm.sqlite3")
+    DMChannelCache(path, workspace=":T1").prefetch(_client(), ["UADA"])
+
+    assert DMChannelCache(path, workspace=":T1").resolve("UADA") == "DADA"
+    assert DMChannelCache(path, workspace=":T2").resolve("UADA") == "UADA"
+
+
+def test_remember_many_stores_only_new_channels(tmp_path):
+    path = str(tmp_path / "dm.sqlite3")
+    cache = DMChannelCache(path)
+    cache.remember("UADA", "DADA")
+
+    cache.remember_many({"UADA": "DADA", "UBOB": "DBOB", "UCAT": None})
+
+    reopened = DMChannelCache(path)
+    assert reopened.resolve("UBOB") == "DBOB"
+    assert reopened.resolve("UCAT") == "UCAT"
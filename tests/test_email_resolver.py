@@ -0,0 +1,59 @@
+import os
+import sys
+from unittest.mock import MagicMock
+
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web import SlackResponse
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from email_resolver import EmailCache, EmailResolver, find_emails, parse_emails
+
+
+def _lookup(email):
+    if email.startswith("nobody"):
+        response = SlackResponse(
+            client=None, http_verb="POST", api_url="", req_args={},
+            data={"ok": False, "error": "users_not_found"}, headers={}, status_code=200,
+        )
+        raise SlackApiError("users_not_found", response)
+    return {"ok": True, "user": {"id": "U" + email.split("@")[0].upper()}}
+
+
+def test_parse_emails_splits_dedupes_and_flags_invalid_entries():
+    valid, invalid = parse_emails("ada@example.com, Ada@Example.com\nbob@example.org; not-an-email <cy@example.net>")
+
+    assert valid == ["ada@example.com", "bob@example.org", "cy@example.net"]
+    assert invalid == ["not-an-email"]
+
+
+def test_find_emails_reads_any_csv_layout():
+    text = "name,email\nAda,ada@example.com\nBob,\"bob@example.org\"\n"
+
+    assert find_emails(text) == ["ada@example.com", "bob@example.org"]
+
+
+def test_repeat_resolution_is_served_from_the_cache(tmp_path):
+    client = MagicMock()
+    client.users_lookupByEmail.side_effect = lambda email: _lookup(email)
+    resolver = EmailResolver(EmailCache(str(tmp_path / "cache.sqlite3")))
+    emails = ["ada@example.com", "bob@example.org", "nobody@example.com"]
+
+    first = resolver.resolve(client, emails)
+    second = resolver.resolve(client, emails)
+
+    assert first == second == ({"ada@example.com": "UADA", "bob@example.org": "UBOB"}, {"nobody@example.com": "users_not_found"})
+    assert client.users_lookupByEmail.call_count == 3
+
+
+def test_expired_entries_are_looked_up_again(tmp_path):
+    client = MagicMock()
+    client.users_lookupByEmail.side_effect = lambda email: _lookup(email)
+    resolver = EmailResolver(EmailCache(str(tmp_path / "cache.sqlite3"), ttl=-1))
+
+    resolver.resolve(client, ["ada@example.com"])
+    resolver.resolve(client, ["ada@example.com"])
+
+    assert client.users_lookupByEmail.call_count == 2
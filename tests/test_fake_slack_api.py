@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+from slack_sdk.errors import SlackApiError
+
+from rate_limiter import RateLimitedWebClient, RateLimiter
+from tests.fake_slack_api import FakeSlackAPI, FaultRates, parse_faults
+
+
+def test_web_client_talks_to_the_fake_api():
+    with FakeSlackAPI(latency={"views.update": 0.05}) as api:
+        client = RateLimitedWebClient(token="xoxb-test", base_url=api.url, rate_limiter=RateLimiter({}))
+
+        posted = client.chat_postMessage(channel="U123", text="hi")
+        started = time.perf_counter()
+        updated = client.views_update(view_id="V1", view={"type": "modal", "blocks": []})
+
+        assert posted["channel"] == "D123" and posted["ts"]
+        assert updated["view"]["id"] == "V1" and updated["view"]["hash"]
+        assert time.perf_counter() - started >= 0.05
+        assert api.calls == {"chat.postMessage": 1, "views.update": 1}
+
+
+def test_parse_faults():
+    assert parse_faults("chat.postMessage:rate_limited=0.05,retry_after=0; *:dropped=0.01") == {
+        "chat.postMessage": FaultRates(rate_limited=0.05, retry_after=0),
+        "*": FaultRates(dropped=0.01),
+    }
+
+
+def test_injected_faults_reach_the_client(fake_slack_api, fake_slack_client):
+    fake_slack_api.faults = {"views.update": FaultRates(hash_conflict=1.0), "*": FaultRates(channel_not_found=1.0)}
+
+    with pytest.raises(SlackApiError) as conflict:
+        fake_slack_client.views_update(view_id="V1", hash="1", view={"type": "modal", "blocks": []})
+    with pytest.raises(SlackApiError) as not_found:
+        fake_slack_client.chat_postMessage(channel="C1", text="hi")
+
+    assert conflict.value.response["error"] == "hash_conflict"
+    assert not_found.value.response["error"] == "channel_not_found"
+    assert fake_slack_api.injected == {("views.update", "hash_conflict"): 1, ("chat.postMessage", "channel_not_found"): 1}
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from fanout import async_fan_out, fan_out
+
+
+def test_results_keep_input_order():
+    def send(conversation_id):
+        # later conversations finish first
+        time.sleep(0.01 * (5 - int(conversation_id[1:])))
+        return f"ts-{conversation_id}"
+
+    conversations = [f"C{i}" for i in range(5)]
+    results = fan_out(send, conversations, max_workers=5)
+
+    assert [result.item for result in results] == conversations
+    assert [result.value for result in results] == [f"ts-C{i}" for i in range(5)]
+    assert all(result.ok for result in results)
+
+
+def test_failure_is_recorded_without_stopping_other_sends():
+    def send(conversation_id):
+        if conversation_id == "C2":
+            raise RuntimeError("channel_not_found")
+        return conversation_id
+
+    results = fan_out(send, ["C1", "C2", "C3"], max_workers=2)
+
+    assert [result.ok for result in results] == [True, False, True]
+    assert str(results[1].error) == "channel_not_found"
+
+
+def test_concurrency_is_bounded_by_max_workers():
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+
+    def send(conversation_id):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.02)
+        with lock:
+            in_flight -= 1
+
+    fan_out(send, [f"C{i}" for i in range(20)], max_workers=4)
+
+    assert 1 < peak <= 4
+
+
+def test_empty_selection_returns_no_results():
+    assert fan_out(lambda conversation_id: conversation_id, []) == []
+
+
+def test_async_fan_out_keeps_order_and_records_failures():
+    async def send(conversation_id):
+        await asyncio.sleep(0.01 * (3 - int(conversation_id[1:])))
+        if conversation_id == "C1":
+            raise RuntimeError("not_in_channel")
+        return conversation_id
+
+    results = asyncio.run(async_fan_out(send, ["C0", "C1", "C2"], max_concurrency=3))
+
+    assert [result.item for result in results] == ["C0", "C1", "C2"]
+    assert [result.ok for result in results] == [True, False, True]
@@ -0,0 +1,79 @@
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from delivery_report import DeliveryReport
+from outbox import FAILED, SENT, Outbox, OutboxWorker
+from submission import build_message_payload
+from tests.fake_slack_api import FaultRates
+from view_updates import ViewUpdateCoalescer
+
+MESSAGE = {"blocks": [{"type": "rich_text", "elements": []}], "sender_name": None, "icon_url": None, "cta_elements": None}
+
+
+def test_broadcast_retries_429s_and_reports_slack_errors(tmp_path, fake_slack_api, fake_slack_client):
+    fake_slack_api.faults = {
+        "chat.postMessage": FaultRates(rate_limited=0.2, retry_after=0, channel_not_found=0.05, not_in_channel=0.05, slow=0.05, slow_seconds=0.01)
+    }
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    conversations = [f"C{i:04d}" for i in range(200)]
+    outbox.enqueue("campaign-1", conversations, MESSAGE)
+
+    def send(conversation_id, message):
+        return fake_slack_client.chat_postMessage(**build_message_payload(conversation_id, **message))
+
+    worker = OutboxWorker(outbox, send, max_workers=8)
+    while worker.drain_once():
+        pass
+
+    rows = outbox.rows("campaign-1")
+    report = DeliveryReport.from_rows("campaign-1", rows)
+    injected = fake_slack_api.injected
+    assert injected[("chat.postMessage", "rate_limited")] > 0
+    # Every 429 was retried, only the Slack errors are left as failures
+    assert report.retries == injected[("chat.postMessage", "rate_limited")]
+    assert report.errors == {
+        "channel_not_found": injected[("chat.postMessage", "channel_not_found")],
+        "not_in_channel": injected[("chat.postMessage", "not_in_channel")],
+    }
+    assert report.sent + report.failed == len(conversations)
+    assert {row["status"] for row in rows} <= {SENT, FAILED}
+
+
+def test_dropped_connections_are_retried_by_the_client(fake_slack_api, fake_slack_client):
+    fake_slack_api.faults = {"*": FaultRates(dropped=0.3)}
+    sent = 0
+    for i in range(30):
+        try:
+            fake_slack_client.chat_postMessage(channel=f"C{i}", text="hi")
+            sent += 1
+        except Exception:
+            # Dropped twice in a row, the built-in retry handler only retries once
+            pass
+
+    dropped = fake_slack_api.injected[("chat.postMessage", "dropped")]
+    assert dropped > 0
+    # A call is given up after its retry was dropped too
+    assert sent >= 30 - dropped // 2
+    assert fake_slack_api.calls["chat.postMessage"] == sent + dropped
+
+
+def test_modal_updates_recover_from_hash_conflicts(fake_slack_api, fake_slack_client):
+    fake_slack_api.faults = {"views.update": FaultRates(hash_conflict=0.5)}
+    coalescer = ViewUpdateCoalescer(fake_slack_client)
+    updated = 0
+    for i in range(20):
+        try:
+            coalescer.update(f"V{i}", "1700000000.0", {"type": "modal", "blocks": []})
+            updated += 1
+        except Exception:
+            pass
+
+    conflicts = fake_slack_api.injected[("views.update", "hash_conflict")]
+    assert conflicts > 0
+    # Conflicts are re-sent, so only views that conflicted on every attempt are lost
+    assert updated >= 20 - conflicts // 4
+    assert fake_slack_api.calls["views.update"] == 20 + conflicts - (20 - updated)
@@ -0,0 +1,99 @@
+import os
+import sys
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+from slack_sdk.errors import SlackApiError
+
+from http_pool import PooledWebClient, _is_dropped
+from metrics import http_connections
+from tests.fake_slack_api import FaultRates
+
+
+def connections() -> tuple:
+    return http_connections.value(host="127.0.0.1", state="new"), http_connections.value(host="127.0.0.1", state="reused")
+
+
+def test_calls_share_one_keep_alive_connection(fake_slack_api):
+    client = PooledWebClient(token="xoxb-test", base_url=fake_slack_api.url)
+    new, reused = connections()
+
+    for i in range(5):
+        assert client.chat_postMessage(channel=f"U{i}", text="hi")["channel"] == f"D{i}"
+
+    assert connections() == (new + 1, reused + 4)
+    assert fake_slack_api.calls["chat.postMessage"] == 5
+
+
+def test_concurrent_calls_open_at_most_one_connection_per_thread(fake_slack_api):
+    client = PooledWebClient(token="xoxb-test", base_url=fake_slack_api.url, pool_size=4)
+    new, _ = connections()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        responses = list(executor.map(lambda i: client.chat_postMessage(channel=f"C{i}", text="hi"), range(100)))
+
+    assert all(response["ok"] for response in responses)
+    assert connections()[0] - new <= 4
+    assert len(client.pool._idle[("http", "127.0.0.1", fake_slack_api._server.server_port)]) <= 4
+
+
+def test_idle_connections_expire(fake_slack_api):
+    client = PooledWebClient(token="xoxb-test", base_url=fake_slack_api.url, pool_idle_timeout=0)
+    new, reused = connections()
+
+    client.auth_test()
+    client.auth_test()
+
+    assert connections() == (new + 2, reused)
+
+
+def test_http_errors_reach_the_sdk_as_with_urllib(fake_slack_api):
+    fake_slack_api.faults = {"chat.postMessage": FaultRates(rate_limited=1.0, retry_after=7)}
+    client = PooledWebClient(token="xoxb-test", base_url=fake_slack_api.url, retry_handlers=[])
+
+    with pytest.raises(SlackApiError) as error:
+        client.chat_postMessage(channel="C1", text="hi")
+
+    assert error.value.response.status_code == 429
+    assert error.value.response.headers["Retry-After"] == "7"
+    assert error.value.response["error"] == "ratelimited"
+
+
+def test_closed_connections_are_detected():
+    class Connection:
+        sock = None
+
+    connection = Connection()
+    assert _is_dropped(connection)
+
+    connection.sock, server_side = socket.socketpair()
+    assert not _is_dropped(connection)
+    server_side.close()
+    assert _is_dropped(connection)
+    connection.sock.close()
+
+
+def test_forked_child_opens_its_own_connections(fake_slack_api):
+    client = PooledWebClient(token="xoxb-test", base_url=fake_slack_api.url)
+    client.auth_test()
+
+    pid = os.fork()
+    if pid == 0:
+        # The parent's idle socket is left alone, the child's call opens a new one
+        try:
+            idle = sum(len(connections) for connections in client.pool._idle.values())
+            client.auth_test()
+            os._exit(0 if idle == 0 else 1)
+        except BaseException:
+            os._exit(2)
+    _, status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    new, reused = connections()
+    client.auth_test()
+    assert connections() == (new, reused + 1)
@@ -0,0 +1,118 @@
+import os
+import sys
+import threading
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from listener_lanes import DEFER, SHED, Lane, ListenerLanes
+from metrics import lane_overflow, lane_queue_depth, lane_wait
+
+CLICK = {"type": "block_actions", "actions": [{"action_id": "call_to_action-action"}]}
+SUBMISSION = {"type": "view_submission", "view": {"callback_id": "initial_view"}}
+
+
+class FakeAck:
+    def __init__(self):
+        self.response = None
+
+    def __call__(self, **kwargs):
+        self.response = kwargs
+        return kwargs
+
+
+class FakeContext:
+    def __init__(self):
+        self.ack = FakeAck()
+
+
+def _dispatch(lanes: ListenerLanes, body: dict, listener):
+    # What Bolt does: the global middleware, then the listener handed to the listener_executor
+    context, called_next = FakeContext(), []
+    response = lanes.route(context, body, lambda: called_next.append(True))
+    future = lanes.submit(listener) if called_next else None
+    return context, response, future
+
+
+def _lanes(interactive_queue=4, submission_queue=0):
+    return ListenerLanes(
+        [
+            Lane("test-interactive", 1, interactive_queue, overflow=DEFER),
+            Lane("test-submissions", 1, submission_queue, overflow=SHED),
+        ],
+        routes={"view_submission": "test-submissions"},
+        on_shed=lambda ack, body: ack(response_action="errors", errors={"conversation_select_block": "busy"}),
+    )
+
+
+def test_requests_run_in_the_lane_of_their_route():
+    lanes = _lanes()
+
+    _, _, click = _dispatch(lanes, CLICK, lambda: threading.current_thread().name)
+    _, _, submission = _dispatch(lanes, SUBMISSION, lambda: threading.current_thread().name)
+
+    assert click.result(timeout=5).startswith("lane-test-interactive")
+    assert submission.result(timeout=5).startswith("lane-test-submissions")
+    assert lane_wait.count(lane="test-interactive") >= 1
+    lanes.shutdown()
+
+
+def test_full_submission_lane_sheds_while_clicks_keep_running():
+    lanes = _lanes()
+    release = threading.Event()
+    shed_before = lane_overflow.value(lane="test-submissions", action=SHED)
+
+    _, _, slow = _dispatch(lanes, SUBMISSION, lambda: release.wait(timeout=5))
+    # Full while its one thread is busy, whether or not the listener started
+    context, response, rejected = _dispatch(lanes, SUBMISSION, lambda: None)
+    _, _, click = _dispatch(lanes, CLICK, lambda: "clicked")
+
+    # The second submission is answered right away with the error instead of waiting
+    assert rejected is None
+    assert response == {"response_action": "errors", "errors": {"conversation_select_block": "busy"}}
+    assert lane_overflow.value(lane="test-submissions", action=SHED) == shed_before + 1
+    assert click.result(timeout=5) == "clicked"
+    release.set()
+    assert slow.result(timeout=5) is True
+    lanes.shutdown()
+
+
+def test_full_interactive_lane_defers_to_the_dispatching_thread():
+    lanes = _lanes(interactive_queue=1)
+    started, release = threading.Event(), threading.Event()
+
+    _, _, running = _dispatch(lanes, CLICK, lambda: started.set() or release.wait(timeout=5))
+    assert started.wait(timeout=5)
+    _, _, waiting = _dispatch(lanes, CLICK, lambda: threading.current_thread().name)
+    assert lane_queue_depth.value(lane="test-interactive") == 1
+    _, _, deferred = _dispatch(lanes, CLICK, lambda: threading.current_thread().name)
+
+    assert deferred.result(timeout=0) == threading.current_thread().name
+    release.set()
+    assert waiting.result(timeout=5).startswith("lane-test-interactive")
+    assert running.result(timeout=5) is True
+    assert lane_queue_depth.value(lane="test-interactive") == 0
+    lanes.shutdown()
+
+
+def test_work_lane_sheds_submissions_while_their_listeners_run_in_the_first_lane():
+    work = Lane("test-work", 1, 0, overflow=SHED, runs_listeners=False)
+    lanes = ListenerLanes(
+        [Lane("test-listeners", 1, 4, overflow=DEFER), work],
+        routes={"view_submission": "test-work"},
+        on_shed=lambda ack, body: ack(response_action="errors", errors={"conversation_select_block": "busy"}),
+    )
+    release = threading.Event()
+
+    _, _, submission = _dispatch(lanes, SUBMISSION, lambda: threading.current_thread().name)
+    assert submission.result(timeout=5).startswith("lane-test-listeners")
+
+    # A broadcast being resolved fills the work lane
+    resolving = work.submit(release.wait, 5)
+    _, response, rejected = _dispatch(lanes, SUBMISSION, lambda: None)
+    assert rejected is None
+    assert response == {"response_action": "errors", "errors": {"conversation_select_block": "busy"}}
+    release.set()
+    assert resolving.result(timeout=5) is True
+    lanes.shutdown()
@@ -0,0 +1,65 @@
+import os
+import sys
+import queue
+import logging
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import log_pipeline
+from log_pipeline import DeferredQueueHandler, EventSampler, LogEvent, RedactingFormatter, log_event, redact
+
+
+BODY = {
+    "type": "block_actions",
+    "user": {"id": "U123"},
+    "team": {"id": "T1"},
+    "view": {"id": "V1", "callback_id": "initial_view", "state": {"values": {}}},
+    "actions": [{"action_id": "call_to_action-action"}],
+    "token": "xoxb-1234-abcd",
+}
+
+
+def test_redact_strips_tokens_and_url_paths():
+    text = redact("token=xoxb-1234-abcd link https://files.slack.com/files-pri/T1-F1/list.csv?t=xoxe-9 app xapp-1-A1")
+
+    assert text == "token=xoxb-*** link https://files.slack.com/… app xapp-***"
+
+
+def test_log_event_renders_a_summary_and_skips_the_body_above_debug():
+    records = queue.SimpleQueue()
+    logger = logging.getLogger("test_log_pipeline.summary")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(DeferredQueueHandler(records))
+
+    log_event(logger, "block_actions", BODY, cta=True)
+    log_event(logger, "message_payload", level=logging.DEBUG, payload={"channel": "C1"})
+
+    record = records.get_nowait()
+    assert records.empty()
+    # Queued unformatted, the listener thread renders it
+    assert isinstance(record.msg, LogEvent)
+    assert RedactingFormatter("%(message)s").format(record) == (
+        "block_actions type=block_actions user=U123 team=T1 callback_id=initial_view view_id=V1 "
+        "actions=call_to_action-action cta=true"
+    )
+
+
+def test_debug_level_attaches_the_truncated_redacted_body(monkeypatch):
+    monkeypatch.setattr(log_pipeline, "LOG_MAX_FIELD_CHARS", 40)
+    message = str(LogEvent("view_submission", None, {"body": BODY}))
+
+    assert message.startswith("view_submission body=")
+    assert message.endswith("…")
+    assert len(message) == len("view_submission body=") + 41
+
+
+def test_sampler_keeps_events_at_their_rate():
+    draws = iter([0.05, 0.5, 0.05])
+    sampler = EventSampler({"block_actions": 0.1, "muted": 0}, rng=lambda: next(draws))
+
+    assert [sampler.sampled("block_actions"), sampler.sampled("block_actions")] == [True, False]
+    assert sampler.sampled("muted") is False
+    assert sampler.sampled("view_submission") is True
@@ -0,0 +1,50 @@
+import os
+import sys
+import json
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+from slack_sdk.http_retry.builtin_handlers import ConnectionErrorRetryHandler
+from slack_sdk.http_retry.builtin_interval_calculators import FixedValueRetryIntervalCalculator
+
+import message_encoding
+from http_pool import PooledWebClient
+from message_encoding import PreparedMessage
+from submission import build_message_payload
+from tests.fake_slack_api import FaultRates
+
+MESSAGE = {
+    "blocks": [{"type": "rich_text", "elements": [{"type": "rich_text_section", "elements": [{"type": "text", "text": "Grüße 👋"}]}]}],
+    "sender_name": "Comms",
+    "icon_url": "https://example.com/icon.png",
+    "cta_elements": [{"type": "actions", "block_id": "button_id_1", "elements": []}],
+}
+
+
+@pytest.mark.parametrize("encoder", ["orjson", "json"])
+def test_prepared_body_equals_the_per_send_payload(monkeypatch, encoder):
+    if encoder == "json":
+        monkeypatch.setattr(message_encoding, "orjson", None)
+    elif message_encoding.orjson is None:
+        pytest.skip("orjson is not installed")
+    prepared = PreparedMessage(MESSAGE)
+
+    for channel in ("C1", "D\"odd\""):
+        assert json.loads(prepared.for_channel(channel).body) == build_message_payload(channel, **MESSAGE)
+
+
+@pytest.mark.parametrize("pool_size", [16, 0])
+def test_encoded_bodies_are_sent_as_is_and_retried(fake_slack_api, pool_size):
+    fake_slack_api.faults = {"chat.postMessage": FaultRates(dropped=0.5)}
+    retries = ConnectionErrorRetryHandler(max_retry_count=10, interval_calculator=FixedValueRetryIntervalCalculator(0))
+    client = PooledWebClient(token="xoxb-test", base_url=fake_slack_api.url, pool_size=pool_size, retry_handlers=[retries])
+    prepared = PreparedMessage(MESSAGE)
+
+    responses = [client.api_call("chat.postMessage", json=prepared.for_channel(f"U{i}")) for i in range(5)]
+
+    assert [response["channel"] for response in responses] == [f"D{i}" for i in range(5)]
+    assert responses[0]["message"]["text"] == "Message from Slack Communications App"
+    assert fake_slack_api.injected[("chat.postMessage", "dropped")] > 0
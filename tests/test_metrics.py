@@ -0,0 +1,91 @@
+import os
+import sys
+import inspect
+import urllib.request
+
+import pytest
+from slack_sdk.errors import SlackApiError
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import metrics
+from metrics import Registry, TimedAck, instrumented, start_metrics_server
+from tests.fake_slack_api import FaultRates
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.histogram("duration_seconds", "Duration.", ("handler",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, handler="open_modal")
+
+    assert registry.render().splitlines() == [
+        "# HELP duration_seconds Duration.",
+        "# TYPE duration_seconds histogram",
+        'duration_seconds_bucket{handler="open_modal",le="0.1"} 2',
+        'duration_seconds_bucket{handler="open_modal",le="1.0"} 3',
+        'duration_seconds_bucket{handler="open_modal",le="+Inf"} 4',
+        'duration_seconds_sum{handler="open_modal"} 3.65',
+        'duration_seconds_count{handler="open_modal"} 4',
+    ]
+
+
+def test_instrumented_keeps_bolt_argument_injection_and_counts_errors():
+    def handle_submission(ack, body, client, logger, view):
+        raise ValueError("boom")
+
+    wrapped = instrumented(handle_submission)
+    # Bolt picks the arguments to pass from the unwrapped signature
+    assert inspect.getfullargspec(inspect.unwrap(wrapped)).args == ["ack", "body", "client", "logger", "view"]
+
+    errors_before = metrics.handler_errors.value(handler="handle_submission")
+    with pytest.raises(ValueError):
+        wrapped(ack=None, body={}, client=None, logger=None, view={})
+
+    assert metrics.handler_errors.value(handler="handle_submission") == errors_before + 1
+    assert metrics.handler_duration.count(handler="handle_submission") >= 1
+
+
+def test_timed_ack_records_the_first_ack_and_passes_the_response_through():
+    class Ack:
+        response = None
+
+        def __call__(self, **kwargs):
+            self.response = kwargs
+
+    ack = TimedAck(Ack(), "view_submission:test_timed_ack", 0.0)
+    ack(response_action="errors")
+    ack()
+
+    assert ack.response == {}
+    assert metrics.ack_duration.count(request="view_submission:test_timed_ack") == 1
+
+
+def test_api_calls_rate_limits_and_errors_are_counted(fake_slack_api, fake_slack_client):
+    fake_slack_api.faults = {"views.push": FaultRates(rate_limited=1.0, retry_after=0)}
+    fake_slack_client.max_rate_limited_retries = 1
+    calls_before = metrics.api_calls.value(method="views.push", status="error")
+    limited_before = metrics.api_rate_limited.value(method="views.push")
+
+    with pytest.raises(SlackApiError):
+        fake_slack_client.views_push(trigger_id="1", view={"type": "modal", "blocks": []})
+
+    assert metrics.api_calls.value(method="views.push", status="error") == calls_before + 2
+    assert metrics.api_rate_limited.value(method="views.push") == limited_before + 2
+
+
+def test_metrics_endpoint_serves_the_registry():
+    metrics.api_calls.inc(method="auth.test", status="ok")
+    server = start_metrics_server(port=0)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/metrics") as response:
+            content_type = response.headers["Content-Type"]
+            text = response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+
+    assert content_type.startswith("text/plain; version=0.0.4")
+    assert 'slack_api_calls_total{method="auth.test",status="ok"}' in text
+    assert "# TYPE slack_handler_duration_seconds histogram" in text
@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from oauth_state import SQLiteOAuthStateStore
+
+
+def test_state_is_consumed_once(tmp_path):
+    store = SQLiteOAuthStateStore(str(tmp_path / "comms.sqlite3"), sweep_interval=0)
+    state = store.issue()
+
+    assert store.consume(state) is True
+    assert store.consume(state) is False
+    assert store.consume("never-issued") is False
+    assert len(store) == 0
+
+
+def test_expired_state_is_rejected_and_swept(tmp_path):
+    store = SQLiteOAuthStateStore(str(tmp_path / "comms.sqlite3"), expiration_seconds=600, sweep_interval=0)
+    expired, live = store.issue(), store.issue()
+
+    assert store.sweep(now=time.time() + 60) == 0
+    assert store.sweep(now=time.time() + 601) == 2
+    assert store.consume(expired) is False
+
+    store.expiration_seconds = -1
+    assert store.consume(store.issue()) is False
+    assert store.consume(live) is False
+
+
+def test_processes_share_states_through_the_database_file(tmp_path):
+    # Two stores on one file stand in for two HTTP worker processes
+    path = str(tmp_path / "comms.sqlite3")
+    install_worker = SQLiteOAuthStateStore(path, sweep_interval=0)
+    redirect_worker = SQLiteOAuthStateStore(path, sweep_interval=0)
+    states = [install_worker.issue() for _ in range(20)]
+
+    # Every state is won by exactly one of the racing consumers
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(
+            lambda i: (install_worker if i % 2 else redirect_worker).consume(states[i // 2]), range(40)
+        ))
+
+    assert sum(results) == 20
+
+
+def test_background_sweep_deletes_abandoned_states():
+    store = SQLiteOAuthStateStore(":memory:", expiration_seconds=0, sweep_interval=0.01)
+    store.issue()
+
+    deadline = time.monotonic() + 5
+    while len(store) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    store.close()
+
+    assert len(store) == 0
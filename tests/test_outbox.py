@@ -0,0 +1,268 @@
+import os
+import sys
+import time
+import threading
+
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web import SlackResponse
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from outbox import FAILED, PENDING, SENT, Outbox, OutboxLeader, OutboxWorker
+
+MESSAGE = {"blocks": [{"type": "rich_text", "elements": []}], "sender_name": None, "icon_url": None, "cta_elements": None}
+
+
+def _channel_not_found():
+    response = SlackResponse(
+        client=None, http_verb="POST", api_url="", req_args={},
+        data={"ok": False, "error": "channel_not_found"}, headers={}, status_code=200,
+    )
+    return SlackApiError("channel_not_found", response)
+
+
+def test_enqueue_writes_one_row_per_conversation(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+
+    queued = outbox.enqueue("campaign-1", ["C1", "C2", "C2"], MESSAGE, user_id="U1")
+
+    assert queued == 2
+    assert [row["conversation_id"] for row in outbox.rows("campaign-1")] == ["C1", "C2"]
+    assert all(row["status"] == PENDING for row in outbox.rows("campaign-1"))
+
+
+def test_replayed_campaign_only_queues_conversations_it_missed(tmp_path):
+    path = str(tmp_path / "outbox.sqlite3")
+    outbox = Outbox(path)
+    outbox.enqueue("V1:h1", ["C1", "C2"], MESSAGE, user_id="U1", failed={"a@example.com": "users_not_found"})
+    row_id = outbox.claim(1)[0].id
+    outbox.mark_sent(row_id, "1.0")
+
+    assert outbox.enqueue("V1:h1", ["C1", "C2"], MESSAGE, user_id="U1", failed={"a@example.com": "users_not_found"}) == 0
+    assert outbox.enqueue("V1:h1", ["C2", "C3"], MESSAGE, user_id="U1") == 1
+    # A new process reads the queued conversations back from SQLite
+    assert Outbox(path, index_campaigns=0).enqueue("V1:h1", ["C1", "C3", "C4"], MESSAGE) == 1
+
+    rows = outbox.rows("V1:h1")
+    assert [row["conversation_id"] for row in rows] == ["C1", "C2", "a@example.com", "C3", "C4"]
+    assert rows[0]["status"] == SENT
+
+
+def test_submitted_campaign_is_resolved_after_a_restart(tmp_path):
+    path = str(tmp_path / "outbox.sqlite3")
+    outbox = Outbox(path)
+    assert outbox.submit("V1:h1", MESSAGE, "U1", {"conversation_ids": ["C1", "C2"]}, team=("", "T1")) is True
+    assert outbox.submit("V1:h1", MESSAGE, "U1", {"conversation_ids": ["C1", "C2"]}) is False
+    # The process dies before the recipients were resolved
+
+    restarted = Outbox(path)
+    resolved, sent, reports = [], [], []
+
+    def resolve(campaign_id):
+        resolved.append(campaign_id)
+        restarted.enqueue(campaign_id, restarted.submitted_recipients(campaign_id)["conversation_ids"], restarted.message(campaign_id))
+
+    worker = OutboxWorker(
+        restarted, lambda conversation_id, message: sent.append(conversation_id) or {"ts": "1.0"}, resolve=resolve,
+        on_campaign_done=lambda *args: reports.append(args),
+    )
+    worker.drain_once()
+    worker.drain_once()
+
+    assert resolved == ["V1:h1"]
+    assert sorted(sent) == ["C1", "C2"]
+    assert restarted.submitted_recipients("V1:h1") is None
+    assert restarted.campaign_team("V1:h1") == ("", "T1")
+    assert [report[:2] for report in reports] == [("V1:h1", "U1")]
+
+
+def test_failed_resolution_is_retried_after_a_delay(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    outbox.submit("V1:h1", MESSAGE, "U1", {"conversation_ids": ["C1"]})
+    attempts = []
+
+    def resolve(campaign_id):
+        attempts.append(campaign_id)
+        if len(attempts) == 1:
+            raise ConnectionResetError()
+        outbox.enqueue(campaign_id, ["C1"], outbox.message(campaign_id))
+
+    worker = OutboxWorker(outbox, lambda conversation_id, message: {"ts": "1.0"}, resolve=resolve, resolve_retry_seconds=0.2)
+    worker.drain_once()
+    worker.drain_once()
+    assert attempts == ["V1:h1"]
+    assert outbox.submitted_recipients("V1:h1") is not None
+    assert worker._idle_timeout() <= 0.2
+
+    time.sleep(0.2)
+    worker.drain_once()
+    assert attempts == ["V1:h1", "V1:h1"]
+    assert outbox.submitted_recipients("V1:h1") is None
+
+
+def test_unresolved_campaigns_are_not_finished_and_abandoned_ones_are_not_resolved(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    outbox.submit("V1:h1", MESSAGE, "U1", {"conversation_ids": ["C1"]})
+
+    assert outbox.finish_campaign("V1:h1") is False
+    outbox.abandon("V1:h1")
+    assert outbox.unresolved_campaigns() == []
+    assert outbox.unfinished_campaigns() == []
+
+
+def test_worker_marks_rows_sent_or_failed(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    outbox.enqueue("campaign-1", ["C1", "C2"], MESSAGE)
+
+    def send(conversation_id, message):
+        assert message == MESSAGE
+        if conversation_id == "C2":
+            raise _channel_not_found()
+        return {"ok": True, "ts": "111.222"}
+
+    OutboxWorker(outbox, send, max_workers=2).drain_once()
+
+    rows = {row["conversation_id"]: row for row in outbox.rows("campaign-1")}
+    assert (rows["C1"]["status"], rows["C1"]["ts"]) == (SENT, "111.222")
+    assert (rows["C2"]["status"], rows["C2"]["error"]) == (FAILED, "channel_not_found")
+    assert outbox.pending_count() == 0
+
+
+def test_unfinished_rows_are_picked_up_after_a_restart(tmp_path):
+    path = str(tmp_path / "outbox.sqlite3")
+    crashed = Outbox(path)
+    crashed.enqueue("campaign-1", ["C1", "C2"], MESSAGE)
+    crashed.claim(limit=10)  # process dies while both sends are in flight
+
+    restarted = Outbox(path)
+    assert restarted.recover() == 2
+
+    sent = []
+    OutboxWorker(restarted, lambda conversation_id, message: sent.append(conversation_id) or {"ts": "1.0"}).drain_once()
+
+    assert sorted(sent) == ["C1", "C2"]
+    assert {row["status"] for row in restarted.rows("campaign-1")} == {SENT}
+
+
+def test_background_worker_drains_after_notify(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    done = threading.Event()
+
+    def send(conversation_id, message):
+        done.set()
+        return {"ts": "1.0"}
+
+    worker = OutboxWorker(outbox, send)
+    worker.start()
+    try:
+        outbox.enqueue("campaign-1", ["C1"], MESSAGE)
+        worker.notify()
+        assert done.wait(timeout=5)
+    finally:
+        worker.stop(timeout=5)
+
+
+def test_campaign_done_is_reported_once_with_per_row_outcomes(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    outbox.enqueue("campaign-1", ["C1", "C2"], MESSAGE, user_id="U1")
+    reports = []
+
+    def send(conversation_id, message):
+        if conversation_id == "C2":
+            raise _channel_not_found()
+        return {"ok": True, "ts": "111.222"}
+
+    worker = OutboxWorker(outbox, send, on_campaign_done=lambda *args: reports.append(args))
+    worker.drain_once()
+    worker.drain_once()
+
+    assert len(reports) == 1
+    campaign_id, user_id, rows = reports[0]
+    assert (campaign_id, user_id) == ("campaign-1", "U1")
+    assert [(row["conversation_id"], row["status"], row["error"]) for row in rows] == [
+        ("C1", SENT, None),
+        ("C2", FAILED, "channel_not_found"),
+    ]
+    assert all(row["latency_ms"] is not None for row in rows)
+    assert "campaign-1" not in outbox._messages
+
+
+def test_scheduled_rows_wait_for_their_time(tmp_path):
+    path = str(tmp_path / "outbox.sqlite3")
+    outbox = Outbox(path)
+    later = time.time() + 3600
+    outbox.enqueue("campaign-1", ["C1", "C2"], MESSAGE, not_before={"C2": later})
+    sent = []
+    worker = OutboxWorker(outbox, lambda conversation_id, message: sent.append(conversation_id) or {"ts": "1.0"})
+
+    worker.drain_once()
+    worker.drain_once()
+
+    assert sent == ["C1"]
+    assert outbox.unfinished_campaigns() == ["campaign-1"]
+    # The send time survives a restart and the worker sleeps until it
+    assert Outbox(path).release_times(time.time()) == [later]
+    worker.schedule([later])
+    assert 4 < worker._idle_timeout() <= 5
+    worker.schedule([time.time() + 1])
+    assert worker._idle_timeout() <= 1
+
+
+def test_scheduled_rows_are_released_by_the_background_worker(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    done = threading.Event()
+    worker = OutboxWorker(outbox, lambda conversation_id, message: done.set() or {"ts": "1.0"})
+    worker.start()
+    try:
+        due = time.time() + 0.3
+        outbox.enqueue("campaign-1", ["C1"], MESSAGE, not_before={"C1": due})
+        worker.schedule([due])
+        assert done.wait(timeout=3)
+        assert time.time() >= due
+    finally:
+        worker.stop(timeout=5)
+
+
+def test_messages_are_prepared_once_per_campaign(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    outbox.enqueue("campaign-1", ["C1", "C2", "C3"], MESSAGE)
+    prepared = []
+
+    def prepare(campaign_id, message):
+        prepared.append((campaign_id, message))
+        return ("prepared", len(prepared))
+
+    sent = []
+    worker = OutboxWorker(outbox, lambda conversation_id, message: sent.append(message) or {"ts": "1.0"}, max_workers=1, prepare=prepare)
+    worker.drain_once()
+    worker.drain_once()
+
+    assert prepared == [("campaign-1", MESSAGE)]
+    assert sent == [("prepared", 1)] * 3
+    # Dropped once the campaign is done
+    assert worker._prepared == {}
+
+
+def test_one_process_at_a_time_runs_the_worker(tmp_path):
+    # Each leader stands in for a web server worker process, flock() locks conflict between them too
+    lock_path = str(tmp_path / "outbox.lock")
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    first = OutboxLeader(OutboxWorker(outbox, lambda conversation_id, message: {"ok": True}), lock_path, retry_interval=0.01)
+    second = OutboxLeader(OutboxWorker(outbox, lambda conversation_id, message: {"ok": True}), lock_path, retry_interval=0.01)
+
+    first.start()
+    deadline = time.monotonic() + 5
+    while not first.is_leader and time.monotonic() < deadline:
+        time.sleep(0.01)
+    second.start()
+    time.sleep(0.1)
+    assert first.is_leader and not second.is_leader
+
+    # A recycled worker hands the outbox over
+    first.stop(timeout=5)
+    while not second.is_leader and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert second.is_leader and second.worker._thread.is_alive()
+    second.stop(timeout=5)
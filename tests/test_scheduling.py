@@ -0,0 +1,77 @@
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import scheduling
+from scheduling import DeliverySchedule, ReleaseClock, tz_offsets
+
+NOW = 1_700_000_000.0
+
+
+def test_stagger_spreads_conversations_evenly_from_the_send_time():
+    schedule = DeliverySchedule(send_at=NOW + 600, stagger_seconds=3600)
+
+    assert schedule.release_times(["C1", "C2", "C3", "C4"], NOW) == {
+        "C1": NOW + 600, "C2": NOW + 1500, "C3": NOW + 2400, "C4": NOW + 3300,
+    }
+    assert not schedule.immediate and DeliverySchedule().immediate
+
+
+def test_local_time_shifts_users_to_their_time_zone():
+    schedule = DeliverySchedule(send_at=NOW + 4 * 3600, local_time=True)
+    offsets = {"U1": -5 * 3600, "U2": 2 * 3600, "U3": 8 * 3600}
+
+    times = schedule.release_times(["U1", "U2", "U3", "C1"], NOW, offsets, sender_tz_offset=3600)
+
+    # 6 hours later in UTC-5, 1 hour earlier in UTC+2, channels at the sender's time
+    assert times["U1"] == NOW + 10 * 3600
+    assert times["U2"] == NOW + 3 * 3600
+    assert times["C1"] == NOW + 4 * 3600
+    # It is already past that time of day in UTC+8, the message goes out at that time tomorrow
+    assert times["U3"] == NOW + 21 * 3600
+
+
+def test_local_time_already_past_moves_to_the_next_day():
+    # 09:00 for a sender in UTC, 30 minutes from now
+    schedule = DeliverySchedule(send_at=NOW + 1800, local_time=True)
+    offsets = {"U1": 0, "U2": 14 * 3600, "U3": 9 * 3600}
+
+    times = schedule.release_times(["U1", "U2", "U3"], NOW, offsets, sender_tz_offset=0)
+
+    assert times["U1"] == NOW + 1800
+    # 09:00 in UTC+14 and UTC+9 has passed today, it comes 24 hours after it did there
+    assert times["U2"] == NOW + 1800 - 14 * 3600 + scheduling.SECONDS_PER_DAY
+    assert times["U3"] == NOW + 1800 - 9 * 3600 + scheduling.SECONDS_PER_DAY
+    assert all(NOW <= at < NOW + scheduling.SECONDS_PER_DAY for at in times.values())
+
+
+def test_tz_offsets_from_users_info(fake_slack_api, fake_slack_client):
+    assert tz_offsets(fake_slack_client, ["U1", "C2", "W3", "U1"]) == {"U1": 3600, "W3": 3 * 3600}
+    assert fake_slack_api.calls["users.info"] == 2
+
+
+def test_tz_offsets_of_many_users_page_through_users_list(monkeypatch):
+    monkeypatch.setattr(scheduling, "TZ_LOOKUP_MAX_USERS", 1)
+    pages = {
+        None: {"members": [{"id": "U1", "tz_offset": 3600}, {"id": "U9"}], "response_metadata": {"next_cursor": "next"}},
+        "next": {"members": [{"id": "U2", "tz_offset": -3600}], "response_metadata": {"next_cursor": ""}},
+    }
+
+    class Client:
+        def users_list(self, limit, cursor=None):
+            return pages[cursor]
+
+    assert tz_offsets(Client(), ["U1", "U2", "U3"]) == {"U1": 3600, "U2": -3600}
+
+
+def test_release_clock_returns_the_next_future_time():
+    clock = ReleaseClock()
+    clock.add([NOW + 30, NOW + 10, NOW + 10, NOW - 5])
+
+    assert clock.next_due(NOW) == NOW + 10
+    assert clock.next_due(NOW + 10) == NOW + 30
+    assert clock.next_due(NOW + 30) is None
+    assert len(clock) == 0
@@ -0,0 +1,110 @@
+import os
+import sys
+import queue
+import threading
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from slack_sdk.socket_mode.request import SocketModeRequest
+
+from socket_connections import RecentKeys, SocketModeConnections
+
+
+class FakeSocketModeClient:
+    def __init__(self):
+        self.socket_mode_request_listeners = []
+        self.message_queue = queue.Queue()
+        self.responses = []
+
+    def is_connected(self) -> bool:
+        return True
+
+    def send_socket_mode_response(self, response):
+        self.responses.append(response.envelope_id)
+
+    def deliver(self, request: SocketModeRequest):
+        for listener in self.socket_mode_request_listeners:
+            listener(self, request)
+
+
+class FakeHandler:
+    """Stands in for a Bolt SocketModeHandler: acknowledges every envelope it handles."""
+
+    def __init__(self, handled: list):
+        self.client = FakeSocketModeClient()
+        self.client.socket_mode_request_listeners.append(self.handle)
+        self.handled = handled
+
+    def handle(self, client, request):
+        self.handled.append(request.envelope_id)
+        client.send_socket_mode_response(request)
+
+
+def _event(envelope_id: str, event_id: str) -> SocketModeRequest:
+    return SocketModeRequest(type="events_api", envelope_id=envelope_id, payload={"event_id": event_id, "event": {}})
+
+
+def _interactive(envelope_id: str) -> SocketModeRequest:
+    return SocketModeRequest(type="interactive", envelope_id=envelope_id, payload={"type": "block_actions"})
+
+
+def test_redeliveries_on_any_connection_are_acknowledged_and_dropped():
+    handled = []
+    first, second = FakeHandler(handled), FakeHandler(handled)
+    connections = SocketModeConnections([first, second], report_interval=0)
+
+    first.client.deliver(_interactive("E1"))
+    second.client.deliver(_interactive("E1"))
+    # A retried event comes in a new envelope with the same event_id
+    first.client.deliver(_event("E2", "Ev1"))
+    second.client.deliver(_event("E3", "Ev1"))
+    second.client.deliver(_event("E4", "Ev2"))
+
+    assert handled == ["E1", "E2", "E4"]
+    assert first.client.responses == ["E1", "E2"]
+    assert second.client.responses == ["E1", "E3", "E4"]
+    loads = connections.load()
+    assert [load["connection"] for load in loads] == ["0", "1"]
+
+
+def test_load_reports_envelopes_in_the_listeners_per_connection():
+    release = threading.Event()
+    started = threading.Event()
+    handled = []
+
+    class SlowHandler(FakeHandler):
+        def handle(self, client, request):
+            started.set()
+            release.wait(timeout=5)
+            super().handle(client, request)
+
+    busy, idle = SlowHandler(handled), FakeHandler(handled)
+    connections = SocketModeConnections([busy, idle], report_interval=0)
+    before = connections.load()
+
+    worker = threading.Thread(target=busy.client.deliver, args=(_interactive("E10"),))
+    worker.start()
+    assert started.wait(timeout=5)
+    during = connections.load()
+    release.set()
+    worker.join(timeout=5)
+    after = connections.load()
+
+    assert during[0]["in_flight"] - before[0]["in_flight"] == 1
+    assert during[1]["in_flight"] == before[1]["in_flight"]
+    assert after[0]["in_flight"] == before[0]["in_flight"]
+    assert after[0]["handled"] - before[0]["handled"] == 1
+    assert after[0]["busy_seconds"] > before[0]["busy_seconds"]
+    assert after[1]["busy_seconds"] == before[1]["busy_seconds"]
+
+
+def test_recent_keys_forget_old_and_overflowing_keys():
+    keys = RecentKeys(ttl=0)
+    assert keys.add("a") is True
+    assert keys.add("a") is True
+
+    keys = RecentKeys(ttl=600, maxsize=2)
+    assert [keys.add(key) for key in ("a", "b", "a", "c", "a")] == [True, True, False, True, True]
+    assert len(keys) == 2
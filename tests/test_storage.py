@@ -0,0 +1,32 @@
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from storage import connect
+
+
+def test_forked_child_opens_its_own_connection(tmp_path):
+    connection = connect(str(tmp_path / "comms.sqlite3"))
+    connection.executescript("CREATE TABLE IF NOT EXISTS items (name TEXT)")
+    memory = connect(":memory:")
+    memory.executescript("CREATE TABLE IF NOT EXISTS items (name TEXT)")
+    parent_connection = connection.connection
+
+    pid = os.fork()
+    if pid == 0:
+        # Like a preloaded web server worker: the stores were opened before the fork
+        try:
+            connection.execute("INSERT INTO items (name) VALUES ('child')")
+            memory.execute("INSERT INTO items (name) VALUES ('child')")
+            os._exit(0 if connection.connection is not parent_connection else 1)
+        except BaseException:
+            os._exit(2)
+    _, status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert connection.connection is parent_connection
+    assert [row["name"] for row in connection.execute("SELECT name FROM items")] == ["child"]
+    assert memory.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 0
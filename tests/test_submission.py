@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+
+import validators
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from scheduling import DeliverySchedule
+from submission import SIMPLE_URL_PATTERN, delivery_schedule, is_valid_url, validate_submission
+
+
+def _view(conversations=("C1",), buttons=(), icon_url=None):
+    values = {
+        "conversation_select_block": {"conversation_select_action": {"selected_conversations": list(conversations)}},
+        "call_to_action_dropdown": {"call_to_action_dropdown-action": {"selected_option": {"value": str(len(buttons))}}},
+    }
+    for i, (text, link) in enumerate(buttons, start=1):
+        values[f"cta_button_text_{i}"] = {"plain_text_input-action": {"value": text}}
+        values[f"cta_button_link_{i}"] = {"plain_text_input-action": {"value": link}}
+    if icon_url is not None:
+        values["icon_url"] = {"icon_url-action": {"value": icon_url}}
+    return {"state": {"values": values}}
+
+
+def test_valid_submission_has_no_errors():
+    view = _view(buttons=[("Open", "https://example.com/a?b=1"), ("Docs", " https://1.2.3.4/docs ")], icon_url="https://example.com/i.png")
+
+    assert validate_submission(view) is None
+
+
+def test_every_error_is_returned_in_one_pass():
+    view = _view(
+        conversations=(),
+        buttons=[("Open", "example.com"), ("x" * 76, "https://example.com"), ("Docs", "https://exa mple.com")],
+        icon_url="not a url",
+    )
+
+    assert validate_submission(view) == {
+        "conversation_select_block": "Please select at least one conversation or add email addresses to send the message to.",
+        "icon_url": "Please enter a valid URL that starts with http:// or https://",
+        "cta_button_link_1": "Please enter a valid URL that starts with http:// or https://",
+        "cta_button_text_2": "Button text is limited to 75 characters, this one has 76.",
+        "cta_button_link_3": "Please enter a valid URL that starts with http:// or https://",
+    }
+
+
+def test_fast_path_only_accepts_urls_validators_accepts():
+    urls = [
+        "https://example.com", "http://sub.example.co.uk/path/to?x=1&y=2#frag", "https://example.com/%7Euser",
+        "https://a.b", "https://-a.com", "https://exa_mple.com", "https://example.com/|x", "https://example.com:8443/x",
+        "https://user:pw@example.com", "https://bücher.de", "http://localhost",
+    ]
+    for url in urls:
+        if SIMPLE_URL_PATTERN.fullmatch(url):
+            assert validators.url(url) is True, url
+        assert is_valid_url(url) == bool(validators.url(url)), url
+    # Buttons only open web links
+    assert not is_valid_url("ftp://example.com")
+
+
+def test_delivery_fields_are_parsed_and_checked():
+    send_at = int(time.time()) + 3600
+    view = _view()
+    values = view["state"]["values"]
+    values["send_at"] = {"send_at-action": {"selected_date_time": send_at}}
+    values["stagger_window"] = {"stagger_window-action": {"selected_option": {"value": "3600"}}}
+    values["local_time"] = {"local_time-action": {"selected_options": [{"value": "local_time"}]}}
+
+    assert delivery_schedule(view) == DeliverySchedule(send_at=send_at, stagger_seconds=3600, local_time=True)
+    assert validate_submission(view) is None
+    assert "send_at" in validate_submission(view, scheduling=False)
+
+    values["send_at"]["send_at-action"]["selected_date_time"] = send_at - 7200
+    assert validate_submission(view) == {"send_at": "Please pick a time in the future."}
+    del values["send_at"]
+    assert validate_submission(view) == {"local_time": "Please pick a send time to deliver in each recipient's time zone."}
@@ -0,0 +1,76 @@
+import os
+import sys
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web import SlackResponse
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from view_updates import ViewUpdateCoalescer
+
+
+def _slack_response(data):
+    return SlackResponse(client=None, http_verb="POST", api_url="", req_args={}, data=data, headers={}, status_code=200)
+
+
+def _hash_conflict():
+    return SlackApiError("hash_conflict", _slack_response({"ok": False, "error": "hash_conflict"}))
+
+
+def test_clicks_during_an_in_flight_update_collapse_into_one_call():
+    release = threading.Event()
+    started = threading.Event()
+    calls = []
+
+    def views_update(view_id, hash, view):
+        calls.append((hash, view))
+        if len(calls) == 1:
+            started.set()
+            release.wait(timeout=5)
+        return _slack_response({"ok": True, "view": {"hash": f"H{len(calls) + 1}"}})
+
+    client = MagicMock()
+    client.views_update.side_effect = views_update
+    coalescer = ViewUpdateCoalescer(client)
+
+    first = threading.Thread(target=coalescer.update, args=("V1", "H1", {"blocks": 1}))
+    first.start()
+    assert started.wait(timeout=5)
+    coalescer.update("V1", "H1", {"blocks": 2})
+    coalescer.update("V1", "H1", {"blocks": 3})
+    release.set()
+    first.join(timeout=5)
+
+    # the intermediate view is skipped and the newest one is sent with the hash Slack returned
+    assert calls == [("H1", {"blocks": 1}), ("H2", {"blocks": 3})]
+
+
+def test_hash_conflict_is_resent_with_the_newest_view():
+    client = MagicMock()
+    client.views_update.side_effect = [_hash_conflict(), _slack_response({"ok": True, "view": {"hash": "H9"}})]
+    coalescer = ViewUpdateCoalescer(client)
+
+    coalescer.update("V1", "H1", {"blocks": 1})
+
+    assert client.views_update.call_count == 2
+    assert client.views_update.call_args.kwargs == {"view_id": "V1", "hash": None, "view": {"blocks": 1}}
+
+
+def test_other_errors_are_raised_and_the_modal_is_released():
+    client = MagicMock()
+    client.views_update.side_effect = [
+        SlackApiError("not_found", _slack_response({"ok": False, "error": "not_found"})),
+        _slack_response({"ok": True, "view": {"hash": "H2"}}),
+    ]
+    coalescer = ViewUpdateCoalescer(client)
+
+    with pytest.raises(SlackApiError):
+        coalescer.update("V1", "H1", {"blocks": 1})
+    coalescer.update("V1", "H1", {"blocks": 2})
+
+    assert client.views_update.call_count == 2
@@ -0,0 +1,22 @@
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from workspaces import Workspaces, workspace_name
+
+
+def test_campaigns_use_the_client_and_caches_of_their_workspace(tmp_path):
+    workspaces = Workspaces("default client", str(tmp_path / "app.sqlite3"))
+
+    assert workspaces.client(("", "T1")) == "default client"
+    workspaces.client_for = lambda team: f"bot of {workspace_name(team)}"
+    assert workspaces.client(("E1", "")) == "bot of E1:"
+    # Campaigns stored before they kept their workspace
+    assert workspaces.client(None) == "default client"
+
+    assert workspaces.dm_channels(("", "T1")) is workspaces.dm_channels(("", "T1"))
+    assert workspaces.dm_channels(("", "T1")).workspace == ":T1"
+    assert workspaces.email_resolver(("", "T2")).cache.workspace == ":T2"
@@ -0,0 +1,117 @@
+import logging
+import threading
+from dataclasses import dataclass
+
+from slack_sdk.errors import SlackApiError
+
+logger = logging.getLogger(__name__)
+
+# How many times a views_update is re-sent after hash_conflict before giving up
+MAX_HASH_CONFLICT_RETRIES = 3
+
+
+@dataclass
+class _PendingUpdate:
+    view: dict | None = None
+    hash: str | None = None
+    in_flight: bool = False
+
+
+class ViewUpdateCoalescer:
+    """Coalesces rapid views_update calls for the same modal.
+
+    At most one views_update per view_id is in flight. Clicks that arrive meanwhile only replace the
+    desired view, and the thread that owns the in-flight call sends the newest one when it returns.
+    A hash_conflict is retried with the newest known hash and view.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._pending: dict[str, _PendingUpdate] = {}
+        self._lock = threading.Lock()
+
+    def _submit(self, view_id: str, view_hash: str | None, view: dict) -> bool:
+        # Records the desired view, returns True when the caller has to send it
+        with self._lock:
+            pending = self._pending.setdefault(view_id, _PendingUpdate())
+            pending.view = view
+            pending.hash = view_hash
+            if pending.in_flight:
+                return False
+            pending.in_flight = True
+            return True
+
+    def _next(self, view_id: str) -> tuple[dict, str | None] | None:
+        with self._lock:
+            pending = self._pending[view_id]
+            if pending.view is None:
+                del self._pending[view_id]
+                return None
+            view, pending.view = pending.view, None
+            return view, pending.hash
+
+    def _sent(self, view_id: str, response):
+        # Our update changed the view, so the hash Slack returned is now the newest one
+        new_hash = (response.get("view") or {}).get("hash")
+        with self._lock:
+            if new_hash:
+                self._pending[view_id].hash = new_hash
+
+    def _conflicted(self, view_id: str, view: dict, view_hash: str | None):
+        # Queues a re-send after hash_conflict unless a newer click already queued one
+        with self._lock:
+            pending = self._pending[view_id]
+            if pending.view is None:
+                pending.view = view
+            if pending.hash == view_hash:
+                # Nobody told us a newer hash. This app is the only writer of the modal and
+                # holds its latest desired state, so overwrite without the hash check.
+                pending.hash = None
+
+    def _abandon(self, view_id: str):
+        with self._lock:
+            self._pending.pop(view_id, None)
+
+    def update(self, view_id: str, view_hash: str | None, view: dict, client=None):
+        # client overrides the coalescer's, e.g. the client of the workspace the modal is open in
+        client = client or self.client
+        if not self._submit(view_id, view_hash, view):
+            logger.debug(f"views_update for {view_id} coalesced into the in-flight update")
+            return
+        conflicts = 0
+        while (next_update := self._next(view_id)) is not None:
+            view, view_hash = next_update
+            try:
+                self._sent(view_id, client.views_update(view_id=view_id, hash=view_hash, view=view))
+            except SlackApiError as e:
+                if e.response.get("error") != "hash_conflict" or conflicts >= MAX_HASH_CONFLICT_RETRIES:
+                    self._abandon(view_id)
+                    raise
+                conflicts += 1
+                logger.info(f"views_update for {view_id} hit hash_conflict, re-sending the newest view")
+                self._conflicted(view_id, view, view_hash)
+            except Exception:
+                self._abandon(view_id)
+                raise
+
+    async def update_async(self, view_id: str, view_hash: str | None, view: dict, client=None):
+        # Same as update() for an AsyncWebClient
+        client = client or self.client
+        if not self._submit(view_id, view_hash, view):
+            logger.debug(f"views_update for {view_id} coalesced into the in-flight update")
+            return
+        conflicts = 0
+        while (next_update := self._next(view_id)) is not None:
+            view, view_hash = next_update
+            try:
+                self._sent(view_id, await client.views_update(view_id=view_id, hash=view_hash, view=view))
+            except SlackApiError as e:
+                if e.response.get("error") != "hash_conflict" or conflicts >= MAX_HASH_CONFLICT_RETRIES:
+                    self._abandon(view_id)
+                    raise
+                conflicts += 1
+                logger.info(f"views_update for {view_id} hit hash_conflict, re-sending the newest view")
+                self._conflicted(view_id, view, view_hash)
+            except Exception:
+                self._abandon(view_id)
+                raise
@@ -0,0 +1,47 @@
+import threading
+from typing import Callable
+
+from dm_channels import DMChannelCache
+from email_resolver import EmailCache, EmailResolver
+
+
+def workspace_name(team: tuple | None) -> str:
+    # team is a team_key(), "" for campaigns stored before they kept their workspace
+    return ":".join(team) if team else ""
+
+
+class Workspaces:
+    """What a campaign needs from the workspace it was submitted in, by team_key().
+
+    Campaigns are resolved and sent by the outbox worker, outside of any request, so they cannot use
+    the client Bolt picked for the request. client() is default_client, the workspace of
+    SLACK_BOT_TOKEN, until client_for(team) is set to look up the bot of each installation. The email
+    and DM channel caches are kept per workspace, user IDs and DMs differ from one to the next.
+    """
+
+    def __init__(self, default_client, path: str | None = None):
+        self.default_client = default_client
+        self.client_for: Callable[[tuple], object] | None = None
+        self.path = path
+        self._email_resolvers: dict[str, EmailResolver] = {}
+        self._dm_channels: dict[str, DMChannelCache] = {}
+        self._lock = threading.Lock()
+
+    def client(self, team: tuple | None):
+        if team is None or self.client_for is None:
+            return self.default_client
+        return self.client_for(team)
+
+    def email_resolver(self, team: tuple | None) -> EmailResolver:
+        name = workspace_name(team)
+        with self._lock:
+            if name not in self._email_resolvers:
+                self._email_resolvers[name] = EmailResolver(EmailCache(self.path, workspace=name))
+            return self._email_resolvers[name]
+
+    def dm_channels(self, team: tuple | None) -> DMChannelCache:
+        name = workspace_name(team)
+        with self._lock:
+            if name not in self._dm_channels:
+                self._dm_channels[name] = DMChannelCache(self.path, workspace=name)
+            return self._dm_channels[name]
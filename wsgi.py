@@ -0,0 +1,15 @@
+from slack_bolt.adapter.wsgi import SlackRequestHandler
+
+from app import outbox_worker
+from app_oauth import app
+from outbox import OutboxLeader
+from storage import DEFAULT_DB_PATH
+
+# WSGI callable serving /slack/events, /slack/install and /slack/oauth_redirect, run it with
+#   gunicorn wsgi:application
+# gunicorn.conf.py in the project root sets the workers, preloading and recycling.
+application = SlackRequestHandler(app)
+
+# Every worker process serves requests, only one of them at a time sends the outbox.
+# Started by the gunicorn hooks in each worker, the threads do not survive the fork.
+outbox_leader = OutboxLeader(outbox_worker, f"{DEFAULT_DB_PATH}.outbox-lock")